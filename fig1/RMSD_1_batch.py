@@ -1,165 +1,666 @@
 import os
+import time
+import zlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
 import pandas as pd
-from Bio.PDB import *
+
+if __package__:
+    from .alignment_index import alignment_indices_batch
+    from .aln_store import AlignmentStore, is_alignment_store, iter_pair_codes
+    from .checkpoint import RunCheckpoint
+    from .contrib_io import CSV_NAME, PARQUET_NAME, ParquetContributionWriter
+    from .kabsch import superpose_flat
+    from .residue_stats import ResidueStats
+    from .run_metrics import MetricsLog, RunMetrics, profile_call
+    from .structure_store import StructureStore
+else:
+    from alignment_index import alignment_indices_batch
+    from aln_store import AlignmentStore, is_alignment_store, iter_pair_codes
+    from checkpoint import RunCheckpoint
+    from contrib_io import CSV_NAME, PARQUET_NAME, ParquetContributionWriter
+    from kabsch import superpose_flat
+    from residue_stats import ResidueStats
+    from run_metrics import MetricsLog, RunMetrics, profile_call
+    from structure_store import StructureStore
 
 # 配置路径和参数
 PDB_DIR = "path.."
 ALN_RESULTS = "path.."
 OUTPUT_DIR = "path.."
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# 解析后的结构坐标缓存目录（设为None则只使用内存缓存）
+STRUCTURE_CACHE_DIR = os.path.join(OUTPUT_DIR, "structure_cache")
+STRUCTURE_CACHE_SIZE = 4096  # 内存中最多保留的结构数
+CHUNKSIZE = 10000  # 每批处理10,000行
+# 只输出汇总模式：在计算循环中直接累积每个残基的统计量，不写出逐残基明细
+AGGREGATE_ONLY = False
+SAMPLE_FRACTION = 0.0  # 只输出汇总模式下，随机抽取这一比例的比对写出明细供抽查
+# 对称去重模式：A→B 与 B→A 只叠合一次，反方向的记录由同一次叠合导出
+DEDUP_PAIRS = False
+# 自比对（query == target）的处理：compute 正常计算；zero 对角比对直接记为0，不做叠合；skip 跳过
+SELF_HITS = 'compute'
+METRICS_INTERVAL = 30.0  # 每隔多少秒写一条进度指标（0为只写最终报告）
+# 在cProfile下运行的块号，及是否同时用tracemalloc记录内存分配
+PROFILE_CHUNKS = frozenset()
+PROFILE_DIR = None
+TRACE_MEMORY = False
 
 # Foldseek输出列顺序
 COLUMN_NAMES = ['query', 'target', 'qaln', 'taln', 'evalue', 'rmsd']
+# 输出文件列
+OUTPUT_COLUMNS = ['query', 'target', 'residue_number', 'rmsd_contribution', 'total_rmsd', 'aligned_length']
+ERROR_COLUMNS = ['chunk', 'row', 'query', 'target', 'error']
+
+# 对称去重模式下每行的角色（存放在数据块的 pair_role 列中）
+PAIR_SINGLE = 0   # 单独计算
+PAIR_PRIMARY = 1  # 计算，并同时导出反方向的记录
+PAIR_DERIVED = 2  # 反方向记录由前面的主行导出，主行失败时再单独计算
+
+# 每个PDB目录一个结构缓存，整个运行期间复用
+_STRUCTURE_STORES = {}
+
+def get_structure_store(pdb_dir):
+    """获取（或创建）PDB目录对应的结构缓存"""
+    store = _STRUCTURE_STORES.get(pdb_dir)
+    if store is None:
+        store = StructureStore(pdb_dir, cache_dir=STRUCTURE_CACHE_DIR, max_items=STRUCTURE_CACHE_SIZE)
+        _STRUCTURE_STORES[pdb_dir] = store
+    return store
 
 def load_pdb_structure(pdb_id, pdb_dir):
-    """加载PDB结构并返回CA原子列表"""
+    """加载PDB结构并返回CA原子坐标数组和残基编号"""
     try:
-        parser = PDBParser(QUIET=True)
-        # 尝试不同大小写组合
-        for fname in [f"{pdb_id}.pdb", f"{pdb_id.lower()}.pdb", f"{pdb_id.upper()}.pdb"]:
-            pdb_path = os.path.join(pdb_dir, fname)
-            if os.path.exists(pdb_path):
-                structure = parser.get_structure(pdb_id, pdb_path)
-                ca_atoms = []
-                for model in structure:
-                    for chain in model:
-                        for residue in chain:
-                            if 'CA' in residue:
-                                ca_atoms.append(residue['CA'])
-                return ca_atoms
-        raise FileNotFoundError(f"No PDB file found for {pdb_id}")
+        return get_structure_store(pdb_dir).get(pdb_id)
     except Exception as e:
         print(f"Error loading PDB {pdb_id}: {str(e)}")
         return None
 
-def calculate_residue_rmsd_contributions_batch(df_batch):
-    """计算每个残基的RMSD贡献（批量处理）"""
-    results = []
+def calculate_residue_rmsd_contributions_batch(df_batch, errors=None, metrics=None):
+    """计算每个残基的RMSD贡献（批量处理）
+
+    比对字符串整批转换为残基下标数组，坐标按下标直接取出，再对整批比对做一次向量化Kabsch叠合。
+    每个残基的贡献为叠合后该query残基与其对齐的target残基之间的距离。
+    传入 errors 列表时，出错的行以 (行号, query, target, 错误信息) 记录到其中，而不是打印。
+    传入 metrics（RunMetrics）时记录各阶段耗时、结构缓存命中次数，以及按原因分类的跳过行数：
+    missing_pdb / structure_error（结构无法加载）、length_mismatch（qaln与taln长度不一致）、
+    empty_alignment（没有两侧都不是gap的列）、residue_out_of_range（对齐列全部超出结构长度）、
+    self_hit（SELF_HITS 为 skip 时的自比对）。
+    每条结果的 'row' 为产生它的输入行号。
+    数据块带有 pair_role 列（对称去重模式）时，PAIR_DERIVED 行不计算，PAIR_PRIMARY 行的结果后面
+    紧跟一条 query/target 互换的记录：RMSD和逐残基偏差相同，残基编号取原target一侧。
+    这是近似：互换的记录沿用 A→B 的比对和叠合，而Foldseek给出的 B→A 比对可能对齐了不同的残基。
+    主行没有产生结果时，被跳过的反方向行由 resolve_derived_rows 按原样补算。
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
+    metrics.count('rows_in', len(df_batch))
+    if 'pair_role' in df_batch:
+        derived = df_batch['pair_role'].to_numpy() == PAIR_DERIVED
+        metrics.count('derived_rows', np.count_nonzero(derived))
+        df_batch = df_batch[~derived]
+    if SELF_HITS == 'skip':
+        self_hit = (df_batch['query'] == df_batch['target']).to_numpy()
+        metrics.skip('self_hit', np.count_nonzero(self_hit))
+        df_batch = df_batch[~self_hit]
+    queries = df_batch['query'].to_numpy()
+    targets = df_batch['target'].to_numpy()
     
-    for _, row in df_batch.iterrows():
-        try:
-            query_id = row['query']
-            target_id = row['target']
-            
-            # 加载结构
-            q_ca = load_pdb_structure(query_id, PDB_DIR)
-            t_ca = load_pdb_structure(target_id, PDB_DIR)
-            
-            if q_ca is None or t_ca is None:
-                continue
-            
-            # 提取对齐信息
-            qaln, taln = row['qaln'], row['taln']
-            
-            # 验证比对长度
-            if len(qaln) != len(taln):
-                continue
-            
-            # 提取对齐的CA原子
-            q_atoms = []
-            t_atoms = []
-            q_pos = t_pos = 0
-            
-            for qa, ta in zip(qaln, taln):
-                if qa != '-' and ta != '-':
-                    if q_pos < len(q_ca) and t_pos < len(t_ca):
-                        q_atoms.append(q_ca[q_pos])
-                        t_atoms.append(t_ca[t_pos])
-                    q_pos += 1
-                    t_pos += 1
-                elif qa != '-':
-                    q_pos += 1
-                elif ta != '-':
-                    t_pos += 1
-            
-            if not q_atoms:
+    # 加载本批涉及的结构（每个结构只取一次），拼接成一张坐标表
+    structure_ids = pd.unique(np.concatenate([queries, targets]))
+    offsets = {}
+    lengths = {}
+    coord_parts = []
+    res_parts = []
+    load_errors = {}
+    total = 0
+    store = get_structure_store(PDB_DIR)
+    store_before = dict(store.stats)
+    with metrics.timer('load_structures'):
+        for structure_id in structure_ids:
+            try:
+                coords, res_nums = store.get(structure_id)
+            except Exception as e:
+                load_errors[structure_id] = e
                 continue
-            
-            # 计算最佳拟合RMSD
-            sup = Superimposer()
-            sup.set_atoms(q_atoms, t_atoms)
-            rmsd = sup.rms
-            
-            # 计算每个残基的贡献
-            residue_contrib = {}
-            q_pos = 0
-            for i, (qa, ta) in enumerate(zip(qaln, taln)):
-                if qa != '-' and ta != '-':
-                    if q_pos < len(q_ca):
-                        res_num = q_ca[q_pos].get_parent().id[1]
-                        diff = q_ca[q_pos].get_coord() - t_ca[q_pos].get_coord()
-                        dist_sq = np.sum(diff**2)
-                        residue_contrib[res_num] = dist_sq
-                    q_pos += 1
-            
-            # 归一化贡献
-            total_dist_sq = sum(residue_contrib.values())
-            scale_factor = (rmsd**2 * len(residue_contrib)) / total_dist_sq if total_dist_sq > 0 else 0
-            
-            for res_num in residue_contrib:
-                residue_contrib[res_num] = np.sqrt(residue_contrib[res_num] * scale_factor)
-            
+            offsets[structure_id] = total
+            lengths[structure_id] = len(coords)
+            coord_parts.append(coords)
+            res_parts.append(res_nums)
+            total += len(coords)
+    for key, value in store.stats.items():
+        metrics.count(f"structure_{key}", value - store_before.get(key, 0))
+    
+    # 结构加载失败的行按行报告
+    loaded = np.array([q in offsets and t in offsets for q, t in zip(queries, targets)], dtype=bool)
+    for row_pos in np.flatnonzero(~loaded):
+        q, t = queries[row_pos], targets[row_pos]
+        e = load_errors.get(q, load_errors.get(t))
+        metrics.skip('missing_pdb' if isinstance(e, FileNotFoundError) else 'structure_error')
+        if errors is None:
+            print(f"Error loading PDB {q if q in load_errors else t}: {str(e)}")
+        else:
+            errors.append((df_batch.index[row_pos], q, t, f"{type(e).__name__}: {e}"))
+    
+    if not loaded.any():
+        return []
+    
+    all_coords = np.concatenate(coord_parts)
+    all_res_nums = np.concatenate(res_parts)
+    rows = np.flatnonzero(loaded)
+    q_offset = np.array([offsets[q] for q in queries[rows]], dtype=np.int64)
+    t_offset = np.array([offsets[t] for t in targets[rows]], dtype=np.int64)
+    q_length = np.array([lengths[q] for q in queries[rows]], dtype=np.int64)
+    t_length = np.array([lengths[t] for t in targets[rows]], dtype=np.int64)
+    
+    # 提取对齐的残基下标（长度不一致的比对不产生对齐列）
+    with metrics.timer('alignment_index'):
+        q_idx, t_idx, row_ids, valid = alignment_indices_batch(
+            df_batch['qaln'].to_numpy()[rows], df_batch['taln'].to_numpy()[rows])
+        aligned_counts = np.bincount(row_ids, minlength=len(rows))
+        in_range = (q_idx < q_length[row_ids]) & (t_idx < t_length[row_ids])
+        q_idx, t_idx, row_ids = q_idx[in_range], t_idx[in_range], row_ids[in_range]
+        pair_counts = np.bincount(row_ids, minlength=len(rows))
+    metrics.skip('length_mismatch', np.count_nonzero(~valid))
+    metrics.skip('empty_alignment', np.count_nonzero(valid & (aligned_counts == 0)))
+    metrics.skip('residue_out_of_range', np.count_nonzero((aligned_counts > 0) & (pair_counts == 0)))
+    metrics.count('out_of_range_columns', np.count_nonzero(~in_range))
+    
+    kept = np.flatnonzero(pair_counts > 0)
+    if not len(kept):
+        return []
+    
+    q_atoms = q_offset[row_ids] + q_idx
+    t_atoms = t_offset[row_ids] + t_idx
+    
+    # 自比对且每列都对齐到同一残基时，叠合结果必然为0，不必计算
+    trivial = np.zeros(len(rows), dtype=bool)
+    if SELF_HITS == 'zero':
+        off_diagonal = np.bincount(row_ids, weights=q_idx != t_idx, minlength=len(rows))
+        trivial = (queries[rows] == targets[rows]) & (off_diagonal == 0)
+        metrics.count('self_hits_short_circuited', np.count_nonzero(trivial & (pair_counts > 0)))
+    
+    # 整批计算最佳拟合RMSD和叠合后的逐残基偏差（row_ids有序，拼接顺序即比对顺序）
+    rmsd_values = np.zeros(len(kept))
+    deviations = np.zeros(len(q_atoms))
+    with metrics.timer('superpose'):
+        columns = ~trivial[row_ids]
+        computed = ~trivial[kept]
+        if computed.any():
+            _, _, rmsd_values[computed], deviations[columns] = superpose_flat(
+                all_coords[q_atoms[columns]], all_coords[t_atoms[columns]], pair_counts[kept][computed])
+    res_nums = all_res_nums[q_atoms]
+    
+    results = []
+    with metrics.timer('assemble_results'):
+        primary = np.zeros(len(df_batch), dtype=bool)
+        if 'pair_role' in df_batch:
+            primary = df_batch['pair_role'].to_numpy() == PAIR_PRIMARY
+            target_res_nums = all_res_nums[t_atoms]
+        bounds = np.concatenate(([0], np.cumsum(pair_counts[kept])))
+        for k, row_pos in enumerate(rows[kept]):
+            start, stop = bounds[k], bounds[k + 1]
             results.append({
-                'query': query_id,
-                'target': target_id,
-                'total_rmsd': rmsd,
-                'residue_contributions': residue_contrib,
-                'aligned_length': len(q_atoms)
+                'row': df_batch.index[row_pos],
+                'query': queries[row_pos],
+                'target': targets[row_pos],
+                'total_rmsd': float(rmsd_values[k]),
+                'residue_numbers': res_nums[start:stop],
+                'residue_contributions': deviations[start:stop],
+                'aligned_length': int(stop - start)
             })
-            
-        except Exception as e:
-            print(f"Error processing {row['query']} vs {row['target']}: {str(e)}")
+            if primary[row_pos]:
+                # 同一次叠合的反方向记录：按原target一侧的残基编号
+                results.append({
+                    'row': df_batch.index[row_pos],
+                    'query': targets[row_pos],
+                    'target': queries[row_pos],
+                    'total_rmsd': float(rmsd_values[k]),
+                    'residue_numbers': target_res_nums[start:stop],
+                    'residue_contributions': deviations[start:stop],
+                    'aligned_length': int(stop - start)
+                })
+    metrics.count('alignments_out', len(results))
+    metrics.count('aligned_residues', len(q_atoms))
+    metrics.count('superposed_alignments', np.count_nonzero(computed))
     
     return results
 
-def main():
+def results_to_frame(results):
+    """把逐比对的结果展开为每个残基一行的DataFrame"""
+    if not results:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    lengths = [res['aligned_length'] for res in results]
+    return pd.DataFrame({
+        'query': np.repeat([res['query'] for res in results], lengths),
+        'target': np.repeat([res['target'] for res in results], lengths),
+        'residue_number': np.concatenate([res['residue_numbers'] for res in results]),
+        'rmsd_contribution': np.concatenate([res['residue_contributions'] for res in results]),
+        'total_rmsd': np.repeat([res['total_rmsd'] for res in results], lengths),
+        'aligned_length': np.repeat([res['aligned_length'] for res in results], lengths)
+    }, columns=OUTPUT_COLUMNS)
+
+def pair_roles(q_codes, t_codes):
+    """对称去重：给每一行分配 PAIR_SINGLE / PAIR_PRIMARY / PAIR_DERIVED
+
+    同一无序结构对的所有行中，第一行为主行；其后第一条方向相反的行由主行导出（PAIR_DERIVED），
+    主行标为 PAIR_PRIMARY。没有反方向的行、同方向的重复行和自比对仍单独计算。
+    """
+    q_codes = np.asarray(q_codes, dtype=np.int64)
+    t_codes = np.asarray(t_codes, dtype=np.int64)
+    n = len(q_codes)
+    roles = np.full(n, PAIR_SINGLE, dtype=np.int8)
+    if not n:
+        return roles
+    width = int(max(q_codes.max(), t_codes.max())) + 1
+    keys = np.minimum(q_codes, t_codes) * width + np.maximum(q_codes, t_codes)
+    forward = q_codes < t_codes
+    order = np.lexsort((np.arange(n), keys))
+    sorted_keys = keys[order]
+    # 每行所在分组（同一无序对）的第一行在排序后的位置
+    group_start = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+    first = np.maximum.accumulate(np.where(group_start, np.arange(n), 0))
+    opposite = (forward[order] != forward[order][first]) & (q_codes[order] != t_codes[order])
+    candidates = np.flatnonzero(opposite)
+    groups, first_opposite = np.unique(first[candidates], return_index=True)
+    roles[order[groups]] = PAIR_PRIMARY
+    roles[order[candidates[first_opposite]]] = PAIR_DERIVED
+    return roles
+
+def read_pair_roles(aln_path, chunksize=1000000):
+    """预先扫描一遍 query/target 两列，返回整个输入每一行的对称去重角色"""
+    q_parts, t_parts = [], []
+    for q_codes, t_codes, _, _ in iter_pair_codes(aln_path, chunksize=chunksize):
+        q_parts.append(q_codes)
+        t_parts.append(t_codes)
+    if not q_parts:
+        return np.empty(0, dtype=np.int8)
+    return pair_roles(np.concatenate(q_parts), np.concatenate(t_parts))
+
+def configure(pdb_dir, cache_dir, aggregate_only=False, sample_fraction=0.0,
+              profile_chunks=(), profile_dir=None, trace_memory=False, self_hits='compute'):
+    """设置结构目录、缓存目录、输出模式和性能剖析选项（主进程和每个工作进程各调用一次）"""
+    global PDB_DIR, STRUCTURE_CACHE_DIR, AGGREGATE_ONLY, SAMPLE_FRACTION
+    global PROFILE_CHUNKS, PROFILE_DIR, TRACE_MEMORY, SELF_HITS
+    PDB_DIR = pdb_dir
+    STRUCTURE_CACHE_DIR = cache_dir
+    AGGREGATE_ONLY = aggregate_only
+    SAMPLE_FRACTION = sample_fraction
+    SELF_HITS = self_hits
+    PROFILE_CHUNKS = frozenset(profile_chunks or ())
+    PROFILE_DIR = profile_dir
+    TRACE_MEMORY = trace_memory
+    _STRUCTURE_STORES.clear()
+
+def sample_results(results, fraction):
+    """按 query/target 的哈希确定性地抽取一部分比对，多次运行和多进程下结果一致"""
+    if fraction <= 0:
+        return []
+    threshold = fraction * 2**32
+    return [res for res in results
+            if zlib.crc32(f"{res['query']}\t{res['target']}".encode('utf-8')) < threshold]
+
+def accumulate_results(results, stats=None):
+    """把逐比对的残基贡献直接累积到每个残基的统计量中"""
+    stats = stats if stats is not None else ResidueStats()
+    if results:
+        stats.update(np.concatenate([res['residue_numbers'] for res in results]),
+                     np.concatenate([res['residue_contributions'] for res in results]))
+    return stats
+
+def process_chunk(chunk_index, chunk):
+    """处理一个数据块
+
+    返回 (块号, 输出DataFrame, 比对数, 错误DataFrame, 残基统计量, 块的运行指标, 对称去重信息)；
+    只输出汇总模式下输出DataFrame只含抽样的明细，否则残基统计量为None。
+    对称去重信息在数据块没有 pair_role 列时为None，否则为 (没有产生结果的主行的 (query, target) 列表,
+    本块跳过的 PAIR_DERIVED 行)，交给 resolve_derived_rows 决定哪些反方向行需要补算。
+    块号在 PROFILE_CHUNKS 中时在cProfile下运行，剖析结果写入 PROFILE_DIR。
+    """
+    if chunk_index in PROFILE_CHUNKS:
+        prefix = os.path.join(PROFILE_DIR, f"chunk_{chunk_index:06d}")
+        return profile_call(_process_chunk, (chunk_index, chunk), prefix, trace_memory=TRACE_MEMORY)
+    return _process_chunk(chunk_index, chunk)
+
+def _process_chunk(chunk_index, chunk):
+    metrics = RunMetrics()
+    errors = []
+    start = time.perf_counter()
+    try:
+        results = calculate_residue_rmsd_contributions_batch(chunk, errors=errors, metrics=metrics)
+        with metrics.timer('build_frames'):
+            if AGGREGATE_ONLY:
+                chunk_stats = accumulate_results(results)
+                result_df = results_to_frame(sample_results(results, SAMPLE_FRACTION))
+            else:
+                chunk_stats = None
+                result_df = results_to_frame(results)
+    except Exception as e:
+        # 整块失败（计算、累积或组装结果时出错）时把块内每一行都记为错误，避免结果静默丢失；
+        # 跳过的反方向行除外，它们由 resolve_derived_rows 按主行的结果处理
+        results = []
+        failed_rows = chunk[chunk['pair_role'] != PAIR_DERIVED] if 'pair_role' in chunk else chunk
+        errors = [(idx, q, t, f"{type(e).__name__}: {e}")
+                  for idx, q, t in zip(failed_rows.index, failed_rows['query'], failed_rows['target'])]
+        metrics.skip('exception', len(failed_rows))
+        chunk_stats = ResidueStats() if AGGREGATE_ONLY else None
+        result_df = results_to_frame(results)
+    error_df = pd.DataFrame(errors, columns=ERROR_COLUMNS[1:])
+    error_df.insert(0, 'chunk', chunk_index)
+    pairs = None
+    if 'pair_role' in chunk:
+        roles = chunk['pair_role'].to_numpy()
+        failed = (roles == PAIR_PRIMARY) & ~chunk.index.isin([res['row'] for res in results])
+        pairs = (list(zip(chunk['query'].to_numpy()[failed], chunk['target'].to_numpy()[failed])),
+                 chunk[roles == PAIR_DERIVED])
+    metrics.add_time('compute', time.perf_counter() - start)
+    return chunk_index, result_df, len(results), error_df, chunk_stats, metrics, pairs
+
+def _concat_nonempty(first, second):
+    """拼接两个列相同的DataFrame，跳过空表（避免空表参与拼接时的dtype推断）"""
+    if not len(second):
+        return first
+    if not len(first):
+        return second.reset_index(drop=True)
+    return pd.concat([first, second], ignore_index=True)
+
+def resolve_derived_rows(processed, failed_primaries):
+    """对称去重模式下，按块顺序补算主行没有产生结果的反方向行
+
+    processed 为 iter_processed_chunks 按块顺序产出的结果。主行总在其反方向行之前（同一块或更早的块），
+    所以处理到某块时，它跳过的每个反方向行的主行是否成功都已确定。主行失败（结构无法加载、
+    比对无效等）时，反方向行按普通行在主进程中计算，结果或错误追加到该块的输出之后。
+    failed_primaries 为尚未遇到反方向行的失败主行 {(query, target)}，原地更新（断点续跑时需要保存）。
+    产出与 process_chunk 相同、去掉最后一项的元组。
+    """
+    for chunk_index, result_df, n_results, error_df, chunk_stats, metrics, pairs in processed:
+        if pairs is not None:
+            failed, derived = pairs
+            failed_primaries.update(failed)
+            orphaned = np.array([(t, q) in failed_primaries for q, t in zip(derived['query'], derived['target'])],
+                                dtype=bool)
+            if orphaned.any():
+                rows = derived[orphaned].drop(columns='pair_role')
+                failed_primaries.difference_update(zip(rows['target'], rows['query']))
+                _, extra_df, extra_results, extra_errors, extra_stats, extra_metrics, _ = _process_chunk(
+                    chunk_index, rows)
+                metrics.merge(extra_metrics)
+                metrics.count('derived_rows_recomputed', len(rows))
+                result_df = _concat_nonempty(result_df, extra_df)
+                error_df = _concat_nonempty(error_df, extra_errors)
+                n_results += extra_results
+                if chunk_stats is not None:
+                    chunk_stats.merge(extra_stats)
+        yield chunk_index, result_df, n_results, error_df, chunk_stats, metrics
+
+def iter_processed_chunks(chunks, workers=1, max_pending=None, start_index=0):
+    """按输入顺序产出处理结果
+
+    workers > 1 时用进程池并行处理，任意时刻最多有 max_pending 个块在计算或等待写出，
+    防止结果在内存中堆积。start_index 为第一个块的块号（断点续跑时不为0）。
+    """
+    if workers <= 1:
+        for chunk_index, chunk in enumerate(chunks, start_index):
+            yield process_chunk(chunk_index, chunk)
+        return
+
+    max_pending = max_pending or 2 * workers
+    chunk_iter = enumerate(chunks, start_index)
+    running = set()
+    finished = {}
+    next_index = start_index
+    exhausted = False
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure,
+                             initargs=(PDB_DIR, STRUCTURE_CACHE_DIR, AGGREGATE_ONLY, SAMPLE_FRACTION,
+                                       PROFILE_CHUNKS, PROFILE_DIR, TRACE_MEMORY, SELF_HITS)) as pool:
+        while True:
+            # 提交新任务，直到达到背压上限
+            while not exhausted and len(running) + len(finished) < max_pending:
+                try:
+                    chunk_index, chunk = next(chunk_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                running.add(pool.submit(process_chunk, chunk_index, chunk))
+            if not running and not finished:
+                break
+            if running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    finished[result[0]] = result
+            # 只按块号顺序写出，保证输出确定
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+def metrics_rates(metrics, elapsed):
+    """由累计的计数器得出吞吐量和结构缓存命中率"""
+    counters = metrics.counters
+    hits = counters.get('structure_memory_hits', 0) + counters.get('structure_disk_hits', 0)
+    lookups = hits + counters.get('structure_parsed', 0)
+    return {
+        'rows_per_sec': round(counters.get('rows_in', 0) / elapsed, 1) if elapsed > 0 else None,
+        'alignments_per_sec': round(counters.get('alignments_out', 0) / elapsed, 1) if elapsed > 0 else None,
+        'structure_cache_hit_rate': round(hits / lookups, 4) if lookups else None,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="计算Foldseek比对中每个残基的RMSD贡献")
+    parser.add_argument('--pdb-dir', default=PDB_DIR, help="PDB结构目录")
+    parser.add_argument('--alignments', default=ALN_RESULTS, help="Foldseek比对结果TSV或aln_store导入的比对库目录")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="输出目录")
+    parser.add_argument('--cache-dir', default=None,
+                        help="结构坐标磁盘缓存目录（默认 输出目录/structure_cache）")
+    parser.add_argument('--no-disk-cache', action='store_true', help="只使用内存中的结构缓存")
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help="每批处理的比对行数")
+    parser.add_argument('--workers', type=int, default=1, help="并行工作进程数")
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help="最多同时在计算或等待写出的块数（默认 2*workers）")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="输出格式：CSV，或按query分区、字典编码的Parquet数据集")
+    parser.add_argument('--partitions', type=int, default=16, help="Parquet输出的query分区数")
+    parser.add_argument('--aggregate-only', action='store_true',
+                        help="只输出每个残基的汇总统计（residue_rmsd_summary.csv），不写出逐残基明细")
+    parser.add_argument('--sample-fraction', type=float, default=0.0,
+                        help="只输出汇总模式下抽样写出明细的比对比例（residue_rmsd_sample.csv）")
+    parser.add_argument('--resume', action='store_true',
+                        help="按输出目录中的断点清单跳过已完成的块，截断写了一半的输出后继续")
+    parser.add_argument('--checkpoint-every', type=int, default=None,
+                        help="每处理多少个块记录一次断点（默认CSV每块一次，Parquet每20块一次）")
+    parser.add_argument('--dedup-pairs', action='store_true', default=DEDUP_PAIRS,
+                        help="对称去重：A→B 与 B→A 只叠合一次，B→A 的记录由同一次叠合导出，紧跟在A→B之后写出。"
+                             "这是近似：B→A 的记录沿用 A→B 的比对，不使用Foldseek给出的 B→A 比对；"
+                             "A→B 没有结果时 B→A 仍单独计算")
+    parser.add_argument('--self-hits', choices=['compute', 'zero', 'skip'], default=SELF_HITS,
+                        help="自比对的处理：compute 正常计算；zero 对角比对直接记为0；skip 跳过")
+    parser.add_argument('--metrics', default=None,
+                        help="JSON行格式的运行指标文件（默认 输出目录/residue_rmsd_metrics.jsonl）")
+    parser.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL,
+                        help="每隔多少秒写一条进度指标（0为只写最终报告）")
+    parser.add_argument('--profile-chunks', type=int, nargs='+', default=[],
+                        help="在cProfile下运行这些块号（从0开始），结果写入 --profile-dir")
+    parser.add_argument('--profile-dir', default=None, help="剖析结果目录（默认 输出目录/profiles）")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="剖析的块同时用tracemalloc记录峰值内存和分配最多的代码行")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    cache_dir = None
+    if not args.no_disk_cache:
+        cache_dir = args.cache_dir or os.path.join(args.output_dir, "structure_cache")
+    profile_dir = None
+    if args.profile_chunks:
+        profile_dir = args.profile_dir or os.path.join(args.output_dir, "profiles")
+        os.makedirs(profile_dir, exist_ok=True)
+    configure(args.pdb_dir, cache_dir, args.aggregate_only, args.sample_fraction,
+              args.profile_chunks, profile_dir, args.trace_memory, args.self_hits)
+
+    mode = 'aggregate' if args.aggregate_only else args.format
+    checkpoint_every = args.checkpoint_every or (20 if mode == 'parquet' else 1)
+    # 断点清单：只有输入文件和分块方式相同时才能续跑
+    settings = {
+        'alignments': os.path.abspath(args.alignments),
+        'chunksize': args.chunksize,
+        'mode': mode,
+        'sample_fraction': args.sample_fraction if args.aggregate_only else 0.0,
+        'partitions': args.partitions if mode == 'parquet' else None,
+    }
+    if args.dedup_pairs or args.self_hits != 'compute':
+        settings.update(dedup_pairs=args.dedup_pairs, self_hits=args.self_hits)
+    checkpoint = RunCheckpoint(os.path.join(args.output_dir, "residue_rmsd_checkpoint.json"), settings)
+
+    # 运行指标：续跑时追加到已有的指标文件
+    metrics = RunMetrics()
+    metrics_log = MetricsLog(args.metrics or os.path.join(args.output_dir, "residue_rmsd_metrics.jsonl"),
+                             interval=args.metrics_interval, append=args.resume)
+
     # 1. 读取比对结果
     print("Loading alignment results...")
     try:
-        # 使用迭代器分批读取
-        chunksize = 10000  # 每批处理10,000行
-        output_file = os.path.join(OUTPUT_DIR, "residue_rmsd_contributions.csv")
+        resumed = args.resume and checkpoint.load()
+        if resumed and checkpoint.state['completed']:
+            print(f"Run already completed according to {checkpoint.path}")
+            return
+        state = checkpoint.state
         
-        # 写入CSV文件头
-        pd.DataFrame(columns=['query', 'target', 'residue_number', 'rmsd_contribution', 'total_rmsd', 'aligned_length']).to_csv(output_file, index=False)
+        error_file = os.path.join(args.output_dir, "residue_rmsd_errors.csv")
+        summary_file = os.path.join(args.output_dir, "residue_rmsd_summary.csv")
+        stats_state_file = os.path.join(args.output_dir, "residue_rmsd_checkpoint_stats.npz")
+        parquet_writer = None
+        if args.aggregate_only:
+            # 只输出汇总时，明细文件只包含抽样的比对
+            output_file = os.path.join(args.output_dir, "residue_rmsd_sample.csv")
+            stats = ResidueStats.load(stats_state_file) if resumed and state['chunks_done'] else ResidueStats()
+        else:
+            stats = None
+            output_file = os.path.join(args.output_dir, PARQUET_NAME if mode == 'parquet' else CSV_NAME)
+        csv_output = mode == 'csv' or (args.aggregate_only and args.sample_fraction > 0)
         
-        total_processed = 0
+        if resumed:
+            # 截断崩溃时写了一半的尾部，从最后一个断点继续
+            checkpoint.truncate_outputs()
+            print(f"Resuming after {state['chunks_done']} completed batches "
+                  f"({state['total_processed']} alignments)")
+        else:
+            # 写入CSV文件头
+            if csv_output:
+                pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(output_file, index=False)
+            pd.DataFrame(columns=ERROR_COLUMNS).to_csv(error_file, index=False)
+        if mode == 'parquet':
+            parquet_writer = ParquetContributionWriter(
+                output_file, n_partitions=args.partitions,
+                resume_file_index=state['extra'].get('parquet_file_index') if resumed else None)
+        tracked_files = [error_file] + ([output_file] if csv_output else [])
+        if not resumed:
+            checkpoint.commit(tracked_files)
         
-        for chunk in pd.read_csv(ALN_RESULTS, sep='\t', header=None, names=COLUMN_NAMES, chunksize=chunksize):
-            print(f"Processing batch of {len(chunk)} alignments...")
-            
-            # 2. 计算残基RMSD贡献
-            results = calculate_residue_rmsd_contributions_batch(chunk)
+        total_processed = state['total_processed']
+        total_errors = state['total_errors']
+        start_index = state['chunks_done']
+        
+        # 使用迭代器分批读取（续跑时跳过已完成块的输入行）
+        skipped_rows = start_index * args.chunksize
+        if is_alignment_store(args.alignments):
+            # aln_store导入的比对库：直接按行范围切片，无需解析TSV
+            chunks = AlignmentStore(args.alignments).iter_chunks(args.chunksize, start=skipped_rows)
+        else:
+            chunks = pd.read_csv(args.alignments, sep='\t', header=None, names=COLUMN_NAMES,
+                                 chunksize=args.chunksize, skiprows=skipped_rows)
+            if skipped_rows:
+                # 行号保持为输入文件中的行号，与不中断时的错误记录一致
+                chunks = (chunk.set_axis(chunk.index + skipped_rows) for chunk in chunks)
+        if args.dedup_pairs:
+            # 行号即输入文件中的行号，按行号取出每行的角色
+            with metrics.timer('pair_roles'):
+                roles = read_pair_roles(args.alignments)
+            print(f"Symmetric pairs: {np.count_nonzero(roles == PAIR_DERIVED)} of {len(roles)} "
+                  f"alignments will be derived from their reverse")
+            chunks = (chunk.assign(pair_role=roles[chunk.index.to_numpy()]) for chunk in chunks)
+        chunks = metrics.timed_iter(chunks, 'read_input')
+        
+        # 2. 计算残基RMSD贡献（单进程或进程池）
+        processed = iter_processed_chunks(chunks, workers=args.workers, max_pending=args.max_pending,
+                                          start_index=start_index)
+        # 对称去重时补算主行失败的反方向行；续跑时从断点清单恢复尚未遇到反方向行的失败主行
+        failed_primaries = set(map(tuple, state['extra'].get('failed_primaries', []))) if resumed else set()
+        processed = resolve_derived_rows(processed, failed_primaries)
+        for chunk_index, result_df, n_results, error_df, chunk_stats, chunk_metrics in processed:
+            metrics.merge(chunk_metrics)
+            metrics.count('chunks')
+            if stats is not None:
+                stats.merge(chunk_stats)
+            # 3. 保存计算结果（由主进程按块顺序追加到文件）
+            with metrics.timer('write_output'):
+                if len(result_df):
+                    if parquet_writer is not None:
+                        # 每个处理块写成一个row group
+                        parquet_writer.write_chunk(result_df)
+                    else:
+                        result_df.to_csv(output_file, mode='a', header=False, index=False)
+                if len(error_df):
+                    error_df.to_csv(error_file, mode='a', header=False, index=False)
+            total_processed += n_results
+            total_errors += len(error_df)
+            print(f"Processed {total_processed} alignments so far (batch {chunk_index + 1}, {len(error_df)} errors)")
+            if metrics_log.due():
+                metrics_log.emit('progress', metrics, chunk=chunk_index, total_processed=total_processed,
+                                 **metrics_rates(metrics, metrics_log.elapsed()))
             
-            if results:
-                # 3. 保存计算结果（追加到文件）
-                output_data = []
-                for res in results:
-                    for r_num, val in res['residue_contributions'].items():
-                        output_data.append({
-                            'query': res['query'],
-                            'target': res['target'],
-                            'residue_number': r_num,
-                            'rmsd_contribution': val,
-                            'total_rmsd': res['total_rmsd'],
-                            'aligned_length': res['aligned_length']
-                        })
-                
-                result_df = pd.DataFrame(output_data)
-                result_df.to_csv(output_file, mode='a', header=False, index=False)
-                total_processed += len(results)
-                print(f"Processed {total_processed} alignments so far")
+            # 4. 记录断点
+            if (chunk_index + 1) % checkpoint_every == 0:
+                extra = {}
+                if parquet_writer is not None:
+                    parquet_writer.roll()
+                    extra['parquet_file_index'] = parquet_writer.file_index
+                if args.dedup_pairs:
+                    extra['failed_primaries'] = sorted(failed_primaries)
+                if stats is not None:
+                    tmp_path = stats_state_file + ".tmp.npz"
+                    stats.save(tmp_path)
+                    os.replace(tmp_path, stats_state_file)
+                with metrics.timer('checkpoint'):
+                    checkpoint.commit(tracked_files, chunks_done=chunk_index + 1, total_processed=total_processed,
+                                      total_errors=total_errors, extra=extra)
             
             # 手动清理内存
-            del chunk, results, output_data, result_df
+            del result_df, error_df
+        
+        if parquet_writer is not None:
+            parquet_writer.close()
             
         print(f"Total processed: {total_processed} alignments")
-        print(f"Results saved to: {output_file}")
+        if stats is not None:
+            stats.save_summary(summary_file)
+            print(f"Residue summary saved to: {summary_file}")
+            if args.sample_fraction > 0:
+                print(f"Sampled details saved to: {output_file}")
+        else:
+            print(f"Results saved to: {output_file}")
+        if total_errors:
+            print(f"{total_errors} alignments failed, see: {error_file}")
+        checkpoint.commit(tracked_files, total_processed=total_processed, total_errors=total_errors,
+                          completed=True)
+        report = metrics_log.emit('final', metrics, total_processed=total_processed, total_errors=total_errors,
+                                  **metrics_rates(metrics, metrics_log.elapsed()))
+        print_report(report)
+        print(f"Metrics saved to: {metrics_log.path}")
         
     except Exception as e:
         print(f"Error processing alignment file: {str(e)}")
         return
+    finally:
+        metrics_log.close()
+
+def print_report(report):
+    """打印最终报告：各阶段耗时、吞吐量、缓存命中率和跳过原因"""
+    print(f"Elapsed {report['elapsed']:.1f}s, {report['rows_per_sec']} rows/s, "
+          f"structure cache hit rate {report['structure_cache_hit_rate']}")
+    for stage, seconds in sorted(report['timers'].items(), key=lambda item: -item[1]):
+        print(f"  {stage:<20}{seconds:>10.2f}s")
+    if report['skips']:
+        print("Skipped alignments: " + ", ".join(f"{reason}={n}" for reason, n in sorted(report['skips'].items())))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,129 +1,231 @@
 # -*- coding: utf-8 -*-
-import pandas as pd
-import numpy as np
 import os
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .aln_store import iter_pair_codes
+    from .group_matrix import GroupMatcher
+    from .pair_scan import PairDeduplicator, RunningStats, canonical_pair_keys
+    from .quantile_sketch import LogHistogram
+else:
+    from aln_store import iter_pair_codes
+    from group_matrix import GroupMatcher
+    from pair_scan import PairDeduplicator, RunningStats, canonical_pair_keys
+    from quantile_sketch import LogHistogram
 
 # 配置路径
 ALN_RESULTS = "D:/tools/data/GII_GIX_foldseek/aln_results_rmsd.tsv"
 OUTPUT_DIR = "D:/tools/data/GII_GIX_foldseek/results/"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# Foldseek输出列顺序
-COLUMN_NAMES = ['query', 'target', 'qaln', 'taln', 'evalue', 'rmsd']
-
-# 读取Foldseek比对结果
-print("Loading Foldseek alignment results...")
-try:
-    aln_df = pd.read_csv(ALN_RESULTS, sep='\t', header=None, names=COLUMN_NAMES)
-    print(f"Total alignments loaded: {len(aln_df)}")
-except Exception as e:
-    print(f"Error loading file: {e}")
-    exit()
-
-# 提取所有GII_pdb和GIX_pdb的ID
-GII_ids = set()
-GIX_ids = set()
-
-for _, row in aln_df.iterrows():
-    if row['query'].startswith('GII_pdb'):
-        GII_ids.add(row['query'])
-    if row['target'].startswith('GII_pdb'):
-        GII_ids.add(row['target'])
-    if row['query'].startswith('GIX_pdb'):
-        GIX_ids.add(row['query'])
-    if row['target'].startswith('GIX_pdb'):
-        GIX_ids.add(row['target'])
-
-print(f"Found {len(GII_ids)} unique GII_pdb structures")
-print(f"Found {len(GIX_ids)} unique GIX_pdb structures")
-print(f"Theoretical maximum pairs: {len(GII_ids) * len(GIX_ids)}")
-
-# 筛选GII_pdb vs GIX_pdb的比对对
-print("\nFiltering GII_pdb vs GIX_pdb alignments...")
-
-filtered_data = []
-found_pairs = set()
-
-for idx, row in aln_df.iterrows():
-    query = row['query']
-    target = row['target']
-    
-    # 检查是否满足条件：一个以GII_pdb开头，另一个以GIX_pdb开头
-    if (query.startswith('GII_pdb') and target.startswith('GIX_pdb')) or \
-       (query.startswith('GIX_pdb') and target.startswith('GII_pdb')):
-        # 创建标准化的键（按字母顺序排序，避免重复）
-        pair_key = tuple(sorted([query, target]))
-        if pair_key not in found_pairs:
-            found_pairs.add(pair_key)
-            filtered_data.append(row)
-
-# 创建过滤后的DataFrame
-filtered_df = pd.DataFrame(filtered_data)
-
-print(f"Found {len(filtered_df)} unique GII_pdb vs GIX_pdb alignments")
-print(f"Coverage: {len(filtered_df)/ (len(GII_ids) * len(GIX_ids)) * 100:.2f}% of theoretical maximum")
-
-# 如果没有找到足够的比对对，显示一些示例数据来帮助诊断
-if len(filtered_df) < len(GII_ids) * len(GIX_ids):
-    print("\nNot all possible pairs were found. This could be due to:")
-    print("1. FoldSeek filtering based on e-value or other criteria")
-    print("2. Poor quality structures that couldn't be aligned")
-    print("3. Memory or computational limitations during FoldSeek run")
-    
-    # 保存诊断信息
-    with open(os.path.join(OUTPUT_DIR, 'coverage_analysis.txt'), 'w', encoding='utf-8') as f:
+GROUP_A = 'GII_pdb'
+GROUP_B = 'GIX_pdb'
+CHUNKSIZE = 1000000  # 每块读取的比对行数
+
+
+def query_store_group_pairs(db_path, group_a, group_b, pairs_file):
+    """query_layer查询库：直接用按组建立的索引查询两组之间的结构对，不扫描全部比对
+
+    group_a / group_b 须是建库时的组名（默认前缀分组时即前缀本身）。返回值同 scan_group_pairs。
+    """
+    if __package__:
+        from .query_layer import QueryStore
+    else:
+        from query_layer import QueryStore
+    with QueryStore(db_path) as store:
+        missing = [group for group in (group_a, group_b) if group not in store.groups]
+        if missing:
+            raise ValueError(f"Groups {missing} not in query store (groups: {store.groups}); "
+                             f"rebuild it with --group-prefixes {group_a} {group_b}")
+        ids_a = set(store.structures(groups=[group_a])['structure_id'])
+        ids_b = set(store.structures(groups=[group_b])['structure_id'])
+        pairs = store.group_pairs(group_a, group_b)
+    stats = RunningStats()
+    sketch = LogHistogram()
+    stats.update(pairs['rmsd'].to_numpy(dtype=np.float64))
+    sketch.update(pairs['rmsd'].to_numpy(dtype=np.float64))
+    pairs.to_csv(pairs_file, header=False, index=False, lineterminator='\n')
+    print(f"Selected {len(pairs)} alignments from query store")
+    return ids_a, ids_b, stats, sketch
+
+
+def scan_group_pairs(aln_path, group_a, group_b, pairs_file, chunksize=CHUNKSIZE):
+    """单次流式扫描比对结果（Foldseek TSV或aln_store导入的比对库）
+
+    统计两组结构的ID、筛选并去重两组之间的结构对（保留首次出现的方向），
+    把筛选出的结构对逐块写入 pairs_file，同时累积RMSD统计量和分位数草图（不保留全部RMSD值）。
+    query_layer查询库改用带索引的组查询（query_store_group_pairs）。
+    返回 (A组ID集合, B组ID集合, RMSD统计量, RMSD分位数草图)
+    """
+    if __package__:
+        from .query_layer import is_query_store
+    else:
+        from query_layer import is_query_store
+    if is_query_store(aln_path):
+        return query_store_group_pairs(aln_path, group_a, group_b, pairs_file)
+
+    dedup = PairDeduplicator()
+    stats = RunningStats()
+    sketch = LogHistogram()
+    # 每个结构编号所属的组：0为A组，1为B组，-1为其他（按编号缓存，每个ID只判断一次）
+    matcher = GroupMatcher(prefixes=[group_a, group_b])
+    names = []
+    total_rows = 0
+
+    with open(pairs_file, 'w', encoding='utf-8') as out:
+        for q_codes, t_codes, rmsd, names in iter_pair_codes(aln_path, chunksize=chunksize):
+            total_rows += len(q_codes)
+            membership = matcher.update(names)
+            q_group = membership[q_codes]
+            t_group = membership[t_codes]
+            # 一个属于A组，另一个属于B组
+            cross = ((q_group == 0) & (t_group == 1)) | ((q_group == 1) & (t_group == 0))
+            if not cross.any():
+                continue
+            rows = np.flatnonzero(cross)
+            keys = canonical_pair_keys(q_codes[rows], t_codes[rows])
+            rows = rows[dedup.first_occurrences(keys)]
+            if not len(rows):
+                continue
+
+            selected_rmsd = rmsd[rows]
+            stats.update(selected_rmsd)
+            sketch.update(selected_rmsd)
+            id_table = np.asarray(names, dtype=object)
+            pd.DataFrame({
+                'query': id_table[q_codes[rows]],
+                'target': id_table[t_codes[rows]],
+                'rmsd': selected_rmsd
+            }).to_csv(out, header=False, index=False, lineterminator='\n')
+
+    membership = matcher.update(names)
+    names = np.asarray(names, dtype=object)
+    ids_a = set(names[np.flatnonzero(membership == 0)])
+    ids_b = set(names[np.flatnonzero(membership == 1)])
+    print(f"Total alignments scanned: {total_rows}")
+    return ids_a, ids_b, stats, sketch
+
+
+def write_coverage_analysis(path, group_a, group_b, ids_a, ids_b, n_pairs):
+    """保存诊断信息"""
+    max_pairs = len(ids_a) * len(ids_b)
+    with open(path, 'w', encoding='utf-8') as f:
         f.write("Coverage Analysis\n")
         f.write("=================\n")
-        f.write(f"Unique GII_pdb structures: {len(GII_ids)}\n")
-        f.write(f"Unique GIX_pdb structures: {len(GIX_ids)}\n")
-        f.write(f"Theoretical maximum pairs: {len(GII_ids) * len(GIX_ids)}\n")
-        f.write(f"Actual pairs found: {len(filtered_df)}\n")
-        f.write(f"Coverage: {len(filtered_df)/ (len(GII_ids) * len(GIX_ids)) * 100:.2f}%\n")
-        f.write("\nGII_pdb structures:\n")
-        for i, id in enumerate(sorted(GII_ids)):
+        f.write(f"Unique {group_a} structures: {len(ids_a)}\n")
+        f.write(f"Unique {group_b} structures: {len(ids_b)}\n")
+        f.write(f"Theoretical maximum pairs: {max_pairs}\n")
+        f.write(f"Actual pairs found: {n_pairs}\n")
+        f.write(f"Coverage: {n_pairs / max_pairs * 100:.2f}%\n")
+        f.write(f"\n{group_a} structures:\n")
+        for i, id in enumerate(sorted(ids_a)):
             f.write(f"{i+1}. {id}\n")
-        f.write("\nGIX_pdb structures:\n")
-        for i, id in enumerate(sorted(GIX_ids)):
+        f.write(f"\n{group_b} structures:\n")
+        for i, id in enumerate(sorted(ids_b)):
             f.write(f"{i+1}. {id}\n")
-    
-    print("Coverage analysis saved to coverage_analysis.txt")
-
-# 提取RMSD值并转换为float
-rmsd_values = filtered_df['rmsd'].astype(float).values
-
-# 计算总体统计量
-mean_rmsd = np.mean(rmsd_values)
-std_rmsd = np.std(rmsd_values)
-median_rmsd = np.median(rmsd_values)
-min_rmsd = np.min(rmsd_values)
-max_rmsd = np.max(rmsd_values)
-
-# 输出标准RMSD统计结果
-print("\n=== STANDARD RMSD STATISTICS ===")
-print(f"Number of alignments: {len(rmsd_values)}")
-print(f"Mean RMSD: {mean_rmsd:.4f} Å")
-print(f"Std RMSD: {std_rmsd:.4f} Å")
-print(f"Median RMSD: {median_rmsd:.4f} Å")
-print(f"Min RMSD: {min_rmsd:.4f} Å")
-print(f"Max RMSD: {max_rmsd:.4f} Å")
-print("================================")
-
-# 保存统计结果到文件
-stats_file = os.path.join(OUTPUT_DIR, 'GII_vs_GIX_standard_rmsd_stats.txt')
-with open(stats_file, 'w', encoding='utf-8') as f:
-    f.write("Standard RMSD Statistics for GII_pdb vs GIX_pdb comparisons\n")
-    f.write("============================================================\n")
-    f.write(f"Number of alignments: {len(rmsd_values)}\n")
-    f.write(f"Mean RMSD: {mean_rmsd:.4f} Å\n")
-    f.write(f"Standard deviation RMSD: {std_rmsd:.4f} Å\n")
-    f.write(f"Median RMSD: {median_rmsd:.4f} Å\n")
-    f.write(f"Minimum RMSD: {min_rmsd:.4f} Å\n")
-    f.write(f"Maximum RMSD: {max_rmsd:.4f} Å\n")
-    f.write("\nPairwise comparisons:\n")
-    f.write("Query,Target,RMSD\n")
-    for _, row in filtered_df.iterrows():
-        f.write(f"{row['query']},{row['target']},{row['rmsd']}\n")
-
-print(f"Saved standard RMSD statistics to {stats_file}")
-
-print("\nAnalysis completed successfully!")
\ No newline at end of file
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="统计两组结构之间比对的标准RMSD")
+    parser.add_argument('--alignments', default=ALN_RESULTS, help="Foldseek比对结果TSV、aln_store导入的比对库目录或query_layer查询库")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="输出目录")
+    parser.add_argument('--group-a', default=GROUP_A, help="第一组结构ID前缀")
+    parser.add_argument('--group-b', default=GROUP_B, help="第二组结构ID前缀")
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help="每块读取的比对行数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    group_a, group_b = args.group_a, args.group_b
+    os.makedirs(args.output_dir, exist_ok=True)
+    name_a, name_b = group_a.split('_')[0], group_b.split('_')[0]
+    stats_file = os.path.join(args.output_dir, f'{name_a}_vs_{name_b}_standard_rmsd_stats.txt')
+    pairs_file = stats_file + '.pairs.tmp'
+
+    # 单次流式读取Foldseek比对结果，同时筛选两组之间的比对对
+    print("Scanning Foldseek alignment results...")
+    print(f"Filtering {group_a} vs {group_b} alignments...")
+    try:
+        ids_a, ids_b, stats, sketch = scan_group_pairs(
+            args.alignments, group_a, group_b, pairs_file, chunksize=args.chunksize)
+    except Exception as e:
+        print(f"Error loading file: {e}")
+        if os.path.exists(pairs_file):
+            os.remove(pairs_file)
+        return
+
+    n_pairs = stats.count
+    max_pairs = len(ids_a) * len(ids_b)
+    print(f"Found {len(ids_a)} unique {group_a} structures")
+    print(f"Found {len(ids_b)} unique {group_b} structures")
+    print(f"Theoretical maximum pairs: {max_pairs}")
+    print(f"Found {n_pairs} unique {group_a} vs {group_b} alignments")
+    if max_pairs:
+        print(f"Coverage: {n_pairs / max_pairs * 100:.2f}% of theoretical maximum")
+
+    # 如果没有找到足够的比对对，显示一些示例数据来帮助诊断
+    if max_pairs and n_pairs < max_pairs:
+        print("\nNot all possible pairs were found. This could be due to:")
+        print("1. FoldSeek filtering based on e-value or other criteria")
+        print("2. Poor quality structures that couldn't be aligned")
+        print("3. Memory or computational limitations during FoldSeek run")
+        write_coverage_analysis(os.path.join(args.output_dir, 'coverage_analysis.txt'),
+                                group_a, group_b, ids_a, ids_b, n_pairs)
+        print("Coverage analysis saved to coverage_analysis.txt")
+
+    if not n_pairs:
+        print("No alignments found between the two groups.")
+        os.remove(pairs_file)
+        return
+
+    # 计算总体统计量
+    mean_rmsd = stats.mean
+    std_rmsd = stats.std()
+    quantiles = sketch.summary()
+    median_rmsd = quantiles['median']
+    min_rmsd = stats.min
+    max_rmsd = stats.max
+
+    # 输出标准RMSD统计结果
+    print("\n=== STANDARD RMSD STATISTICS ===")
+    print(f"Number of alignments: {n_pairs}")
+    print(f"Mean RMSD: {mean_rmsd:.4f} Å")
+    print(f"Std RMSD: {std_rmsd:.4f} Å")
+    # 中位数和分位数来自对数分箱草图（相对误差不超过一个箱宽，默认参数下约1.2%），只给两位小数并标注为近似值
+    print(f"Median RMSD (approx.): {median_rmsd:.2f} Å")
+    print(f"IQR RMSD (approx.): {quantiles['iqr']:.2f} Å ({quantiles['q1']:.2f} - {quantiles['q3']:.2f})")
+    print(f"P5 / P95 RMSD (approx.): {quantiles['p5']:.2f} / {quantiles['p95']:.2f} Å")
+    print(f"Min RMSD: {min_rmsd:.4f} Å")
+    print(f"Max RMSD: {max_rmsd:.4f} Å")
+    print("================================")
+
+    # 保存统计结果到文件（比对对列表从临时文件流式拷贝）
+    with open(stats_file, 'w', encoding='utf-8') as f:
+        title = f"Standard RMSD Statistics for {group_a} vs {group_b} comparisons"
+        f.write(title + "\n")
+        f.write("=" * (len(title) + 1) + "\n")
+        f.write(f"Number of alignments: {n_pairs}\n")
+        f.write(f"Mean RMSD: {mean_rmsd:.4f} Å\n")
+        f.write(f"Standard deviation RMSD: {std_rmsd:.4f} Å\n")
+        f.write(f"Median RMSD (approx.): {median_rmsd:.2f} Å\n")
+        f.write(f"Interquartile range RMSD (approx.): {quantiles['iqr']:.2f} Å "
+                f"(Q1 {quantiles['q1']:.2f} Å, Q3 {quantiles['q3']:.2f} Å)\n")
+        f.write(f"5th percentile RMSD (approx.): {quantiles['p5']:.2f} Å\n")
+        f.write(f"95th percentile RMSD (approx.): {quantiles['p95']:.2f} Å\n")
+        f.write(f"Minimum RMSD: {min_rmsd:.4f} Å\n")
+        f.write(f"Maximum RMSD: {max_rmsd:.4f} Å\n")
+        f.write("\nPairwise comparisons:\n")
+        f.write("Query,Target,RMSD\n")
+        with open(pairs_file, 'r', encoding='utf-8') as pairs:
+            shutil.copyfileobj(pairs, f)
+    os.remove(pairs_file)
+
+    print(f"Saved standard RMSD statistics to {stats_file}")
+
+    print("\nAnalysis completed successfully!")
+
+
+if __name__ == "__main__":
+    main()
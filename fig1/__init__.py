@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""fig1：结构比对RMSD贡献、pLDDT和pTM的分析脚本
+
+各模块安装为包时以包内相对导入互相引用（from .residue_stats import ...），
+在本目录中直接运行脚本时退回平级导入（from residue_stats import ...）；
+安装后通过命令行入口 fig1 <子命令> 调用（见 cli.py）。
+"""
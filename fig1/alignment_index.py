@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""把Foldseek的带gap比对字符串（qaln/taln）转换为query/target残基下标数组"""
+import numpy as np
+
+GAP = ord('-')
+
+
+def _as_bytes(aln):
+    if isinstance(aln, bytes):
+        return aln
+    return str(aln).encode('ascii')
+
+
+def alignment_indices(qaln, taln):
+    """返回一对比对字符串中两侧都不是gap的列所对应的 (query下标, target下标)
+
+    下标从0开始，按各自序列中非gap字符的顺序计数。
+    """
+    q = np.frombuffer(_as_bytes(qaln), dtype=np.uint8)
+    t = np.frombuffer(_as_bytes(taln), dtype=np.uint8)
+    if len(q) != len(t):
+        raise ValueError(f"Alignment length mismatch: {len(q)} vs {len(t)}")
+    q_res = q != GAP
+    t_res = t != GAP
+    match = q_res & t_res
+    q_idx = np.cumsum(q_res, dtype=np.int64)[match] - 1
+    t_idx = np.cumsum(t_res, dtype=np.int64)[match] - 1
+    return q_idx, t_idx
+
+
+def alignment_indices_batch(qalns, talns):
+    """一次处理多条比对
+
+    所有比对拼接为一个字节数组后统一计算gap掩码和累加和，再减去每条比对起点处的偏移。
+    返回:
+        q_idx, t_idx：所有比对中对齐列的残基下标（拼接在一起）
+        row_ids：每个对齐列所属比对的序号
+        valid：每条比对两侧长度是否一致（不一致的比对不产生任何对齐列）
+    """
+    q_list = [_as_bytes(a) for a in qalns]
+    t_list = [_as_bytes(a) for a in talns]
+    q_len = np.fromiter((len(a) for a in q_list), dtype=np.int64, count=len(q_list))
+    t_len = np.fromiter((len(a) for a in t_list), dtype=np.int64, count=len(t_list))
+    valid = q_len == t_len
+    if not valid.all():
+        q_list = [a for a, ok in zip(q_list, valid) if ok]
+        t_list = [a for a, ok in zip(t_list, valid) if ok]
+    lengths = q_len[valid]
+    valid_rows = np.flatnonzero(valid)
+
+    q = np.frombuffer(b''.join(q_list), dtype=np.uint8)
+    t = np.frombuffer(b''.join(t_list), dtype=np.uint8)
+    q_res = q != GAP
+    t_res = t != GAP
+    match = q_res & t_res
+
+    # 每条比对起点之前累计的残基数，用于把全局累加和换算成比对内下标
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    q_cum = np.cumsum(q_res, dtype=np.int64)
+    t_cum = np.cumsum(t_res, dtype=np.int64)
+    q_base = np.concatenate(([0], q_cum))[starts]
+    t_base = np.concatenate(([0], t_cum))[starts]
+
+    column_rows = np.repeat(np.arange(len(lengths)), lengths)
+    q_idx = (q_cum - q_base[column_rows])[match] - 1
+    t_idx = (t_cum - t_base[column_rows])[match] - 1
+    row_ids = valid_rows[column_rows[match]]
+    return q_idx, t_idx, row_ids, valid
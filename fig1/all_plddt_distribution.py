@@ -1,128 +1,246 @@
 import os
-from Bio.PDB import PDBParser
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
 import pandas as pd
 import numpy as np
 
+if __package__:
+    from .bfactor_reader import read_atoms, residue_bfactors
+    from .file_manifest import FileManifest, drop_rows, file_signature
+else:
+    from bfactor_reader import read_atoms, residue_bfactors
+    from file_manifest import FileManifest, drop_rows, file_signature
+
 # 设置路径
-input_dir = r"D:\tools\data\input_pdbs"
-output_dir = r"D:\tools\data\plddt_analysis"  # 专门定义输出目录
+INPUT_DIR = r"D:\tools\data\input_pdbs"
+OUTPUT_DIR = r"D:\tools\data\plddt_analysis"  # 专门定义输出目录
+BATCH_SIZE = 500  # 每个任务处理的文件数
+MANIFEST_NAME = "plddt_manifest.json"
+
+RESIDUE_COLUMNS = ['filename', 'chain', 'residue_number', 'residue_name', 'plddt']
+SUMMARY_COLUMNS = ['filename', 'chain', 'mean_plddt', 'median_plddt', 'min_plddt',
+                   'max_plddt', 'std_plddt', 'residues_count']
 
-# 确保输出目录存在
-os.makedirs(output_dir, exist_ok=True)
 
-# 输出文件路径
-output_csv = os.path.join(output_dir, "all_plddt_data.csv")
-summary_csv = os.path.join(output_dir, "structure_summary.csv")
+def scan_pdb_files(input_dir):
+    """用 os.scandir 扫描目录中的 .pdb 文件，返回 {文件名: (大小, 修改时间ns)}（按目录顺序）"""
+    files = {}
+    with os.scandir(input_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".pdb"):
+                files[entry.name] = file_signature(entry)
+    return files
 
-all_data = []
-summary_list = []
-error_log = []
 
-parser = PDBParser()
-processed_files = 0
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-print(f"开始处理目录: {input_dir} 中的PDB文件...")
-print(f"共找到 {len(os.listdir(input_dir))} 个文件")
 
-for pdb_file in os.listdir(input_dir):
-    if pdb_file.endswith(".pdb"):
-        filepath = os.path.join(input_dir, pdb_file)
+def process_batch(batch_index, input_dir, pdb_files):
+    """处理一批PDB文件，返回 (批号, 残基级DataFrame, 结构摘要DataFrame, 错误信息列表, 成功处理的文件名列表)
+
+    残基数据按列收集为数组，每批只构建一次DataFrame。
+    """
+    columns = {name: [] for name in RESIDUE_COLUMNS}
+    summary = {name: [] for name in SUMMARY_COLUMNS}
+    errors = []
+    processed = []
+    for pdb_file in pdb_files:
         try:
-            structure = parser.get_structure(pdb_file[:-4], filepath)
-            model = structure[0]
-            
-            print(f"处理文件中: {pdb_file}...")
-            
-            for chain in model:
-                chain_id = chain.id
-                chain_data = []
-                for residue in chain:
-                    # 只处理标准氨基酸残基
-                    if residue.id[0] == ' ':
-                        res_num = residue.id[1]
-                        res_name = residue.get_resname()
-                        
-                        # 获取第一个原子的pLDDT值
-                        for atom in residue:
-                            plddt = atom.get_bfactor()
-                            break
-                        
-                        chain_data.append({
-                            'filename': pdb_file,
-                            'chain': chain_id,
-                            'residue_number': res_num,
-                            'residue_name': res_name,
-                            'plddt': plddt
-                        })
-                
-                if chain_data:
-                    chain_df = pd.DataFrame(chain_data)
-                    all_data.append(chain_df)
-                    
-                    # 计算统计量
-                    plddt_values = chain_df['plddt']
-                    summary_list.append({
-                        'filename': pdb_file,
-                        'chain': chain_id,
-                        'mean_plddt': np.mean(plddt_values),
-                        'median_plddt': np.median(plddt_values),
-                        'min_plddt': np.min(plddt_values),
-                        'max_plddt': np.max(plddt_values),
-                        'std_plddt': np.std(plddt_values),
-                        'residues_count': len(plddt_values)
-                    })
-            
-            processed_files += 1
-            if processed_files % 10 == 0:
-                print(f"已处理 {processed_files} 个文件...")
-                
+            # 只读取第一个模型的原子记录；只处理标准氨基酸残基（ATOM记录），取每个残基第一个原子的pLDDT值
+            atoms = read_atoms(os.path.join(input_dir, pdb_file))
+            if not len(atoms['bfactor']):
+                raise ValueError("no ATOM/HETATM records")
+            residues = residue_bfactors(atoms)
         except Exception as e:
-            error_msg = f"解析 {pdb_file} 时出错: {str(e)}"
-            print(error_msg)
-            error_log.append(error_msg)
-
-# 保存数据
-if all_data:
-    print("合并数据并保存...")
-    master_df = pd.concat(all_data, ignore_index=True)
-    master_df.to_csv(output_csv, index=False)
-    print(f"已保存残基级数据到: {output_csv}")
-    
-    summary_df = pd.DataFrame(summary_list)
-    summary_df.to_csv(summary_csv, index=False)
-    print(f"已保存结构摘要数据到: {summary_csv}")
-else:
-    print("警告: 未提取到任何数据!")
+            errors.append(f"解析 {pdb_file} 时出错: {str(e)}")
+            continue
+        chains = residues['chain']
+        for chain_id in pd.unique(chains):
+            in_chain = chains == chain_id
+            plddt_values = residues['bfactor'][in_chain]
+            n = len(plddt_values)
+            columns['filename'].append(np.full(n, pdb_file, dtype=object))
+            columns['chain'].append(np.full(n, chain_id, dtype=object))
+            columns['residue_number'].append(residues['residue_number'][in_chain])
+            columns['residue_name'].append(residues['residue_name'][in_chain].astype(object))
+            columns['plddt'].append(plddt_values)
+
+            # 计算统计量
+            summary['filename'].append(pdb_file)
+            summary['chain'].append(chain_id)
+            summary['mean_plddt'].append(np.mean(plddt_values))
+            summary['median_plddt'].append(np.median(plddt_values))
+            summary['min_plddt'].append(np.min(plddt_values))
+            summary['max_plddt'].append(np.max(plddt_values))
+            summary['std_plddt'].append(np.std(plddt_values))
+            summary['residues_count'].append(n)
+        processed.append(pdb_file)
+
+    if columns['plddt']:
+        residue_df = pd.DataFrame({name: np.concatenate(parts) for name, parts in columns.items()})
+    else:
+        residue_df = pd.DataFrame(columns=RESIDUE_COLUMNS)
+    return batch_index, residue_df, pd.DataFrame(summary, columns=SUMMARY_COLUMNS), errors, processed
+
+
+def iter_processed_batches(input_dir, batches, workers=1, max_pending=None):
+    """按输入顺序产出每批的处理结果；workers > 1 时用进程池并行，最多 max_pending 批在内存中"""
+    if workers <= 1:
+        for batch_index, batch in enumerate(batches):
+            yield process_batch(batch_index, input_dir, batch)
+        return
+
+    max_pending = max_pending or 2 * workers
+    batch_iter = enumerate(batches)
+    running = set()
+    finished = {}
+    next_index = 0
+    exhausted = False
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while not exhausted and len(running) + len(finished) < max_pending:
+                try:
+                    batch_index, batch = next(batch_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                running.add(pool.submit(process_batch, batch_index, input_dir, batch))
+            if not running and not finished:
+                break
+            if running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    finished[result[0]] = result
+            # 只按批号顺序写出，保证输出确定
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+
+def append_csv(df, path, header):
+    df.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+
+
+def plot_summary(summary_csv, output_dir):
+    if __package__:
+        from .figures import plddt_mean_distribution, plddt_summary_boxplot
+    else:
+        from figures import plddt_mean_distribution, plddt_summary_boxplot
+
+    summary_df = pd.read_csv(summary_csv, usecols=['mean_plddt', 'min_plddt', 'max_plddt'])
 
-# 保存错误日志
-if error_log:
+    # 1. 全局平均pLDDT分布图
+    plddt_mean_distribution(summary_df, os.path.join(output_dir, "mean_plddt_distribution.png"))
+    # 2. 箱线图展示统计量分布 (Mean, Min, Max)
+    plddt_summary_boxplot(summary_df, os.path.join(output_dir, "plddt_summary_boxplot.png"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="提取目录中所有PDB结构的逐残基pLDDT并统计每条链的分布")
+    parser.add_argument('--input-dir', default=INPUT_DIR, help="PDB结构目录")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="输出目录")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="每个任务处理的文件数")
+    parser.add_argument('--workers', type=int, default=1, help="并行工作进程数")
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help="最多同时在计算或等待写出的批数（默认 2*workers）")
+    parser.add_argument('--full', action='store_true',
+                        help="忽略文件清单，重新处理所有文件（默认只处理新增或改动过的文件）")
+    parser.add_argument('--checkpoint-every', type=int, default=20, help="每写出多少批更新一次文件清单")
+    parser.add_argument('--no-plots', action='store_true', help="只提取数据，不绘图")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    input_dir, output_dir = args.input_dir, args.output_dir
+
+    # 确保输出目录存在
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 输出文件路径
+    output_csv = os.path.join(output_dir, "all_plddt_data.csv")
+    summary_csv = os.path.join(output_dir, "structure_summary.csv")
     error_log_path = os.path.join(output_dir, "error_log.txt")
-    with open(error_log_path, "w") as f:
-        f.write("\n".join(error_log))
-    print(f"发现 {len(error_log)} 个错误，已保存到: {error_log_path}")
-
-print("数据处理完成!")
-
-import seaborn as sns
-import matplotlib.pyplot as plt
-
-# 1. 全局平均pLDDT分布图
-plt.figure(figsize=(10, 6))
-sns.histplot(summary_df['mean_plddt'], bins=30, kde=True)
-plt.axvline(x=90, color='g', linestyle='--', label='Very High (90)')
-plt.axvline(x=70, color='b', linestyle='--', label='High (70)')
-plt.axvline(x=50, color='r', linestyle='--', label='Medium (50)')
-plt.xlabel('Mean pLDDT')
-plt.ylabel('Number of Structures')
-plt.title('Distribution of Global Mean pLDDT Scores')
-plt.legend()
-plt.savefig(r"D:\tools\data\plddt_analysis\mean_plddt_distribution.png")
-plt.show()
-
-# 2. 箱线图展示统计量分布 (Mean, Min, Max)
-plt.figure(figsize=(10, 6))
-sns.boxplot(data=summary_df[['mean_plddt', 'min_plddt', 'max_plddt']])
-plt.ylabel('pLDDT Score')
-plt.title('Distribution of Mean, Min, and Max pLDDT per Structure')
-plt.savefig(r"D:\tools\data\plddt_analysis\plddt_summary_boxplot.png")
-plt.show()
\ No newline at end of file
+
+    processed_files = 0
+    residue_rows = 0
+    n_errors = 0
+
+    print(f"开始处理目录: {input_dir} 中的PDB文件...")
+    current = scan_pdb_files(input_dir)
+    print(f"共找到 {len(current)} 个PDB文件")
+
+    # 文件清单记录上次处理过的文件；重跑时只处理新增或改动过的文件，
+    # 并从输出中删掉改动过和已删除文件的旧行，其余行保持不变
+    outputs = [output_csv, summary_csv]
+    manifest = FileManifest(os.path.join(output_dir, MANIFEST_NAME), input_dir)
+    if not args.full and manifest.load() and manifest.truncate_outputs():
+        changed, removed = manifest.diff(current)
+        stale = [name for name in changed if name in manifest.files] + removed
+        for path in outputs:
+            drop_rows(path, 'filename', stale)
+        manifest.remove(stale)
+        manifest.save(outputs)
+        pending = changed
+        print(f"增量运行: {len(changed)} 个新增或改动的文件，{len(removed)} 个已删除的文件")
+    else:
+        manifest.files = {}
+        for path in outputs:
+            if os.path.exists(path):
+                os.remove(path)
+        pending = list(current)
+    header = not os.path.exists(output_csv)
+
+    # 每批处理完立即追加到输出文件，内存占用与目录大小无关，中断时已写出的批次不会丢失
+    with open(error_log_path, "w") as error_log:
+        batches = iter_batches(pending, args.batch_size)
+        for batch_index, residue_df, summary_df, errors, processed in iter_processed_batches(
+                input_dir, batches, workers=args.workers, max_pending=args.max_pending):
+            if len(summary_df):
+                append_csv(residue_df, output_csv, header)
+                append_csv(summary_df, summary_csv, header)
+                header = False
+            for error_msg in errors:
+                print(error_msg)
+                error_log.write(error_msg + "\n")
+            error_log.flush()
+            n_errors += len(errors)
+            residue_rows += len(residue_df)
+            processed_files += len(processed)
+            # 出错的文件不记入清单，下次运行时重试
+            manifest.update({name: current[name] for name in processed})
+            if (batch_index + 1) % args.checkpoint_every == 0:
+                manifest.save(outputs)
+            print(f"已处理 {processed_files} 个文件...")
+    manifest.save(outputs)
+
+    if header:
+        print("警告: 未提取到任何数据!")
+    else:
+        print(f"已保存残基级数据到: {output_csv} (本次新增 {residue_rows} 行)")
+        print(f"已保存结构摘要数据到: {summary_csv}")
+
+    # 保存错误日志
+    if n_errors:
+        print(f"发现 {n_errors} 个错误，已保存到: {error_log_path}")
+    else:
+        os.remove(error_log_path)
+
+    print("数据处理完成!")
+
+    if not header and not args.no_plots:
+        plot_summary(summary_csv, output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Foldseek比对结果的一次性二进制导入与零拷贝读取
+
+把TSV转换为一个目录：
+    meta.json        行数、列的数据类型等
+    structures.txt   结构ID表（行号即编号）
+    query.bin / target.bin        int32 结构编号
+    evalue.bin / rmsd.bin         float32
+    qaln.bin / taln.bin           比对字符串拼接成的字节堆
+    qaln_offsets.bin / taln_offsets.bin   int64，第i行字符串为 heap[off[i]:off[i+1]]
+    by_query_*.bin / by_target_*.bin      按query/target分组的行号索引（CSR）
+之后所有脚本用 np.memmap 打开，按行范围、query或target切片，无需再解析TSV。
+"""
+import os
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .pair_scan import IdInterner, read_pair_chunks
+else:
+    from pair_scan import IdInterner, read_pair_chunks
+
+COLUMN_NAMES = ['query', 'target', 'qaln', 'taln', 'evalue', 'rmsd']
+META_NAME = "meta.json"
+STRUCTURES_NAME = "structures.txt"
+ARRAY_DTYPES = {
+    'query': 'int32',
+    'target': 'int32',
+    'evalue': 'float32',
+    'rmsd': 'float32',
+    'qaln_offsets': 'int64',
+    'taln_offsets': 'int64',
+}
+
+
+def is_alignment_store(path):
+    """判断路径是否为导入后的比对库目录"""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_NAME))
+
+
+def ingest_tsv(tsv_path, store_path, chunksize=1000000):
+    """把Foldseek比对TSV分块转换为二进制比对库，返回行数"""
+    os.makedirs(store_path, exist_ok=True)
+    # meta.json 最后写出，导入中断时目录不会被当作完整的比对库
+    if os.path.exists(os.path.join(store_path, META_NAME)):
+        os.remove(os.path.join(store_path, META_NAME))
+    interner = IdInterner()
+    files = {name: open(os.path.join(store_path, f"{name}.bin"), 'wb')
+             for name in ['query', 'target', 'evalue', 'rmsd', 'qaln', 'taln', 'qaln_offsets', 'taln_offsets']}
+    heap_size = {'qaln': 0, 'taln': 0}
+    n_rows = 0
+    try:
+        for name in heap_size:
+            np.zeros(1, dtype=np.int64).tofile(files[f"{name}_offsets"])
+        for chunk in pd.read_csv(tsv_path, sep='\t', header=None, names=COLUMN_NAMES, chunksize=chunksize,
+                                 dtype={'query': str, 'target': str, 'qaln': str, 'taln': str,
+                                        'evalue': np.float64, 'rmsd': np.float64},
+                                 keep_default_na=False, na_values={'evalue': [''], 'rmsd': ['']}):
+            interner.encode(chunk['query'].to_numpy()).astype(np.int32).tofile(files['query'])
+            interner.encode(chunk['target'].to_numpy()).astype(np.int32).tofile(files['target'])
+            chunk['evalue'].to_numpy(dtype=np.float32).tofile(files['evalue'])
+            chunk['rmsd'].to_numpy(dtype=np.float32).tofile(files['rmsd'])
+            for name in heap_size:
+                encoded = [s.encode('ascii') for s in chunk[name]]
+                lengths = np.fromiter((len(s) for s in encoded), dtype=np.int64, count=len(encoded))
+                files[name].write(b''.join(encoded))
+                (heap_size[name] + np.cumsum(lengths)).tofile(files[f"{name}_offsets"])
+                heap_size[name] += int(lengths.sum())
+            n_rows += len(chunk)
+            print(f"Ingested {n_rows} alignments...")
+    finally:
+        for f in files.values():
+            f.close()
+
+    with open(os.path.join(store_path, STRUCTURES_NAME), 'w', encoding='utf-8') as f:
+        for name in interner.names:
+            f.write(f"{name}\n")
+
+    # 按query/target建立行号索引
+    for column in ['query', 'target']:
+        codes = np.fromfile(os.path.join(store_path, f"{column}.bin"), dtype=np.int32)
+        order = np.argsort(codes, kind='stable').astype(np.int64)
+        ptr = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(interner))))).astype(np.int64)
+        order.tofile(os.path.join(store_path, f"by_{column}_order.bin"))
+        ptr.tofile(os.path.join(store_path, f"by_{column}_ptr.bin"))
+        del codes, order
+
+    with open(os.path.join(store_path, META_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'source': os.path.abspath(tsv_path), 'n_rows': n_rows,
+                   'n_structures': len(interner), 'dtypes': ARRAY_DTYPES}, f, indent=2)
+    return n_rows
+
+
+class AlignmentStore:
+    """以内存映射方式打开的比对库"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_NAME), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.n_rows = self.meta['n_rows']
+        with open(os.path.join(path, STRUCTURES_NAME), 'r', encoding='utf-8') as f:
+            self.structure_ids = np.array(f.read().splitlines(), dtype=object)
+        self._code_of = None
+        for name, dtype in self.meta['dtypes'].items():
+            setattr(self, name, self._map(f"{name}.bin", dtype))
+        self.qaln_heap = self._map("qaln.bin", 'uint8')
+        self.taln_heap = self._map("taln.bin", 'uint8')
+        self._index = {}
+
+    def _map(self, file_name, dtype):
+        path = os.path.join(self.path, file_name)
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def __len__(self):
+        return self.n_rows
+
+    def code_of(self, structure_id):
+        """结构ID对应的编号（不存在时为 -1）"""
+        if self._code_of is None:
+            self._code_of = {name: code for code, name in enumerate(self.structure_ids)}
+        return self._code_of.get(structure_id, -1)
+
+    def _rows_for(self, column, structure_id):
+        if column not in self._index:
+            self._index[column] = (self._map(f"by_{column}_order.bin", 'int64'),
+                                   self._map(f"by_{column}_ptr.bin", 'int64'))
+        order, ptr = self._index[column]
+        code = self.code_of(structure_id)
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(order[ptr[code]:ptr[code + 1]])
+
+    def query_rows(self, structure_id):
+        """该结构作为query的所有行号（升序）"""
+        return self._rows_for('query', structure_id)
+
+    def target_rows(self, structure_id):
+        """该结构作为target的所有行号（升序）"""
+        return self._rows_for('target', structure_id)
+
+    def _strings(self, heap, offsets, rows):
+        starts = offsets[rows]
+        stops = offsets[rows + 1]
+        return np.array([bytes(heap[a:b]).decode('ascii') for a, b in zip(starts, stops)], dtype=object)
+
+    def frame(self, rows, columns=None):
+        """按行号取出DataFrame（列名同Foldseek TSV），比对字符串只在需要时解码"""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = columns or COLUMN_NAMES
+        data = {}
+        for name in columns:
+            if name in ('query', 'target'):
+                data[name] = self.structure_ids[getattr(self, name)[rows]]
+            elif name in ('qaln', 'taln'):
+                data[name] = self._strings(getattr(self, f"{name}_heap"), getattr(self, f"{name}_offsets"), rows)
+            else:
+                data[name] = np.asarray(getattr(self, name)[rows])
+        return pd.DataFrame(data, columns=columns, index=rows)
+
+    def rows(self, start, stop, columns=None):
+        """取出连续行范围 [start, stop)"""
+        return self.frame(np.arange(start, min(stop, self.n_rows)), columns)
+
+    def iter_chunks(self, chunksize, columns=None, start=0):
+        """从 start 行开始按块产出DataFrame，可直接代替 pd.read_csv(..., chunksize=...)"""
+        for chunk_start in range(start, self.n_rows, chunksize):
+            yield self.rows(chunk_start, chunk_start + chunksize, columns)
+
+
+def iter_pair_codes(aln_path, chunksize=1000000):
+    """分块产出 (query编号, target编号, rmsd, 结构ID表)
+
+    aln_path 可以是Foldseek TSV（只读 query/target/rmsd 三列并整数化ID）、比对库目录
+    （直接切片内存映射的编号数组）或 query_layer.py 建立的查询库。结构ID表按编号排列，TSV输入时随读取增长。
+    """
+    if __package__:
+        from .query_layer import QueryStore, is_query_store
+    else:
+        from query_layer import QueryStore, is_query_store
+    if is_query_store(aln_path):
+        with QueryStore(aln_path) as store:
+            yield from store.iter_pair_codes(chunksize=chunksize)
+        return
+    if is_alignment_store(aln_path):
+        store = AlignmentStore(aln_path)
+        for start in range(0, len(store), chunksize):
+            stop = start + chunksize
+            yield (np.asarray(store.query[start:stop], dtype=np.int64),
+                   np.asarray(store.target[start:stop], dtype=np.int64),
+                   np.asarray(store.rmsd[start:stop]),
+                   store.structure_ids)
+        return
+    interner = IdInterner()
+    for chunk in read_pair_chunks(aln_path, chunksize=chunksize):
+        yield (interner.encode(chunk['query'].to_numpy()),
+               interner.encode(chunk['target'].to_numpy()),
+               chunk['rmsd'].to_numpy(),
+               interner.names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把Foldseek比对TSV一次性导入为二进制比对库")
+    parser.add_argument('alignments', help="Foldseek比对结果TSV")
+    parser.add_argument('store', help="输出的比对库目录")
+    parser.add_argument('--chunksize', type=int, default=1000000, help="每块读取的比对行数")
+    args = parser.parse_args(argv)
+    total = ingest_tsv(args.alignments, args.store, chunksize=args.chunksize)
+    print(f"Stored {total} alignments in {args.store}")
+
+
+if __name__ == "__main__":
+    main()
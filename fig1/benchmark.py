@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""fig1 热点路径的基准测试：在确定性的合成数据上按几个规模计时，报告吞吐量和峰值内存
+
+测试的阶段：
+    load_structures       RMSD_1_batch.load_pdb_structure 解析PDB（不使用磁盘缓存）
+    rmsd_contributions    RMSD_1_batch.calculate_residue_rmsd_contributions_batch（结构已预先载入）
+    residue_aggregation   每个残基RMSD贡献的流式累积（RMSD_2_bubble_chunck / mean_RMSD 使用的 read_residue_stats）
+    plddt_harvest         all_plddt_distribution 提取pLDDT
+    ptm_harvest           pTM_1 提取pTM
+每次测量在一个新的工作进程中进行，只计热点部分的时间；峰值内存为该进程的最大常驻内存。
+给出 --baseline 时与保存的基准比较，吞吐量下降或峰值内存增加超过容差即以非零状态退出。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+SCALES = {
+    'small': {'structures': 50, 'alignments': 2000, 'contributions': 200000, 'predictions': 30},
+    'medium': {'structures': 200, 'alignments': 10000, 'contributions': 2000000, 'predictions': 120},
+    'large': {'structures': 1000, 'alignments': 50000, 'contributions': 10000000, 'predictions': 500},
+}
+STAGES = ['load_structures', 'rmsd_contributions', 'residue_aggregation', 'plddt_harvest', 'ptm_harvest']
+DATASET_META = "dataset.json"
+CHUNKSIZE = 10000
+
+
+def prepare_dataset(data_dir, scale, seed=0):
+    """生成（或复用已有的）某个规模的合成数据集，返回数据目录"""
+    if __package__:
+        from . import synthetic_data
+    else:
+        import synthetic_data
+
+    params = dict(SCALES[scale], seed=seed)
+    root = os.path.join(data_dir, scale)
+    meta_path = os.path.join(root, DATASET_META)
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == params:
+                return root
+    import shutil
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    print(f"生成 {scale} 规模的合成数据: {root}")
+    structures = synthetic_data.write_structures(os.path.join(root, 'pdbs'), params['structures'], seed=seed)
+    synthetic_data.write_alignments(os.path.join(root, 'aln.tsv'), structures, params['alignments'], seed=seed)
+    synthetic_data.write_contributions(os.path.join(root, 'contributions.csv'), params['contributions'], seed=seed)
+    synthetic_data.write_predictions(os.path.join(root, 'predictions'), params['predictions'], seed=seed)
+    # 元数据最后写出，生成中断时下次会重新生成
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(params, f)
+    return root
+
+
+def _structure_ids(pdb_dir):
+    return sorted(name[:-4] for name in os.listdir(pdb_dir) if name.endswith('.pdb'))
+
+
+def bench_load_structures(root, scratch):
+    if __package__:
+        from . import RMSD_1_batch
+    else:
+        import RMSD_1_batch
+    pdb_dir = os.path.join(root, 'pdbs')
+    RMSD_1_batch.configure(pdb_dir, None)
+    ids = _structure_ids(pdb_dir)
+    start = time.perf_counter()
+    for structure_id in ids:
+        RMSD_1_batch.load_pdb_structure(structure_id, pdb_dir)
+    return len(ids), time.perf_counter() - start
+
+
+def bench_rmsd_contributions(root, scratch):
+    import pandas as pd
+    if __package__:
+        from . import RMSD_1_batch
+    else:
+        import RMSD_1_batch
+    pdb_dir = os.path.join(root, 'pdbs')
+    RMSD_1_batch.configure(pdb_dir, None)
+    store = RMSD_1_batch.get_structure_store(pdb_dir)
+    for structure_id in _structure_ids(pdb_dir):
+        store.get(structure_id)
+    chunks = list(pd.read_csv(os.path.join(root, 'aln.tsv'), sep='\t', header=None,
+                              names=RMSD_1_batch.COLUMN_NAMES, chunksize=CHUNKSIZE))
+    rows = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        RMSD_1_batch.calculate_residue_rmsd_contributions_batch(chunk, errors=[])
+        rows += len(chunk)
+    return rows, time.perf_counter() - start
+
+
+def bench_residue_aggregation(root, scratch):
+    if __package__:
+        from .contrib_io import read_residue_stats
+    else:
+        from contrib_io import read_residue_stats
+    start = time.perf_counter()
+    stats = read_residue_stats(os.path.join(root, 'contributions.csv'))
+    return stats.total_count, time.perf_counter() - start
+
+
+def bench_plddt_harvest(root, scratch):
+    if __package__:
+        from . import all_plddt_distribution
+    else:
+        import all_plddt_distribution
+    pdb_dir = os.path.join(root, 'pdbs')
+    start = time.perf_counter()
+    all_plddt_distribution.main(['--input-dir', pdb_dir, '--output-dir', scratch, '--full', '--no-plots'])
+    return len(_structure_ids(pdb_dir)), time.perf_counter() - start
+
+
+def bench_ptm_harvest(root, scratch):
+    if __package__:
+        from . import pTM_1
+    else:
+        import pTM_1
+    start = time.perf_counter()
+    pTM_1.main(['--input-dir', os.path.join(root, 'predictions'), '--output-dir', scratch, '--full'])
+    with open(os.path.join(root, DATASET_META), 'r', encoding='utf-8') as f:
+        n_predictions = json.load(f)['predictions']
+    return n_predictions, time.perf_counter() - start
+
+
+def _peak_memory_mb():
+    """当前进程的峰值常驻内存（MB）；不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(stage, root, scratch):
+    """在工作进程中运行一个阶段，返回 (处理的条目数, 秒, 峰值内存MB)"""
+    os.makedirs(scratch, exist_ok=True)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        items, seconds = globals()[f"bench_{stage}"](root, scratch)
+    return items, seconds, _peak_memory_mb()
+
+
+def measure(stage, root, scratch, repeat=1):
+    """每次在新的进程中运行，取最短时间和最大峰值内存"""
+    best = None
+    context = multiprocessing.get_context('spawn')
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            items, seconds, peak = pool.submit(run_stage, stage, root, scratch).result()
+        if best is None:
+            best = {'items': items, 'seconds': seconds, 'peak_mb': peak}
+        else:
+            best['seconds'] = min(best['seconds'], seconds)
+            if peak is not None:
+                best['peak_mb'] = max(best['peak_mb'] or 0, peak)
+    best['throughput'] = best['items'] / best['seconds'] if best['seconds'] > 0 else float('inf')
+    return best
+
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    """与基准比较，返回回归描述的列表"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{key}: 吞吐量 {result['throughput']:.1f}/s < 基准 {base['throughput']:.1f}/s")
+        if (result['peak_mb'] is not None and base.get('peak_mb') is not None
+                and result['peak_mb'] > base['peak_mb'] * (1 + memory_tolerance)):
+            regressions.append(f"{key}: 峰值内存 {result['peak_mb']:.0f} MB > 基准 {base['peak_mb']:.0f} MB")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="在合成数据上对fig1的热点路径计时")
+    parser.add_argument('--data-dir', default='bench_data', help="合成数据目录（按规模缓存，参数不变时复用）")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small'], help="测试规模")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help="测试的阶段")
+    parser.add_argument('--repeat', type=int, default=3, help="每项测量重复次数（取最短时间）")
+    parser.add_argument('--seed', type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument('--output', default=None, help="把结果写入JSON文件")
+    parser.add_argument('--baseline', default=None, help="与此基准JSON比较，出现回归时以状态1退出")
+    parser.add_argument('--save-baseline', default=None, help="把本次结果保存为基准JSON")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="允许的吞吐量下降比例")
+    parser.add_argument('--memory-tolerance', type=float, default=0.25, help="允许的峰值内存增加比例")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {}
+    print(f"{'scale/stage':<32}{'items':>10}{'seconds':>10}{'items/s':>12}{'peak MB':>10}")
+    for scale in args.scales:
+        root = prepare_dataset(args.data_dir, scale, seed=args.seed)
+        for stage in args.stages:
+            key = f"{scale}/{stage}"
+            result = measure(stage, root, os.path.join(args.data_dir, 'scratch', scale, stage), repeat=args.repeat)
+            results[key] = result
+            peak = f"{result['peak_mb']:.0f}" if result['peak_mb'] is not None else '-'
+            print(f"{key:<32}{result['items']:>10}{result['seconds']:>10.3f}{result['throughput']:>12.1f}{peak:>10}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        if regressions:
+            print("性能回归:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("与基准相比没有回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""轻量的PDB / mmCIF原子记录读取器，用于提取pLDDT（B因子）
+
+PDB文件只保留 ATOM/HETATM 行，补齐为定长的字节矩阵（numpy S80 -> uint8）后按固定列切片；
+mmCIF文件只读取 _atom_site 循环。不建立 Bio.PDB 的对象层级，
+对AlphaFold输出比 PDBParser 快一到两个数量级。
+"""
+import gzip
+
+import numpy as np
+
+LINE_WIDTH = 80
+# PDB格式的固定列（从0开始的切片）
+PDB_COLUMNS = {
+    'atom_name': (12, 16),
+    'alt_loc': (16, 17),
+    'residue_name': (17, 20),
+    'chain': (21, 22),
+    'residue_number': (22, 26),
+    'insertion_code': (26, 27),
+    'bfactor': (60, 66),
+}
+COORDINATE_COLUMNS = [(30, 38), (38, 46), (46, 54)]
+ATOM_FIELDS = ['hetero', 'atom_name', 'alt_loc', 'residue_name', 'chain',
+               'residue_number', 'insertion_code', 'bfactor']
+ATOM_RECORDS = (b'ATOM  ', b'HETATM')
+
+
+def _read_bytes(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read()
+
+
+def _text_column(table, start, stop, strip=True):
+    """从 (N, LINE_WIDTH) 的字节矩阵中切出一列，返回 str 数组（ASCII按码位直接转为UCS4）"""
+    column = table[:, start:stop].astype(np.uint32).view(f'U{stop - start}').ravel()
+    return np.char.strip(column) if strip else column
+
+
+def _number_column(table, start, stop, dtype):
+    """按定点格式解析一列数字（整数或带小数点），逐字符做数组运算，代替逐个元素的字符串转换"""
+    chars = table[:, start:stop]
+    width = stop - start
+    is_digit = (chars >= ord('0')) & (chars <= ord('9'))
+    digits = np.where(is_digit, chars - ord('0'), 0).astype(np.int64)
+    negative = (chars == ord('-')).any(axis=1)
+    positions = np.arange(width)
+    # 每行小数点的位置；没有小数点时视为在最后一个数字之后
+    has_dot = chars == ord('.')
+    last_digit = width - 1 - np.argmax(is_digit[:, ::-1], axis=1)
+    point = np.where(has_dot.any(axis=1), np.argmax(has_dot, axis=1), last_digit + 1)
+    point = point[is_digit.any(axis=1)]
+    if len(point) and (point == point[0]).all():
+        # 常见情况：所有行的小数点（或个位）在同一列，用固定的位权做一次矩阵乘法
+        exponent = point[0] - positions - (positions < point[0])
+        decimals = max(-int(exponent[is_digit.any(axis=0)].min()), 0)
+        weights = np.where(is_digit.any(axis=0), 10 ** np.maximum(exponent + decimals, 0), 0)
+        values = (digits @ weights) / 10.0 ** decimals
+    else:
+        point = np.where(has_dot.any(axis=1), np.argmax(has_dot, axis=1), last_digit + 1)
+        exponent = point[:, None] - positions[None, :] - (positions[None, :] < point[:, None])
+        # 先按整数累加再除以 10**小数位数，结果与十进制字符串的解析一致
+        decimals = np.maximum(last_digit - point, 0)
+        values = (digits * 10 ** np.maximum(exponent + decimals[:, None], 0)).sum(axis=1) / 10.0 ** decimals
+    return np.where(negative, -values, values).astype(dtype)
+
+
+def _atom_table(data):
+    """把 ATOM/HETATM 行取成 (N, LINE_WIDTH) 的 uint8 矩阵，短行和行尾用空格补齐"""
+    return _line_table([line for line in data.split(b'\n') if line[:6] in ATOM_RECORDS])
+
+
+def _line_table(lines):
+    table = np.array(lines, dtype=f'S{LINE_WIDTH}').view(np.uint8).reshape(len(lines), LINE_WIDTH)
+    # 补齐用的 NUL 和 Windows 换行留下的 \r 都视为空格
+    table[(table == 0) | (table == ord('\r'))] = ord(' ')
+    return table
+
+
+def read_pdb_atoms(path, first_model=True, coordinates=False):
+    """读取PDB文件的原子记录，返回 {字段名: 数组}（字段见 ATOM_FIELDS；coordinates 为真时另有 (N, 3) 的 'coord'）"""
+    data = _read_bytes(path)
+    if first_model:
+        # 只保留第一个 ENDMDL 之前的部分
+        end = data.find(b'\nENDMDL')
+        if end >= 0:
+            data = data[:end + 1]
+    table = _atom_table(data)
+    atoms = {'hetero': table[:, 0] == ord('H')}
+    for name, (start, stop) in PDB_COLUMNS.items():
+        if name == 'residue_number':
+            atoms[name] = _number_column(table, start, stop, np.int32)
+        elif name == 'bfactor':
+            atoms[name] = _number_column(table, start, stop, np.float64)
+        else:
+            # 空白链标识保留为 ' '，与 Bio.PDB 一致
+            atoms[name] = _text_column(table, start, stop, strip=(name != 'chain'))
+    if coordinates:
+        atoms['coord'] = np.column_stack([_number_column(table, start, stop, np.float64)
+                                          for start, stop in COORDINATE_COLUMNS]).reshape(-1, 3)
+    return atoms
+
+
+def _cif_atom_site(text):
+    """取出 _atom_site 循环的列名和数据行"""
+    lines = text.splitlines()
+    start = None
+    for i, line in enumerate(lines):
+        if line.startswith('_atom_site.'):
+            start = i
+            break
+    if start is None:
+        raise ValueError("No _atom_site loop found")
+    columns = []
+    i = start
+    while i < len(lines) and lines[i].startswith('_atom_site.'):
+        columns.append(lines[i].split()[0][len('_atom_site.'):])
+        i += 1
+    rows = []
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+        if line.startswith(('#', '_', 'loop_', 'data_')):
+            break
+        rows.append(line)
+        i += 1
+    return columns, rows
+
+
+def read_cif_atoms(path, first_model=True, coordinates=False):
+    """读取mmCIF文件 _atom_site 循环中的原子记录，返回值同 read_pdb_atoms"""
+    columns, rows = _cif_atom_site(_read_bytes(path).decode('utf-8', errors='replace'))
+    tokens = np.array(' '.join(rows).split(), dtype=object)
+    if len(tokens) % len(columns):
+        raise ValueError("Unsupported _atom_site layout (quoted values containing spaces?)")
+    table = tokens.reshape(-1, len(columns))
+
+    def column(*names, default=''):
+        for name in names:
+            if name in columns:
+                values = table[:, columns.index(name)].astype(str)
+                values = np.char.strip(values, '"\'')
+                return np.where(np.isin(values, ['?', '.']), default, values)
+        return np.full(len(table), default)
+
+    if first_model and 'pdbx_PDB_model_num' in columns:
+        model = column('pdbx_PDB_model_num')
+        table = table[model == model[0]] if len(model) else table
+    atoms = {
+        'hetero': column('group_PDB') == 'HETATM',
+        'atom_name': column('auth_atom_id', 'label_atom_id'),
+        'alt_loc': column('label_alt_id'),
+        'residue_name': column('auth_comp_id', 'label_comp_id'),
+        'chain': column('auth_asym_id', 'label_asym_id'),
+        'residue_number': column('auth_seq_id', 'label_seq_id', default='0').astype(np.int32),
+        'insertion_code': column('pdbx_PDB_ins_code'),
+        'bfactor': column('B_iso_or_equiv', default='nan').astype(np.float64),
+    }
+    if coordinates:
+        atoms['coord'] = np.column_stack([column(f'Cartn_{axis}', default='nan').astype(np.float64)
+                                          for axis in 'xyz']).reshape(-1, 3)
+    return atoms
+
+
+def read_atoms(path, first_model=True, coordinates=False):
+    """按扩展名读取PDB（.pdb/.ent）或mmCIF（.cif），支持 .gz"""
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.lower().endswith(('.cif', '.mmcif')):
+        return read_cif_atoms(path, first_model=first_model, coordinates=coordinates)
+    return read_pdb_atoms(path, first_model=first_model, coordinates=coordinates)
+
+
+def residue_bfactors(atoms, atom_name=None, include_hetero=False):
+    """每个残基取一个B因子
+
+    atom_name 为 None 时取残基的第一个原子（与逐残基遍历 Bio.PDB 原子时的 break 写法一致），
+    否则取该名称的原子（如 'CA'，没有该原子的残基被跳过）。
+    include_hetero 为 False 时跳过HETATM记录，为 True 时全部保留，
+    为 'polymer' 时只保留含主链 N、CA、C 原子的HETATM残基（MSE等修饰氨基酸），跳过离子（如钙离子 CA）和配体。
+    返回 {'chain', 'residue_number', 'residue_name', 'bfactor'}（读取了坐标时另有 'coord'），按文件中的顺序排列。
+    """
+    if include_hetero == 'polymer':
+        keep = ~atoms['hetero'] | _backbone_residue_atoms(atoms)
+    elif include_hetero:
+        keep = np.ones(len(atoms['bfactor']), dtype=bool)
+    else:
+        keep = ~atoms['hetero']
+    chain = atoms['chain'][keep]
+    number = atoms['residue_number'][keep]
+    icode = atoms['insertion_code'][keep]
+    first = _residue_starts(chain, number, icode)
+    if atom_name is None:
+        rows = np.flatnonzero(keep)[first]
+    else:
+        residue_id = np.cumsum(first) - 1
+        named = np.flatnonzero(atoms['atom_name'][keep] == atom_name)
+        # 每个残基中第一个该名称的原子（替代构象只取第一个）
+        _, first_named = np.unique(residue_id[named], return_index=True)
+        rows = np.flatnonzero(keep)[named[first_named]]
+    residues = {
+        'chain': atoms['chain'][rows],
+        'residue_number': atoms['residue_number'][rows],
+        'residue_name': atoms['residue_name'][rows],
+        'bfactor': atoms['bfactor'][rows],
+    }
+    if 'coord' in atoms:
+        residues['coord'] = atoms['coord'][rows]
+    return residues
+
+
+def _backbone_residue_atoms(atoms):
+    """每个原子所在的残基是否含主链 N、CA、C 原子"""
+    residue_id = np.cumsum(_residue_starts(atoms['chain'], atoms['residue_number'], atoms['insertion_code'])) - 1
+    n_residues = residue_id[-1] + 1 if len(residue_id) else 0
+    has_backbone = np.ones(n_residues, dtype=bool)
+    for name in ('N', 'CA', 'C'):
+        present = np.zeros(n_residues, dtype=bool)
+        present[residue_id[atoms['atom_name'] == name]] = True
+        has_backbone &= present
+    return has_backbone[residue_id]
+
+
+def _residue_starts(chain, number, icode):
+    """残基边界：链、编号或插入码与上一个原子不同"""
+    first = np.ones(len(chain), dtype=bool)
+    first[1:] = (chain[1:] != chain[:-1]) | (number[1:] != number[:-1]) | (icode[1:] != icode[:-1])
+    return first
+
+
+def write_residue_bfactors(src_path, dst_path, values, chain=None, first_model=True):
+    """把逐残基的数值写入PDB文件的B因子列，其余内容原样复制
+
+    values[i] 对应链中第 i 个含CA原子的残基（顺序同 residue_bfactors(atom_name='CA', include_hetero='polymer')，
+    即跳过钙离子等不含主链原子的HETATM残基），写入该残基的所有原子；chain 为 None 时取第一个CA原子所在的链。
+    NaN 和超出 values 长度的残基、其他链以及第一个模型之后的原子保留原值。返回改写的原子数。
+    """
+    data = _read_bytes(src_path)
+    lines = data.split(b'\n')
+    end = len(lines)
+    if first_model:
+        end = next((i for i, line in enumerate(lines) if line.startswith(b'ENDMDL')), end)
+    rows = np.array([i for i, line in enumerate(lines[:end]) if line[:6] in ATOM_RECORDS], dtype=np.int64)
+    if not len(rows):
+        raise ValueError("no ATOM/HETATM records")
+    table = _line_table([lines[i] for i in rows])
+    atoms = {
+        'hetero': table[:, 0] == ord('H'),
+        'chain': _text_column(table, 21, 22, strip=False),
+        'atom_name': _text_column(table, 12, 16),
+        'residue_number': _number_column(table, 22, 26, np.int32),
+        'insertion_code': _text_column(table, 26, 27),
+    }
+    chains = atoms['chain']
+    residue_id = np.cumsum(_residue_starts(chains, atoms['residue_number'], atoms['insertion_code'])) - 1
+    # 与 read_ca_plddt 一致：HETATM记录只计入含主链原子的残基（修饰氨基酸），离子和配体的CA不算
+    is_ca = (atoms['atom_name'] == 'CA') & (~atoms['hetero'] | _backbone_residue_atoms(atoms))
+    if not is_ca.any():
+        raise ValueError("no CA atoms")
+    target = chains[np.argmax(is_ca)] if chain is None else chain
+    # 链中含CA原子的残基按出现顺序编号，其余原子为 -1
+    ca_residues = np.unique(residue_id[is_ca & (chains == target)])
+    ordinal = np.full(residue_id[-1] + 1, -1, dtype=np.int64)
+    ordinal[ca_residues] = np.arange(len(ca_residues))
+    atom_ordinal = np.where(chains == target, ordinal[residue_id], -1)
+    values = np.asarray(values, dtype=np.float64)
+    new = np.full(len(rows), np.nan)
+    mapped = (atom_ordinal >= 0) & (atom_ordinal < len(values))
+    new[mapped] = values[atom_ordinal[mapped]]
+    change = ~np.isnan(new)
+    formatted = np.char.mod('%6.2f', new[change])
+    for row, text in zip(rows[change], formatted):
+        line = lines[row]
+        ending = b'\r' if line.endswith(b'\r') else b''
+        body = line[:len(line) - len(ending)].ljust(66)
+        lines[row] = body[:60] + text.encode('ascii') + body[66:] + ending
+    with open(dst_path, 'wb') as f:
+        f.write(b'\n'.join(lines))
+    return int(change.sum())
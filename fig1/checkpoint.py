@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""长时间运行任务的断点清单：记录已完成的数据块和各输出文件的有效字节数"""
+import os
+import json
+
+
+class RunCheckpoint:
+    """保存在输出目录中的JSON断点清单
+
+    每完成（并写出）一个数据块后调用 commit()，清单以“写临时文件再替换”的方式原子更新。
+    重启时 load() 读回清单，truncate_outputs() 把输出文件截断到最后一次提交时的长度，
+    去掉崩溃时写了一半的尾部。
+    """
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = dict(settings)
+        self.state = {
+            'chunks_done': 0,
+            'total_processed': 0,
+            'total_errors': 0,
+            'files': {},
+            'extra': {},
+            'completed': False,
+        }
+
+    def load(self):
+        """读取已有清单；设置不一致时抛出 ValueError，不存在时返回 False"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('settings') != self.settings:
+            raise ValueError(f"Checkpoint {self.path} was written with different settings: "
+                             f"{data.get('settings')} != {self.settings}")
+        self.state.update(data['state'])
+        return True
+
+    def truncate_outputs(self):
+        """把记录过的输出文件截断到已提交的长度"""
+        for path, size in self.state['files'].items():
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+    def commit(self, files=(), **fields):
+        """记录一个（或多个）数据块已完成，files 中的文件按当前长度记录"""
+        for path in map(os.path.abspath, files):
+            self.state['files'][path] = os.path.getsize(path) if os.path.exists(path) else 0
+        self.state.update(fields)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'settings': self.settings, 'state': self.state}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""统一的命令行入口：fig1 [--config 配置文件] <子命令> [子命令参数...]
+
+子命令对应的模块只在调用时才导入，numpy / pandas / matplotlib / Bio 等重依赖
+由用到它们的子命令自己加载，fig1 --help 和调度几千个小任务时的启动开销都很小。
+
+路径等参数既可以在命令行给出，也可以写在配置文件（JSON，或TOML：Python 3.11+ 自带，更早的版本需要 tomli）中，
+每个子命令一节，键为参数名（下划线或连字符均可），命令行参数优先于配置文件，例如：
+
+    [ptm]
+    input_dir = "/data/GII.4_pdbs"
+    output_dir = "/data/ptm_analysis"
+    threads = 16
+
+    [plot]
+    output_dir = "/data/figures"
+    ptm_summary = "/data/ptm_analysis/ptm_summary.csv"
+
+未给出 --config 时读取环境变量 FIG1_CONFIG 指向的文件（如果有）。
+"""
+import os
+import sys
+import json
+import argparse
+import importlib
+
+CONFIG_ENV = "FIG1_CONFIG"
+
+# 子命令 -> (模块, 说明)
+COMMANDS = {
+    'aln-ingest': ('aln_store', "把Foldseek比对TSV导入为内存映射的二进制比对库"),
+    'rmsd-contrib': ('RMSD_1_batch', "计算每个残基的RMSD贡献"),
+    'rmsd-conservation': ('RMSD_2_bubble_chunck', "每个残基RMSD贡献的保守性表和气泡图"),
+    'rmsd-stability': ('mean_RMSD', "每个残基平均RMSD贡献 ± 标准差折线图"),
+    'rmsd-compare': ('RMSD_comparison', "两组结构之间的RMSD比较"),
+    'group-matrix': ('group_matrix', "组 × 组 RMSD矩阵"),
+    'plddt': ('all_plddt_distribution', "提取所有结构的逐残基pLDDT"),
+    'plddt-matrix': ('plddt_per_residue_heatmap', "按比对位置的pLDDT矩阵和热图"),
+    'plddt-pymol': ('plddt_per_residue_pymol', "把每个位置的平均pLDDT映射到结构上并渲染"),
+    'ptm': ('pTM_1', "从预测结果JSON中提取pTM值"),
+    'ptm-plot': ('pTM_2', "pTM值分布图"),
+    'plot': ('render_figures', "从汇总表并行渲染所有图（带缓存）"),
+    'query': ('query_layer', "把比对和残基贡献导入SQLite查询库，按组、e-value、残基范围查询"),
+    'bench': ('benchmark', "在合成数据上对热点路径计时，并与基准比较"),
+}
+
+
+def load_config(path):
+    """读取配置文件，返回 {子命令: {参数名: 值}}"""
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            # Python 3.11 以前没有 tomllib，使用接口相同的 tomli（pyproject.toml 中按版本声明了依赖）
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise RuntimeError("TOML config files need Python 3.11+ or the 'tomli' package; "
+                                   "use a JSON config instead") from None
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def config_argv(options):
+    """把配置中的一节转换为命令行参数列表（放在用户参数之前，命令行中的同名参数覆盖它）"""
+    argv = []
+    for key, value in options.items():
+        flag = '--' + key.replace('_', '-')
+        if isinstance(value, bool):
+            if value:
+                argv.append(flag)
+        elif isinstance(value, (list, tuple)):
+            argv.append(flag)
+            argv.extend(str(item) for item in value)
+        elif value is not None:
+            argv.extend([flag, str(value)])
+    return argv
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='fig1', description="fig1 分析流程的命令行入口",
+        epilog="子命令:\n" + "\n".join(f"  {name:<18} {help_text}" for name, (_, help_text) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default=os.environ.get(CONFIG_ENV),
+                        help=f"配置文件（.json 或 .toml），默认取环境变量 {CONFIG_ENV}")
+    parser.add_argument('command', choices=sorted(COMMANDS), metavar='command', help="子命令")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="传给子命令的参数（子命令 -h 查看）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    command_argv = list(args.args)
+    if args.config:
+        section = load_config(args.config).get(args.command, {})
+        command_argv = config_argv(section) + command_argv
+    module_name, _ = COMMANDS[args.command]
+    # 安装为包时按包内模块导入，在本目录中直接运行时按脚本导入
+    if __package__:
+        module = importlib.import_module(f".{module_name}", __package__)
+    else:
+        module = importlib.import_module(module_name)
+    return module.main(command_argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""残基RMSD贡献结果的读写：CSV或按query分区、字典编码的Parquet数据集
+
+Parquet数据集目录结构：
+    residue_rmsd_contributions.parquet/
+        _structures.parquet          结构ID字典（code -> structure_id）
+        query_part=K/part-N.parquet  query_code % 分区数 == K 的行，每个处理块一个row group
+                                     （每次 roll() 开始新的一组文件 N）
+"""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .residue_stats import ResidueStats
+else:
+    from residue_stats import ResidueStats
+
+CSV_NAME = "residue_rmsd_contributions.csv"
+PARQUET_NAME = "residue_rmsd_contributions.parquet"
+STRUCTURES_NAME = "_structures.parquet"
+PARTITION_COLUMN = "query_part"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError("Parquet格式需要安装 pyarrow（pip install pyarrow）") from e
+    return pyarrow
+
+
+def is_parquet_dataset(path):
+    """判断路径是否为Parquet结果数据集"""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, STRUCTURES_NAME))
+
+
+class ParquetContributionWriter:
+    """把每个处理块写成Parquet row group
+
+    结构ID编码为int32（字典在关闭时写入 _structures.parquet），数值列为float32，
+    行按 query_code % n_partitions 分到不同分区目录。
+    """
+
+    def __init__(self, path, n_partitions=16, resume_file_index=None):
+        pa = _require_pyarrow()
+        self.path = path
+        self.n_partitions = n_partitions
+        self.codes = {}
+        self.file_index = 0
+        self._writers = {}
+        self._schema = pa.schema([
+            ('query_code', pa.int32()),
+            ('target_code', pa.int32()),
+            ('residue_number', pa.int32()),
+            ('rmsd_contribution', pa.float32()),
+            ('total_rmsd', pa.float32()),
+            ('aligned_length', pa.int32()),
+        ])
+        if resume_file_index is None:
+            # 与CSV输出一样每次运行重新生成，清除上次运行留下的分区文件
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.makedirs(path)
+        else:
+            self._resume(resume_file_index)
+
+    def _resume(self, file_index):
+        """从断点继续：恢复结构ID字典，删除断点之后（可能不完整）的分区文件"""
+        ids, _ = read_structure_ids(self.path)
+        self.codes = {name: code for code, name in enumerate(ids)}
+        self.file_index = file_index
+        for entry in os.scandir(self.path):
+            if not entry.is_dir():
+                continue
+            for part_file in os.listdir(entry.path):
+                index = int(part_file[len("part-"):-len(".parquet")])
+                if index >= file_index:
+                    os.remove(os.path.join(entry.path, part_file))
+
+    def encode(self, names):
+        """把结构ID编码为int32，新出现的ID追加到字典末尾"""
+        uniques, inverse = np.unique(np.asarray(names, dtype=object), return_inverse=True)
+        for name in uniques:
+            if name not in self.codes:
+                self.codes[name] = len(self.codes)
+        lookup = np.fromiter((self.codes[name] for name in uniques), dtype=np.int32, count=len(uniques))
+        return lookup[inverse]
+
+    def _writer(self, part):
+        writer = self._writers.get(part)
+        if writer is None:
+            pa = _require_pyarrow()
+            part_dir = os.path.join(self.path, f"{PARTITION_COLUMN}={part}")
+            os.makedirs(part_dir, exist_ok=True)
+            writer = pa.parquet.ParquetWriter(
+                os.path.join(part_dir, f"part-{self.file_index}.parquet"), self._schema)
+            self._writers[part] = writer
+        return writer
+
+    def write_chunk(self, df):
+        """写入一个处理块（列同CSV输出），每个分区各写一个row group"""
+        if not len(df):
+            return
+        pa = _require_pyarrow()
+        query_code = self.encode(df['query'].to_numpy())
+        target_code = self.encode(df['target'].to_numpy())
+        columns = {
+            'query_code': query_code,
+            'target_code': target_code,
+            'residue_number': df['residue_number'].to_numpy(dtype=np.int32),
+            'rmsd_contribution': df['rmsd_contribution'].to_numpy(dtype=np.float32),
+            'total_rmsd': df['total_rmsd'].to_numpy(dtype=np.float32),
+            'aligned_length': df['aligned_length'].to_numpy(dtype=np.int32),
+        }
+        parts = query_code % self.n_partitions
+        # 分区内按query排序，使row group的min/max统计量尽量紧凑，便于按query剪枝
+        order = np.lexsort((query_code, parts))
+        bounds = np.flatnonzero(np.diff(parts[order])) + 1
+        for rows in np.split(order, bounds):
+            table = pa.table({name: values[rows] for name, values in columns.items()}, schema=self._schema)
+            self._writer(int(parts[rows[0]])).write_table(table, row_group_size=len(rows))
+
+    def roll(self):
+        """关闭当前各分区文件并写出结构ID字典，之后的数据写入新一组文件
+
+        调用之后已写出的数据都是完整的Parquet文件，可作为断点。
+        """
+        pa = _require_pyarrow()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        self.file_index += 1
+        names = list(self.codes)
+        structures = pa.table({
+            'code': pa.array(np.arange(len(names), dtype=np.int32)),
+            'structure_id': pa.array(names, type=pa.string()),
+        }).replace_schema_metadata({'n_partitions': str(self.n_partitions)})
+        tmp_path = os.path.join(self.path, STRUCTURES_NAME + ".tmp")
+        pa.parquet.write_table(structures, tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, STRUCTURES_NAME))
+
+    def close(self):
+        self.roll()
+
+
+def read_structure_ids(path):
+    """读取Parquet数据集的结构ID字典，返回 (按code排列的ID数组, 分区数)"""
+    pa = _require_pyarrow()
+    table = pa.parquet.read_table(os.path.join(path, STRUCTURES_NAME))
+    ids = np.empty(table.num_rows, dtype=object)
+    ids[table['code'].to_numpy()] = table['structure_id'].to_pylist()
+    n_partitions = int(table.schema.metadata[b'n_partitions'])
+    return ids, n_partitions
+
+
+def iter_contribution_batches(path, columns=None, queries=None, chunksize=1000000):
+    """分块读取残基贡献结果，CSV文件和Parquet数据集均可
+
+    columns：只读取这些列（列名同CSV输出）
+    queries：只返回这些query的行；Parquet数据集会据此跳过无关分区和row group
+    """
+    if not is_parquet_dataset(path):
+        usecols = None
+        if columns is not None:
+            usecols = list(columns) + (['query'] if queries is not None and 'query' not in columns else [])
+        for chunk in pd.read_csv(path, chunksize=chunksize, usecols=usecols):
+            if queries is not None:
+                chunk = chunk[chunk['query'].isin(queries)]
+                if columns is not None:
+                    chunk = chunk[list(columns)]
+            yield chunk
+        return
+
+    pa = _require_pyarrow()
+    import pyarrow.compute as pc
+
+    columns = list(columns) if columns is not None else \
+        ['query', 'target', 'residue_number', 'rmsd_contribution', 'total_rmsd', 'aligned_length']
+    ids, n_partitions = read_structure_ids(path)
+    # 结构ID列在文件中以整数编码存储
+    read_columns = [{'query': 'query_code', 'target': 'target_code'}.get(c, c) for c in columns]
+
+    dataset = pa.dataset.dataset(path, format='parquet', partitioning='hive')
+    filter_expr = None
+    if queries is not None:
+        code_of = {name: code for code, name in enumerate(ids)}
+        codes = sorted({code_of[q] for q in queries if q in code_of})
+        parts = sorted({c % n_partitions for c in codes})
+        filter_expr = pc.field('query_code').isin(codes) & pc.field(PARTITION_COLUMN).isin(parts)
+
+    for batch in dataset.to_batches(columns=read_columns, filter=filter_expr, batch_size=chunksize):
+        if batch.num_rows == 0:
+            continue
+        frame = {}
+        for name, read_name in zip(columns, read_columns):
+            values = batch.column(read_name).to_numpy(zero_copy_only=False)
+            frame[name] = ids[values] if read_name.endswith('_code') else values
+        yield pd.DataFrame(frame, columns=columns)
+
+
+
+def read_residue_stats(path, queries=None, chunksize=1000000, groups=None, max_evalue=None, residue_range=None,
+                       quantiles=False):
+    """得到每个残基的累积统计量
+
+    path 为 query_layer.py 建立的查询库时用带索引的查询筛选（只有查询库支持按组、e-value和残基范围筛选），
+    默认只由SQL分组聚合得到 count / mean / M2；需要中位数、IQR等分位数时传入 quantiles=True，
+    逐行取出数值并累积分位数草图（慢得多）。
+    为 RMSD_1_batch --aggregate-only 写出的汇总表时直接读取；
+    否则分块读取残基贡献结果（CSV或Parquet）并累积（流式累积时总是同时累积分位数草图）。
+    """
+    if __package__:
+        from .query_layer import QueryStore, is_query_store
+    else:
+        from query_layer import QueryStore, is_query_store
+    if is_query_store(path):
+        with QueryStore(path) as store:
+            return store.residue_stats(queries=queries, groups=groups, max_evalue=max_evalue,
+                                       residue_range=residue_range, quantiles=quantiles)
+    if groups is not None or max_evalue is not None or residue_range is not None:
+        raise ValueError("Filtering by group, e-value or residue range needs a query store "
+                         "(build one with query_layer.py build)")
+    if not is_parquet_dataset(path) and ResidueStats.is_summary_file(path):
+        if queries is not None:
+            raise ValueError("A residue summary file cannot be filtered by query")
+        return ResidueStats.load_summary(path)
+    stats = ResidueStats()
+    for chunk in iter_contribution_batches(path, columns=['residue_number', 'rmsd_contribution'],
+                                           queries=queries, chunksize=chunksize):
+        stats.update(chunk['residue_number'].to_numpy(), chunk['rmsd_contribution'].to_numpy())
+    return stats
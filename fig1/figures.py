@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""fig1 各图的绘制函数
+
+每个函数只接收已经算好的小表（每个残基、每个结构或每个预测一行），画一张图并保存后关闭，
+不读取原始数据；全局字体等设置放在 rc_context 中，同一进程连续绘制多张图时互不影响。
+各脚本和 render_figures.py 共用这些函数。
+"""
+import numpy as np
+
+
+def _pyplot():
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def conservation_bubble(conservation, global_mean, output_path, dpi=300):
+    """残基保守性气泡图（RMSD_2_bubble_chunck.py）：颜色为CV，气泡大小为标准差"""
+    plt = _pyplot()
+    with plt.rc_context({'font.size': 18, 'legend.fontsize': 16}):
+        plt.figure(figsize=(17, 10), dpi=dpi)  # 增加高度到10英寸
+
+        # 动态计算气泡大小
+        min_size = 20
+        max_size = 300
+        size_range = conservation['std'].max() - conservation['std'].min()
+        if size_range > 0:
+            bubble_sizes = min_size + (conservation['std'] - conservation['std'].min()) / size_range * (max_size - min_size)
+        else:
+            bubble_sizes = np.full_like(conservation['std'], (min_size + max_size)/2)
+
+        # 绘制散点图
+        scatter = plt.scatter(
+            x=conservation.index,
+            y=conservation['mean'],
+            c=conservation['cv'],
+            s=bubble_sizes,
+            cmap='coolwarm',
+            alpha=0.7,
+            edgecolors='black',
+            linewidths=0.5
+        )
+
+        # 添加参考线
+        plt.axhline(
+            y=global_mean,
+            color='red',
+            linestyle='--',
+            linewidth=2,
+            alpha=0.7,
+            label=f'Global Mean ({global_mean:.2f}Å)'
+        )
+
+        # 添加颜色条
+        cbar = plt.colorbar(scatter, pad=0.01)
+        cbar.set_label('Coefficient of Variation (CV)', rotation=270, labelpad=25, fontsize=18)
+        cbar.ax.tick_params(labelsize=18)
+
+        # 添加气泡大小图例
+        for size in [min_size, (min_size + max_size)//2, max_size]:
+            # 计算对应的标准差范围
+            if size_range > 0:
+                std_value = conservation['std'].min() + (size - min_size) / (max_size - min_size) * size_range
+            else:
+                std_value = conservation['std'].mean()
+
+            plt.scatter(
+                [], [],
+                s=size,
+                c='gray',
+                alpha=0.5,
+                edgecolors='black',
+                label=f'Std={std_value:.2f}Å'
+            )
+
+        # 设置图形属性
+        plt.title(
+            'Residue Conservation Analysis\n'
+            'Color: Coefficient of Variation | Bubble Size: Standard Deviation',
+            pad=20,
+            fontsize=18,
+            y=1.02  # 稍微上移标题
+        )
+        plt.xlabel('Residue Number', fontsize=18)
+        plt.ylabel('Mean RMSD Contribution (Å)', fontsize=18)
+        plt.grid(alpha=0.2, linestyle=':')
+
+        # 设置坐标轴刻度
+        plt.xticks(fontsize=18)
+        plt.yticks(fontsize=18)
+
+        # 智能调整X轴刻度
+        if len(conservation) > 50:
+            step = max(1, len(conservation) // 20)
+            plt.xticks(conservation.index[::step], rotation=45)
+        else:
+            plt.xticks(conservation.index, rotation=45)
+
+        # 添加并调整图例位置
+        plt.legend(
+            loc='upper center',
+            bbox_to_anchor=(0.5, 0.98),  # 向下调整位置
+            ncol=4,
+            frameon=True,
+            handletextpad=1.5,
+            columnspacing=2.0,
+            markerscale=0.8,
+            borderaxespad=0.5
+        )
+
+        # 调整布局
+        plt.subplots_adjust(top=0.88)  # 调整顶部空间
+
+        # 保存图形
+        plt.tight_layout()
+        plt.savefig(output_path, bbox_inches='tight', transparent=False, dpi=dpi)
+        plt.close()
+
+
+def rmsd_stability(conservation, global_mean, output_path, dpi=300):
+    """每个残基平均RMSD贡献 ± 标准差的折线图（mean_RMSD.py）"""
+    plt = _pyplot()
+    with plt.rc_context({'font.size': 16}):  # 设置全局基础字体大小
+        plt.figure(figsize=(17, 8), dpi=dpi)
+
+        # 绘制折线图 (均值)
+        plt.plot(
+            conservation.index,
+            conservation['mean'],
+            color='royalblue',
+            linewidth=2.5  # 增加线宽
+        )
+
+        # 绘制标准差阴影区域
+        plt.fill_between(
+            x=conservation.index,
+            y1=conservation['mean'] - conservation['std'],
+            y2=conservation['mean'] + conservation['std'],
+            color='skyblue',
+            alpha=0.4
+        )
+
+        # 添加全局均值参考线 (保留label)
+        plt.axhline(
+            y=global_mean,
+            color='red',
+            linestyle='--',
+            linewidth=2.0,  # 增加线宽
+            alpha=0.8,
+            label=f'Global Mean ({global_mean:.2f}Å)'
+        )
+
+        # 设置图形属性
+        plt.title('Residue RMSD Stability Analysis', pad=20, fontsize=40)
+        plt.xlabel('Residue Number', fontsize=38)
+        plt.ylabel('RMSD Contribution (Å)', fontsize=38)
+        plt.grid(alpha=0.2, linestyle=':')
+
+        # 自动设置纵坐标范围和刻度（保留一位小数）
+        max_value = conservation['mean'].max() + conservation['std'].max()
+        upper_limit = np.ceil(max_value * 10) / 10  # 向上取整到一位小数
+        yticks = np.arange(0, upper_limit + 0.1, 0.5)  # 每0.5一个刻度
+        plt.ylim(0, upper_limit)
+        plt.yticks(yticks, fontsize=36)
+
+        # 设置横坐标刻度字体大小
+        plt.xticks(fontsize=36)
+
+        # 智能调整X轴刻度
+        if len(conservation) > 50:
+            step = max(1, len(conservation) // 20)
+            plt.xticks(conservation.index[::step], rotation=45)
+        else:
+            plt.xticks(conservation.index, rotation=45)
+
+        # 添加图例 (只会显示Global Mean)
+        plt.legend(
+            loc='best',
+            frameon=True,
+            fontsize=36,
+            title_fontsize=38
+        )
+
+        # 优化布局并保存
+        plt.tight_layout()
+        plt.savefig(output_path, bbox_inches='tight', transparent=False)
+        plt.close()
+
+
+def ptm_distribution(ptm, output_path, dpi=300):
+    """pTM值的直方图和箱线图（pTM_2.py）"""
+    plt = _pyplot()
+    import seaborn as sns
+
+    # 设置中文显示
+    with plt.rc_context({'font.sans-serif': ['SimHei'], 'axes.unicode_minus': False}):
+        plt.figure(figsize=(15, 8))
+
+        # 直方图
+        plt.subplot(1, 2, 1)
+        sns.histplot(ptm, bins=30, kde=True, color='royalblue')
+        plt.axvline(x=0.7, color='r', linestyle='--', label='高置信度 (0.7)')
+        plt.axvline(x=0.5, color='orange', linestyle='--', label='中等置信度 (0.5)')
+        plt.xlabel('pTM值')
+        plt.ylabel('数量')
+        plt.title('pTM值分布')
+        plt.legend()
+        plt.grid(True, alpha=0.3)
+
+        # 箱线图
+        plt.subplot(1, 2, 2)
+        sns.boxplot(y=ptm, color='lightgreen')
+        plt.ylabel('pTM值')
+        plt.title('pTM值箱线图')
+        plt.grid(True, alpha=0.3)
+
+        plt.tight_layout()
+        plt.savefig(output_path, dpi=dpi)
+        plt.close()
+
+
+def plddt_mean_distribution(summary_df, output_path, dpi=100):
+    """每条链平均pLDDT的分布（all_plddt_distribution.py）"""
+    plt = _pyplot()
+    import seaborn as sns
+
+    plt.figure(figsize=(10, 6))
+    sns.histplot(summary_df['mean_plddt'], bins=30, kde=True)
+    plt.axvline(x=90, color='g', linestyle='--', label='Very High (90)')
+    plt.axvline(x=70, color='b', linestyle='--', label='High (70)')
+    plt.axvline(x=50, color='r', linestyle='--', label='Medium (50)')
+    plt.xlabel('Mean pLDDT')
+    plt.ylabel('Number of Structures')
+    plt.title('Distribution of Global Mean pLDDT Scores')
+    plt.legend()
+    plt.savefig(output_path, dpi=dpi)
+    plt.close()
+
+
+def plddt_summary_boxplot(summary_df, output_path, dpi=100):
+    """每条链 Mean / Min / Max pLDDT 的箱线图（all_plddt_distribution.py）"""
+    plt = _pyplot()
+    import seaborn as sns
+
+    plt.figure(figsize=(10, 6))
+    sns.boxplot(data=summary_df[['mean_plddt', 'min_plddt', 'max_plddt']])
+    plt.ylabel('pLDDT Score')
+    plt.title('Distribution of Mean, Min, and Max pLDDT per Structure')
+    plt.savefig(output_path, dpi=dpi)
+    plt.close()
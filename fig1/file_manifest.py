@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""增量运行用的文件清单：记录每个输入文件处理时的大小和修改时间
+
+重跑时与当前目录比较，只有新增或改动过的文件需要重新处理，已删除的文件从输出中去掉；
+输出表按键列合并（删掉过期的行、追加新结果），不必从头重建。
+"""
+import os
+import json
+
+
+class FileManifest:
+    """保存在输出目录中的JSON清单：{键: [大小, 修改时间ns]}，以及各输出文件已提交的字节数
+
+    键由调用方决定（文件名或路径），与输出表中标识来源文件的列一致。
+    root 为输入目录，输入目录不同的清单视为无效。
+    输出文件只追加写入；每次 save() 记录其长度，重跑时 truncate_outputs() 去掉
+    上次中断时已写出、但尚未记入清单的行，这些文件会被当作新文件重新处理。
+    """
+
+    def __init__(self, path, root):
+        self.path = path
+        self.root = os.path.abspath(root)
+        self.files = {}
+        self.outputs = {}
+
+    def load(self):
+        """读取已有清单；不存在或输入目录不同时返回 False"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('root') != self.root:
+            return False
+        self.files = {key: tuple(value) for key, value in data['files'].items()}
+        self.outputs = data.get('outputs', {})
+        return True
+
+    def truncate_outputs(self):
+        """把输出文件截断到清单记录的长度；返回 False 表示有输出文件缺失或比记录的短（需要全量重建）"""
+        for path, size in self.outputs.items():
+            if (os.path.getsize(path) if os.path.exists(path) else 0) < size:
+                return False
+        for path, size in self.outputs.items():
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        return True
+
+    def diff(self, current):
+        """current 为 {键: (大小, 修改时间ns)}，返回 (需要处理的键列表, 已删除的键列表)"""
+        changed = [key for key, value in current.items() if self.files.get(key) != tuple(value)]
+        removed = [key for key in self.files if key not in current]
+        return changed, removed
+
+    def update(self, entries):
+        """记录已处理的文件"""
+        self.files.update((key, tuple(value)) for key, value in entries.items())
+
+    def remove(self, keys):
+        for key in keys:
+            self.files.pop(key, None)
+
+    def save(self, outputs=()):
+        """记录 outputs 中各文件的当前长度并保存；先写临时文件再替换，中断时不会留下半个清单"""
+        self.outputs = {os.path.abspath(path): os.path.getsize(path) if os.path.exists(path) else 0
+                        for path in outputs}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'root': self.root, 'files': self.files, 'outputs': self.outputs}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def file_signature(entry):
+    """os.DirEntry 或路径对应的 (大小, 修改时间ns)"""
+    st = entry.stat() if isinstance(entry, os.DirEntry) else os.stat(entry)
+    return st.st_size, st.st_mtime_ns
+
+
+def drop_rows(path, key_column, keys, chunksize=1000000):
+    """从CSV中删除 key_column 属于 keys 的行（分块流式改写，文件不存在或 keys 为空时不做任何事）
+
+    返回删除的行数。
+    """
+    keys = set(keys)
+    if not keys or not os.path.exists(path):
+        return 0
+    import pandas as pd
+
+    tmp_path = f"{path}.tmp"
+    dropped = 0
+    # 所有列按原文本读写，未删除的行保持原样
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+        pd.read_csv(path, nrows=0).to_csv(out, index=False)
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False):
+            stale = chunk[key_column].isin(keys)
+            dropped += int(stale.sum())
+            chunk[~stale].to_csv(out, header=False, index=False)
+    if dropped:
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+    return dropped
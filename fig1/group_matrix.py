@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""一次流式扫描比对结果，得到任意多组结构两两之间（含组内）的RMSD统计矩阵
+
+分组方式：一组ID前缀（结构ID以哪个前缀开头就属于哪组，排在前面的前缀优先），
+或一个正则表达式（第一个捕获组、无捕获组时为整个匹配作为组名）。
+每个结构编号的组别只计算一次并缓存，扫描过程全部是数组运算。
+对每个组对输出：结构对数、相对理论最大对数的覆盖率、RMSD均值/标准差/最值及分位数。
+"""
+import os
+import re
+import argparse
+
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .aln_store import iter_pair_codes
+    from .pair_scan import PairDeduplicator, RunningStats, canonical_pair_keys
+    from .quantile_sketch import LogHistogram
+else:
+    from aln_store import iter_pair_codes
+    from pair_scan import PairDeduplicator, RunningStats, canonical_pair_keys
+    from quantile_sketch import LogHistogram
+
+ALN_RESULTS = "D:/tools/data/GII_GIX_foldseek/aln_results_rmsd.tsv"
+OUTPUT_DIR = "D:/tools/data/GII_GIX_foldseek/results/"
+GROUP_PREFIXES = ['GII_pdb', 'GIX_pdb']
+CHUNKSIZE = 1000000  # 每块读取的比对行数
+MATRIX_NAME = "group_rmsd_matrix.csv"
+
+
+class GroupMatcher:
+    """把结构编号映射为组号（-1为不属于任何组），按编号缓存"""
+
+    def __init__(self, prefixes=None, pattern=None):
+        if (prefixes is None) == (pattern is None):
+            raise ValueError("Specify exactly one of prefixes or pattern")
+        self.prefixes = list(prefixes) if prefixes is not None else None
+        self.pattern = None
+        if pattern is not None:
+            self.pattern = re.compile(pattern)
+            if self.pattern.groups == 0:
+                self.pattern = re.compile(f"({pattern})")
+        self.labels = list(self.prefixes) if self.prefixes is not None else []
+        self._label_index = {label: k for k, label in enumerate(self.labels)}
+        self.membership = np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _assign(self, names):
+        names = pd.Series(names, dtype=object).fillna('').astype(str)
+        groups = np.full(len(names), -1, dtype=np.int32)
+        if self.prefixes is not None:
+            # 倒序赋值，使排在前面的前缀优先
+            for k in range(len(self.prefixes) - 1, -1, -1):
+                groups[names.str.startswith(self.prefixes[k]).to_numpy()] = k
+            return groups
+        labels = names.str.extract(self.pattern, expand=False)
+        if isinstance(labels, pd.DataFrame):
+            labels = labels.iloc[:, 0]
+        found = labels.notna().to_numpy()
+        for label in pd.unique(labels[found]):
+            if label not in self._label_index:
+                self._label_index[label] = len(self.labels)
+                self.labels.append(label)
+        groups[found] = labels[found].map(self._label_index).to_numpy(dtype=np.int32)
+        return groups
+
+    def update(self, names):
+        """为新出现的结构（names 中超出缓存长度的部分）计算组别，返回按编号排列的组号数组"""
+        if len(names) > len(self.membership):
+            self.membership = np.concatenate([self.membership, self._assign(names[len(self.membership):])])
+        return self.membership
+
+
+class GroupPairStats:
+    """一个组对的RMSD统计量与分位数草图"""
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.sketch = LogHistogram()
+
+    def update(self, rmsd):
+        self.stats.update(rmsd)
+        self.sketch.update(rmsd)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        return self
+
+
+def scan_group_matrix(aln_path, matcher, chunksize=CHUNKSIZE):
+    """单次流式扫描比对结果（Foldseek TSV、aln_store导入的比对库或query_layer查询库）
+
+    结构对按无序对去重（保留首次出现的方向），自身比对被忽略。
+    返回 (每组的结构数数组, {(组号i, 组号j): GroupPairStats}，其中 i <= j)
+    """
+    dedup = PairDeduplicator()
+    cells = {}
+    names = []
+    total_rows = 0
+    for q_codes, t_codes, rmsd, names in iter_pair_codes(aln_path, chunksize=chunksize):
+        total_rows += len(q_codes)
+        membership = matcher.update(names)
+        q_group = membership[q_codes]
+        t_group = membership[t_codes]
+        rows = np.flatnonzero((q_group >= 0) & (t_group >= 0) & (q_codes != t_codes))
+        if not len(rows):
+            continue
+        rows = rows[dedup.first_occurrences(canonical_pair_keys(q_codes[rows], t_codes[rows]))]
+        if not len(rows):
+            continue
+        # 组对编码为 (较小组号 << 32) | 较大组号，按组对分组更新
+        cell_keys = canonical_pair_keys(q_group[rows], t_group[rows])
+        order = np.argsort(cell_keys, kind='stable')
+        unique_keys, starts = np.unique(cell_keys[order], return_index=True)
+        for key, part in zip(unique_keys, np.split(order, starts[1:])):
+            cell = (int(key >> 32), int(key & 0xFFFFFFFF))
+            cells.setdefault(cell, GroupPairStats()).update(rmsd[rows[part]])
+    print(f"Total alignments scanned: {total_rows}")
+    membership = matcher.update(names)
+    group_sizes = np.bincount(membership[membership >= 0], minlength=len(matcher))
+    return group_sizes, cells
+
+
+def matrix_frame(labels, group_sizes, cells):
+    """整理为每个组对（含组内）一行的长表"""
+    records = []
+    for i in range(len(labels)):
+        for j in range(i, len(labels)):
+            n_i, n_j = int(group_sizes[i]), int(group_sizes[j])
+            max_pairs = n_i * (n_i - 1) // 2 if i == j else n_i * n_j
+            cell = cells.get((i, j))
+            n_pairs = cell.stats.count if cell is not None else 0
+            record = {
+                'group_a': labels[i], 'group_b': labels[j],
+                'n_a': n_i, 'n_b': n_j,
+                'pairs': n_pairs, 'max_pairs': max_pairs,
+                'coverage': n_pairs / max_pairs if max_pairs else np.nan,
+                'mean': np.nan, 'std': np.nan, 'min': np.nan, 'max': np.nan,
+            }
+            if n_pairs:
+                record.update({'mean': cell.stats.mean, 'std': cell.stats.std(),
+                               'min': cell.stats.min, 'max': cell.stats.max})
+                record.update(cell.sketch.summary())
+            records.append(record)
+    columns = ['group_a', 'group_b', 'n_a', 'n_b', 'pairs', 'max_pairs', 'coverage',
+               'mean', 'std', 'min', 'max', 'p5', 'q1', 'median', 'q3', 'p95', 'iqr']
+    return pd.DataFrame.from_records(records, columns=columns)
+
+
+def square_matrix(frame, value):
+    """把长表中的一列展开为对称的 组 x 组 矩阵"""
+    labels = list(dict.fromkeys(frame['group_a'].tolist() + frame['group_b'].tolist()))
+    matrix = pd.DataFrame(np.zeros((len(labels), len(labels)), dtype=frame[value].dtype),
+                          index=pd.Index(labels, name='group'), columns=labels)
+    for a, b, v in zip(frame['group_a'], frame['group_b'], frame[value]):
+        matrix.loc[a, b] = v
+        matrix.loc[b, a] = v
+    return matrix
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="一次扫描比对结果，统计多组结构两两之间的RMSD矩阵")
+    parser.add_argument('--alignments', default=ALN_RESULTS, help="Foldseek比对结果TSV、aln_store导入的比对库目录或query_layer查询库")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="输出目录")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--prefix', action='append', dest='prefixes',
+                       help="分组用的结构ID前缀（可重复，排在前面的优先）")
+    group.add_argument('--pattern', help="分组用的正则表达式（第一个捕获组为组名）")
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help="每块读取的比对行数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.pattern is not None:
+        matcher = GroupMatcher(pattern=args.pattern)
+    else:
+        matcher = GroupMatcher(prefixes=args.prefixes or GROUP_PREFIXES)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    print("Scanning Foldseek alignment results...")
+    group_sizes, cells = scan_group_matrix(args.alignments, matcher, chunksize=args.chunksize)
+    frame = matrix_frame(matcher.labels, group_sizes, cells)
+    for label, size in zip(matcher.labels, group_sizes):
+        print(f"Found {size} unique {label} structures")
+
+    matrix_file = os.path.join(args.output_dir, MATRIX_NAME)
+    frame.to_csv(matrix_file, index=False)
+    for value in ['pairs', 'coverage', 'median']:
+        square_matrix(frame, value).to_csv(os.path.join(args.output_dir, f"group_{value}_matrix.csv"))
+    print(frame[['group_a', 'group_b', 'pairs', 'max_pairs', 'coverage', 'mean', 'median']].to_string(index=False))
+    print(f"Saved group RMSD matrix to {matrix_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""不完整解析JSON，只取出需要的标量
+
+AlphaFold的结果JSON里大部分是PAE矩阵和逐残基数组，而我们只需要 ptm/iptm 这样的一个值。
+这里用正则表达式在内存映射的文件上逐个跳过顶层对象的值（数组和对象只匹配括号和字符串，
+不构建Python对象），记录每个键的值所在的字节范围，只对选中的那个值调用 json.loads。
+遇到最高优先级的键就立即停止扫描；格式不符合预期时退回到完整的 json.load。
+同一对象中有重复的键时取第一次出现的值（json.load 默认取最后一次），
+这样扫描到就能停止；完整解析时也按同样的规则合并，两条路径结果一致。
+"""
+import re
+import json
+import mmap
+
+_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_SCALAR = re.compile(rb'[^,}\] \t\n\r]+')
+# 跳过嵌套值时只关心括号；字符串整体匹配，其中的括号不计数
+_STRUCTURE = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]', re.DOTALL)
+
+
+def _skip_ws(buf, pos):
+    return _WHITESPACE.match(buf, pos).end()
+
+
+def _count(buf, token, start, stop):
+    """mmap 没有 count 方法，用 find 逐个计数"""
+    n = 0
+    pos = buf.find(token, start, stop)
+    while pos >= 0:
+        n += 1
+        pos = buf.find(token, pos + 1, stop)
+    return n
+
+
+def _skip_plain_container(buf, pos):
+    """假定其中没有字符串，用 find/count 找到从 pos 开始的数组或对象的结束位置（数值数组的快速路径）"""
+    depth = 0
+    start = pos
+    next_close = {b']': buf.find(b']', pos), b'}': buf.find(b'}', pos)}
+    while True:
+        candidates = [p for p in next_close.values() if p >= 0]
+        if not candidates:
+            return None
+        close = min(candidates)
+        depth += _count(buf, b'[', start, close) + _count(buf, b'{', start, close) - 1
+        if depth == 0:
+            return close + 1
+        if depth < 0:
+            return None
+        token = buf[close:close + 1]
+        next_close[token] = buf.find(token, close + 1)
+        start = close + 1
+
+
+def _skip_value(buf, pos):
+    """返回从 pos 开始的JSON值结束后的位置"""
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        match = _STRING.match(buf, pos)
+        if match is None:
+            raise ValueError("Unterminated string")
+        return match.end()
+    if first in (b'[', b'{'):
+        end = _skip_plain_container(buf, pos)
+        if end is not None and buf.find(b'"', pos, end) < 0:
+            return end
+        # 含有字符串时逐个匹配括号和字符串（字符串中的括号不计数）
+        depth = 0
+        for match in _STRUCTURE.finditer(buf, pos):
+            token = match.group()
+            if token in (b'[', b'{'):
+                depth += 1
+            elif token in (b']', b'}'):
+                depth -= 1
+                if depth == 0:
+                    return match.end()
+        raise ValueError("Unterminated array or object")
+    match = _SCALAR.match(buf, pos)
+    if match is None:
+        raise ValueError(f"Unexpected character at {pos}")
+    return match.end()
+
+
+def iter_object_members(buf, pos=0):
+    """逐个产出从 pos 开始的JSON对象的 (键, 值起始位置, 值结束位置)，值本身不解析"""
+    pos = _skip_ws(buf, pos)
+    if buf[pos:pos + 1] != b'{':
+        raise ValueError("Not a JSON object")
+    pos = _skip_ws(buf, pos + 1)
+    if buf[pos:pos + 1] == b'}':
+        return
+    while True:
+        match = _STRING.match(buf, pos)
+        if match is None:
+            raise ValueError(f"Expected a key at {pos}")
+        key = json.loads(match.group())
+        pos = _skip_ws(buf, match.end())
+        if buf[pos:pos + 1] != b':':
+            raise ValueError(f"Expected ':' at {pos}")
+        start = _skip_ws(buf, pos + 1)
+        end = _skip_value(buf, start)
+        yield key, start, end
+        pos = _skip_ws(buf, end)
+        token = buf[pos:pos + 1]
+        if token == b'}':
+            return
+        if token != b',':
+            raise ValueError(f"Expected ',' or '}}' at {pos}")
+        pos = _skip_ws(buf, pos + 1)
+
+
+def _first_by_priority(buf, pos, keys, record=()):
+    """对象中按 keys 的优先级取第一个存在的键，返回 (键, 起始, 结束) 或 None
+
+    扫描到最高优先级的键即停止；record 中的键（第一次出现时）的值范围记入返回的字典。
+    """
+    rank = {key: k for k, key in enumerate(keys)}
+    best = None
+    spans = {}
+    for key, start, end in iter_object_members(buf, pos):
+        if key in record and key not in spans:
+            spans[key] = (start, end)
+        k = rank.get(key)
+        if k is not None and (best is None or k < best[0]):
+            best = (k, key, start, end)
+            if k == 0:
+                break
+    return (best[1:] if best is not None else None), spans
+
+
+def _scan(buf, keys, nested_in, nested_keys):
+    found, spans = _first_by_priority(buf, 0, keys, record=nested_in)
+    if found is not None:
+        value = json.loads(buf[found[1]:found[2]])
+        if value is not None:
+            return True, value
+        # 选中的键值为 null：提前停止时可能还没有看到后面的子对象，完整扫描一遍顶层
+        _, spans = _first_by_priority(buf, 0, (), record=nested_in)
+    # 顶层没有 keys 中的键时，依次在 nested_in 指向的子对象中查找 nested_keys
+    for outer in nested_in:
+        if outer not in spans:
+            continue
+        start = spans[outer][0]
+        if buf[start:start + 1] != b'{':
+            raise ValueError(f"'{outer}' is not an object")
+        inner, _ = _first_by_priority(buf, start, nested_keys)
+        if inner is not None:
+            value = json.loads(buf[inner[1]:inner[2]])
+            if value is not None:
+                return True, value
+    return False, None
+
+
+def _first_occurrence_pairs(pairs):
+    """json.load 的 object_pairs_hook：重复的键保留第一次出现的值"""
+    data = {}
+    for key, value in pairs:
+        data.setdefault(key, value)
+    return data
+
+
+def _find_in_data(data, keys, nested_in, nested_keys):
+    """在完整解析的数据上按同样的规则查找"""
+    for key in keys:
+        if key in data:
+            if data[key] is not None:
+                return True, data[key]
+            break
+    for outer in nested_in:
+        if outer in data:
+            inner = data[outer]
+            for key in nested_keys:
+                if key in inner:
+                    if inner[key] is not None:
+                        return True, inner[key]
+                    break
+    return False, None
+
+
+def find_first_value(path, keys, nested_in=(), nested_keys=()):
+    """在JSON文件中按优先级查找值
+
+    先在顶层按 keys 的顺序查找；都不存在时依次在 nested_in 中的子对象里按 nested_keys 的顺序查找。
+    某一层选中的键值为 null 时视为该层未找到，继续下一层。重复的键取第一次出现的值。
+    返回 (是否找到, 值)。流式扫描失败时退回到完整解析，结果相同。
+    """
+    with open(path, 'rb') as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            buf = None
+        if buf is not None:
+            try:
+                return _scan(buf, keys, nested_in, nested_keys)
+            except (ValueError, IndexError):
+                pass
+            finally:
+                buf.close()
+    with open(path, 'r') as f:
+        data = json.load(f, object_pairs_hook=_first_occurrence_pairs)
+    return _find_in_data(data, keys, nested_in, nested_keys)
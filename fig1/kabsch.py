@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""批量Kabsch叠合：一次性计算一批比对的最佳旋转、总RMSD和叠合后逐残基偏差
+
+约定与 Bio.SVDSuperimposer 相同：fixed 为参照，moving 被旋转，
+moving @ rot + tran 即叠合到 fixed 上。
+"""
+import numpy as np
+
+# 每次堆叠计算的比对数，限制补齐数组的内存占用
+BLOCK_SIZE = 1024
+
+
+def _superpose_block(fixed, moving, mask):
+    """对一块补齐后的坐标 (B, L, 3) 做叠合，mask 为 (B, L) 布尔数组"""
+    weights = mask[:, :, None].astype(np.float64)
+    counts = mask.sum(axis=1).astype(np.float64)
+    safe_counts = np.where(counts > 0, counts, 1.0)
+
+    fixed = fixed * weights
+    moving = moving * weights
+    fixed_center = fixed.sum(axis=1) / safe_counts[:, None]
+    moving_center = moving.sum(axis=1) / safe_counts[:, None]
+    fixed_c = (fixed - fixed_center[:, None, :]) * weights
+    moving_c = (moving - moving_center[:, None, :]) * weights
+
+    # 协方差矩阵 H = moving_c^T @ fixed_c
+    cov = np.matmul(moving_c.transpose(0, 2, 1), fixed_c)
+    u, _, vt = np.linalg.svd(cov)
+    # rot = U @ Vt，修正反射使 det(rot) = +1
+    det = np.sign(np.linalg.det(np.matmul(u, vt)))
+    det[det == 0] = 1.0
+    u[:, :, 2] *= det[:, None]
+    rotations = np.matmul(u, vt)
+    translations = fixed_center - np.einsum('bi,bij->bj', moving_center, rotations)
+
+    # 叠合后逐残基偏差
+    diff = fixed_c - np.matmul(moving_c, rotations)
+    deviations = np.sqrt(np.einsum('bli,bli->bl', diff, diff))
+    rmsd = np.where(counts > 0, np.sqrt(np.sum(deviations ** 2, axis=1) / safe_counts), np.nan)
+    deviations[~mask] = np.nan
+    return rotations, translations, rmsd, deviations
+
+
+def superpose_padded(fixed, moving, mask=None):
+    """对补齐后的坐标 (B, L, 3) 做批量叠合，mask (B, L) 标记有效位置
+
+    返回:
+        rotations (B, 3, 3)、translations (B, 3)
+        rmsd (B,)：叠合后的RMSD（无有效位置时为NaN）
+        deviations (B, L)：叠合后每对残基的距离（无效位置为NaN）
+    """
+    fixed = np.asarray(fixed, dtype=np.float64)
+    moving = np.asarray(moving, dtype=np.float64)
+    if mask is None:
+        mask = np.ones(fixed.shape[:2], dtype=bool)
+    mask = np.asarray(mask, dtype=bool)
+
+    n = fixed.shape[0]
+    rotations = np.empty((n, 3, 3))
+    translations = np.empty((n, 3))
+    rmsd = np.empty(n)
+    deviations = np.empty(fixed.shape[:2])
+    for start in range(0, n, BLOCK_SIZE):
+        block = slice(start, start + BLOCK_SIZE)
+        rotations[block], translations[block], rmsd[block], deviations[block] = \
+            _superpose_block(fixed[block], moving[block], mask[block])
+    return rotations, translations, rmsd, deviations
+
+
+def superpose_flat(fixed, moving, lengths):
+    """对按比对依次拼接的坐标 (N, 3) 做批量叠合，lengths 为每个比对的残基对数
+
+    返回 rotations, translations, rmsd 以及与输入逐行对应的偏差 (N,)
+    """
+    fixed = np.asarray(fixed, dtype=np.float64).reshape(-1, 3)
+    moving = np.asarray(moving, dtype=np.float64).reshape(-1, 3)
+    lengths = np.asarray(lengths, dtype=np.intp)
+    n = len(lengths)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    rotations = np.empty((n, 3, 3))
+    translations = np.empty((n, 3))
+    rmsd = np.empty(n)
+    deviations = np.empty(len(fixed))
+    for start in range(0, n, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n)
+        block_lengths = lengths[start:stop]
+        width = max(int(block_lengths.max()), 1)
+        mask = np.arange(width)[None, :] < block_lengths[:, None]
+        rows = slice(offsets[start], offsets[stop])
+        # 按掩码一次性填充补齐数组
+        padded_fixed = np.zeros((stop - start, width, 3))
+        padded_moving = np.zeros((stop - start, width, 3))
+        padded_fixed[mask] = fixed[rows]
+        padded_moving[mask] = moving[rows]
+        rotations[start:stop], translations[start:stop], rmsd[start:stop], dev = \
+            _superpose_block(padded_fixed, padded_moving, mask)
+        deviations[rows] = dev[mask]
+    return rotations, translations, rmsd, deviations
+
+
+def superpose_ragged(fixed_list, moving_list):
+    """对长度不一的坐标对列表做批量叠合
+
+    返回 rotations, translations, rmsd 以及与输入一一对应的逐残基偏差列表
+    """
+    n = len(fixed_list)
+    if n == 0:
+        return np.empty((0, 3, 3)), np.empty((0, 3)), np.empty(0), []
+    lengths = np.array([len(f) for f in fixed_list], dtype=np.intp)
+    fixed = np.concatenate([np.asarray(f, dtype=np.float64).reshape(-1, 3) for f in fixed_list])
+    moving = np.concatenate([np.asarray(m, dtype=np.float64).reshape(-1, 3) for m in moving_list])
+    rotations, translations, rmsd, deviations = superpose_flat(fixed, moving, lengths)
+    return rotations, translations, rmsd, np.split(deviations, np.cumsum(lengths)[:-1])
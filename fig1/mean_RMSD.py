@@ -1,82 +1,46 @@
 # -*- coding: utf-8 -*-
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
+import argparse
 
-# 加载数据
-df = pd.read_csv('D:/tools/data/GII.3_foldseek/results/residue_rmsd_contributions.csv')
-
-# 数据预处理
-df = df.dropna(subset=['rmsd_contribution'])
-conservation = df.groupby('residue_number')['rmsd_contribution'].agg(['mean', 'std'])
-
-# 创建图形并设置全局字体
-plt.rcParams.update({'font.size': 16})  # 设置全局基础字体大小
-plt.figure(figsize=(17, 8), dpi=300)
+if __package__:
+    from .contrib_io import read_residue_stats
+    from .figures import rmsd_stability
+else:
+    from contrib_io import read_residue_stats
+    from figures import rmsd_stability
 
-# 绘制折线图 (均值) - 移除label参数
-plt.plot(
-    conservation.index,
-    conservation['mean'],
-    color='royalblue',
-    linewidth=2.5  # 增加线宽
-)
+# 输入可以是CSV文件、RMSD_1_batch --format parquet 输出的数据集目录，
+# RMSD_1_batch --aggregate-only 输出的残基汇总表，或 query_layer.py 建立的查询库（可按组、e-value、残基范围筛选）
+CONTRIB_PATH = 'D:/tools/data/GII.3_foldseek/results/residue_rmsd_contributions.csv'
+QUERIES = None  # 只统计这些query结构（None为全部）
+OUTPUT_PATH = "path.."
 
-# 绘制标准差阴影区域 - 移除label参数
-plt.fill_between(
-    x=conservation.index,
-    y1=conservation['mean'] - conservation['std'],
-    y2=conservation['mean'] + conservation['std'],
-    color='skyblue',
-    alpha=0.4
-)
 
-# 添加全局均值参考线 (保留label)
-global_mean = df['rmsd_contribution'].mean()
-plt.axhline(
-    y=global_mean,
-    color='red',
-    linestyle='--',
-    linewidth=2.0,  # 增加线宽
-    alpha=0.8,
-    label=f'Global Mean ({global_mean:.2f}Å)'
-)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="绘制每个残基平均RMSD贡献 ± 标准差的折线图")
+    parser.add_argument('--contributions', default=CONTRIB_PATH,
+                        help="残基贡献CSV、Parquet数据集目录、残基汇总表或查询库")
+    parser.add_argument('--queries', nargs='+', default=QUERIES, help="只统计这些query结构")
+    parser.add_argument('--groups', nargs='+', default=None, help="只统计query属于这些组的行（仅查询库）")
+    parser.add_argument('--max-evalue', type=float, default=None, help="只统计 e-value 不大于此值的比对（仅查询库）")
+    parser.add_argument('--residue-range', type=int, nargs=2, default=None, metavar=('START', 'END'),
+                        help="只统计这一残基编号区间（仅查询库）")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="图片输出路径")
+    return parser.parse_args(argv)
 
-# 设置图形属性
-plt.title('Residue RMSD Stability Analysis', pad=20, fontsize=40)
-plt.xlabel('Residue Number', fontsize=38)
-plt.ylabel('RMSD Contribution (Å)', fontsize=38)
-plt.grid(alpha=0.2, linestyle=':')
 
-# 自动设置纵坐标范围和刻度（保留一位小数）
-max_value = conservation['mean'].max() + conservation['std'].max()
-upper_limit = np.ceil(max_value * 10) / 10  # 向上取整到一位小数
-yticks = np.arange(0, upper_limit + 0.1, 0.5)  # 每0.5一个刻度
-plt.ylim(0, upper_limit)
-plt.yticks(yticks, fontsize=36)
+def main(argv=None):
+    args = parse_args(argv)
 
-# 设置横坐标刻度字体大小
-plt.xticks(fontsize=36)
+    # 分块读取并累积每个残基的统计量（只读取需要的列，内存占用与文件大小无关）
+    stats = read_residue_stats(args.contributions, queries=args.queries, groups=args.groups,
+                               max_evalue=args.max_evalue, residue_range=args.residue_range)
+    conservation = stats.to_frame(ddof=1)[['mean', 'std']]
 
-# 智能调整X轴刻度
-if len(conservation) > 50:
-    step = max(1, len(conservation) // 20)
-    plt.xticks(conservation.index[::step], rotation=45)
-else:
-    plt.xticks(conservation.index, rotation=45)
+    # 绘制均值 ± 标准差折线图
+    rmsd_stability(conservation, stats.global_mean(), args.output)
 
-# 添加图例 (现在只会显示Global Mean)
-plt.legend(
-    loc='best', 
-    frameon=True,
-    fontsize=36,
-    title_fontsize=38
-)
+    print("Simplified RMSD stability plot with only Global Mean legend saved successfully.")
 
-# 优化布局并保存
-plt.tight_layout()
-plt.savefig(path.., 
-            bbox_inches='tight', transparent=False)
-plt.close()
 
-print("Simplified RMSD stability plot with only Global Mean legend saved successfully.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,148 +1,211 @@
 import os
-import json
-import pandas as pd
+import argparse
 import re
-import glob
+from concurrent.futures import ThreadPoolExecutor
+
+if __package__:
+    from .file_manifest import FileManifest, file_signature
+    from .json_scan import find_first_value
+else:
+    from file_manifest import FileManifest, file_signature
+    from json_scan import find_first_value
 
 # 设置路径
-input_dir = r"D:\tools\data\GII.4_pdbs"
-output_dir = r"D:\tools\data\ptm_analysis"
-os.makedirs(output_dir, exist_ok=True)
-
-# 调试信息
-print(f"开始处理目录: {input_dir} 中的预测结果...")
-print(f"找到 {len(os.listdir(input_dir))} 个文件/目录")
-
-ptm_data = []  # 存储所有pTM数据
-error_log = []  # 错误日志
-processed_count = 0
-found_count = 0
-
-# 提取基因型的辅助函数
-def extract_genotype(filename):
-    """从文件名中提取基因型信息"""
-    # 使用正则表达式匹配常见的诺如病毒基因型命名模式
-    patterns = [
-        r'G[IVXL]+\.\d+[A-Za-z]*',  # GI.1, GII.4_Sydney
-        r'NoV_G[IVXL]+\.\d+',       # NoV_GI.1
-        r'Norovirus_[A-Za-z]+\d+',  # Norovirus_GII4
-        r'[A-Z]{2}\d+_\d+',         # GII4_2012
-        r'P_Domain_[A-Za-z\d]+',    # P_Domain_GI1
-        r'G[IVXL]+\d+',             # GI1, GII4
-        r'[A-Z]+\d+_[A-Za-z]+'      # GII4_Sydney
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, filename)
-        if match:
-            return match.group(0)
-    
-    # 如果都匹配不到，返回文件名的前10个字符作为标识
-    return filename[:10] if len(filename) > 10 else filename
+INPUT_DIR = r"D:\tools\data\GII.4_pdbs"
+OUTPUT_DIR = r"D:\tools\data\ptm_analysis"
+SUMMARY_NAME = "ptm_summary.csv"
+MANIFEST_NAME = "ptm_manifest.json"
 
-# 搜索所有可能的pTM文件
-print("搜索所有可能的pTM文件...")
-ptm_files = []
+# 提取pTM值时依次尝试的键 - 适应不同版本的AlphaFold输出：
+# 先在顶层键中查找，如果没找到，再在模型数据中查找
+PTM_KEYS = ['ptm', 'pTM', 'predicted_tm_score', 'iptm', 'plddt']
+MODEL_KEYS = ['model_1', 'model_2', 'model_3', 'model_4', 'model_5']
+MODEL_PTM_KEYS = ['ptm', 'pTM', 'predicted_tm_score']
 
-# 查找所有可能的JSON文件
-# 搜索所有json文件
-for root, dirs, files in os.walk(input_dir):
-    for file in files:
-        if file.endswith('.json'):
-            ptm_files.append(os.path.join(root, file))
+# 常见的诺如病毒基因型命名模式（按优先级排列）
+GENOTYPE_PATTERNS = [
+    r'G[IVXL]+\.\d+[A-Za-z]*',  # GI.1, GII.4_Sydney
+    r'NoV_G[IVXL]+\.\d+',       # NoV_GI.1
+    r'Norovirus_[A-Za-z]+\d+',  # Norovirus_GII4
+    r'[A-Z]{2}\d+_\d+',         # GII4_2012
+    r'P_Domain_[A-Za-z\d]+',    # P_Domain_GI1
+    r'G[IVXL]+\d+',             # GI1, GII4
+    r'[A-Z]+\d+_[A-Za-z]+'      # GII4_Sydney
+]
+# 合并为一个预编译的正则：每个分支以惰性的 .*? 开头，引擎按分支顺序回溯，
+# 因此第一个能在文件名任意位置匹配的模式胜出，与逐个 re.search 的结果相同
+GENOTYPE_REGEX = re.compile('^(?:' + '|'.join(f'.*?({pattern})' for pattern in GENOTYPE_PATTERNS) + ')')
+NO_PDB = "未找到关联PDB"
+THREADS = 8  # 读取JSON文件的线程数
 
-print(f"找到 {len(ptm_files)} 个可能的pTM文件")
+def extract_genotypes(filenames):
+    """从文件名中提取基因型信息（对整列做一次 str.extract）"""
+    import pandas as pd
+    filenames = pd.Series(filenames, dtype=object).astype(str)
+    groups = filenames.str.extract(GENOTYPE_REGEX)
+    # 每行只有匹配上的那个分支不为空
+    genotype = groups.bfill(axis=1).iloc[:, 0]
+    # 如果都匹配不到，返回文件名的前10个字符作为标识
+    return genotype.fillna(filenames.str[:10])
 
-# 处理每个pTM文件
-for ptm_file in ptm_files:
+def scan_prediction_tree(input_dir):
+    """用 os.scandir 遍历目录树（顺序同 os.walk），每个目录只列出一次
+
+    返回 ({json路径: (大小, 修改时间ns)}, {目录: 该目录中第一个 .pdb 文件名})
+    """
+    ptm_files = {}
+    pdb_for_dir = {}
+    pending = [input_dir]
+    while pending:
+        root = pending.pop()
+        subdirs = []
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+                continue
+            if entry.name.endswith('.json'):
+                ptm_files[entry.path] = file_signature(entry)
+            elif entry.name.endswith('.pdb') and not entry.name.startswith('.') and root not in pdb_for_dir:
+                pdb_for_dir[root] = entry.name
+        # 倒序压栈，按目录顺序深度优先遍历
+        pending.extend(reversed(subdirs))
+    return ptm_files, pdb_for_dir
+
+def process_ptm_file(ptm_file, pdb_file):
+    """读取一个JSON文件，返回 (路径, pTM记录或 None, 错误信息或 None)"""
     try:
+        # 读取JSON文件：流式扫描，跳过PAE矩阵等大数组，只解析选中的值
+        found, ptm_value = find_first_value(ptm_file, PTM_KEYS, MODEL_KEYS, MODEL_PTM_KEYS)
+    except Exception as e:
+        return ptm_file, None, str(e)
+    if not found:
+        return ptm_file, None, None
+    return ptm_file, {
+        "source_dir": os.path.basename(os.path.dirname(ptm_file)),
+        "pdb_file": pdb_file,
+        "ptm": ptm_value,
+        "source_file": os.path.basename(ptm_file),
+        "file_path": ptm_file
+    }, None
+
+def iter_ptm_results(ptm_files, pdb_for_dir, threads=THREADS):
+    """用线程池并发读取JSON文件（隐藏文件系统延迟），按输入顺序产出 process_ptm_file 的结果"""
+    batch_size = max(1, threads) * 64
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        for start in range(0, len(ptm_files), batch_size):
+            batch = ptm_files[start:start + batch_size]
+            # 关联的PDB文件：同一目录中的第一个 .pdb 文件（目录列表已缓存）
+            pdb_files = [pdb_for_dir.get(os.path.dirname(path), NO_PDB) for path in batch]
+            yield from pool.map(process_ptm_file, batch, pdb_files)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="从AlphaFold预测结果的JSON文件中提取pTM值")
+    parser.add_argument('--input-dir', default=INPUT_DIR, help="预测结果目录（递归搜索 .json）")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="输出目录")
+    parser.add_argument('--threads', type=int, default=THREADS, help="读取JSON文件的线程数")
+    parser.add_argument('--full', action='store_true',
+                        help="忽略文件清单，重新处理所有JSON文件（默认只处理新增或改动过的文件）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    import pandas as pd
+
+    args = parse_args(argv)
+    input_dir, output_dir = args.input_dir, args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    output_csv = os.path.join(output_dir, SUMMARY_NAME)
+
+    # 调试信息
+    print(f"开始处理目录: {input_dir} 中的预测结果...")
+
+    ptm_data = []  # 存储本次新提取的pTM数据
+    error_log = []  # 错误日志
+    processed_count = 0
+    found_count = 0
+
+    # 搜索所有可能的pTM文件
+    print("搜索所有可能的pTM文件...")
+    current, pdb_for_dir = scan_prediction_tree(input_dir)
+    print(f"找到 {len(current)} 个可能的pTM文件")
+
+    # 文件清单记录上次处理过的文件；重跑时只处理新增或改动过的文件，已删除文件的记录从汇总表中去掉
+    manifest = FileManifest(os.path.join(output_dir, MANIFEST_NAME), input_dir)
+    if not args.full and manifest.load() and os.path.exists(output_csv):
+        ptm_files, removed = manifest.diff(current)
+        previous_df = pd.read_csv(output_csv, dtype=str, keep_default_na=False)
+        # 新增的文件也从旧表中去掉，避免上次写出汇总表后、保存清单前中断造成重复
+        previous_df = previous_df[~previous_df['file_path'].isin(set(ptm_files) | set(removed))]
+        manifest.remove(removed)
+        print(f"增量运行: {len(ptm_files)} 个新增或改动的文件，{len(removed)} 个已删除的文件")
+    else:
+        ptm_files = list(current)
+        previous_df = None
+        manifest.files = {}
+
+    # 处理每个pTM文件（线程池并发读取，按文件顺序汇总）
+    for ptm_file, record, error in iter_ptm_results(ptm_files, pdb_for_dir, threads=args.threads):
         processed_count += 1
-        
-        # 获取基础信息
-        dir_name = os.path.basename(os.path.dirname(ptm_file))
-        file_name = os.path.basename(ptm_file)
-        
-        # 查找关联的PDB文件
-        pdb_files = glob.glob(os.path.join(os.path.dirname(ptm_file), "*.pdb"))
-        pdb_file = pdb_files[0] if pdb_files else "未找到关联PDB"
-        
-        # 读取JSON文件
-        with open(ptm_file, 'r') as f:
-            data = json.load(f)
-        
-        # 提取pTM值 - 适应不同版本的AlphaFold输出
-        ptm_value = None
-        
-        # 尝试在顶层键中查找
-        for key in ['ptm', 'pTM', 'predicted_tm_score', 'iptm', 'plddt']:
-            if key in data:
-                ptm_value = data[key]
-                break
-        
-        # 如果没找到，尝试在模型数据中查找
-        if ptm_value is None:
-            for model_key in ['model_1', 'model_2', 'model_3', 'model_4', 'model_5']:
-                if model_key in data:
-                    model_data = data[model_key]
-                    for key in ['ptm', 'pTM', 'predicted_tm_score']:
-                        if key in model_data:
-                            ptm_value = model_data[key]
-                            break
-                    if ptm_value is not None:
-                        break
-        
-        if ptm_value is not None:
-            # 添加到数据列表
-            ptm_data.append({
-                "source_dir": dir_name,
-                "pdb_file": os.path.basename(pdb_file),
-                "ptm": ptm_value,
-                "source_file": file_name,
-                "file_path": ptm_file
-            })
-            found_count += 1
-            print(f"找到 pTM 值: {ptm_value} ({file_name})")
-        else:
-            error_msg = f"{ptm_file}: pTM值未找到"
+        if error is not None:
+            # 解析出错的文件不记入清单，下次运行时重试
+            error_msg = f"{ptm_file}: 解析错误 - {error}"
             error_log.append(error_msg)
             print(error_msg)
-    
-    except Exception as e:
-        error_msg = f"{ptm_file}: 解析错误 - {str(e)}"
-        error_log.append(error_msg)
-        print(error_msg)
-    
-    if processed_count % 10 == 0:
-        print(f"已处理 {processed_count} 个文件，找到 {found_count} 个pTM值")
-
-# 创建DataFrame
-if ptm_data:
+        else:
+            manifest.update({ptm_file: current[ptm_file]})
+            if record is not None:
+                # 添加到数据列表
+                ptm_data.append(record)
+                found_count += 1
+                print(f"找到 pTM 值: {record['ptm']} ({record['source_file']})")
+            else:
+                error_msg = f"{ptm_file}: pTM值未找到"
+                error_log.append(error_msg)
+                print(error_msg)
+
+        if processed_count % 10 == 0:
+            print(f"已处理 {processed_count} 个文件，找到 {found_count} 个pTM值")
+
+    # 创建DataFrame，与上次的汇总表合并（只替换改动过的记录）
     ptm_df = pd.DataFrame(ptm_data)
-    
-    # 添加基因型信息
-    if 'pdb_file' in ptm_df.columns:
-        ptm_df["genotype"] = ptm_df["pdb_file"].apply(extract_genotype)
+    if previous_df is not None and len(previous_df):
+        ptm_df = pd.concat([previous_df, ptm_df], ignore_index=True)
+
+    if len(ptm_df):
+        # 关联的PDB文件和基因型按本次的目录列表重新确定：未改动的JSON所在目录中PDB文件可能已增删或改名
+        ptm_df["pdb_file"] = [pdb_for_dir.get(os.path.dirname(path), NO_PDB) for path in ptm_df["file_path"]]
+        ptm_df["genotype"] = extract_genotypes(ptm_df["pdb_file"]).values
         print("成功添加基因型信息")
+
+        # 保存结果（先写临时文件再替换）
+        tmp_csv = output_csv + ".tmp"
+        ptm_df.to_csv(tmp_csv, index=False)
+        os.replace(tmp_csv, output_csv)
+        print(f"已保存 {len(ptm_df)} 条pTM记录到: {output_csv}（本次新增 {found_count} 条）")
+
+        # 打印DataFrame信息用于调试
+        print("\nDataFrame信息:")
+        print(f"列名: {ptm_df.columns.tolist()}")
+        print(f"前几行数据:\n{ptm_df.head()}")
     else:
-        print("警告: DataFrame中没有'pdb_file'列")
-    
-    # 保存结果
-    output_csv = os.path.join(output_dir, "ptm_summary.csv")
-    ptm_df.to_csv(output_csv, index=False)
-    print(f"已保存 {len(ptm_df)} 条pTM记录到: {output_csv}")
-    
-    # 打印DataFrame信息用于调试
-    print("\nDataFrame信息:")
-    print(f"列名: {ptm_df.columns.tolist()}")
-    print(f"前几行数据:\n{ptm_df.head()}")
-else:
-    print("警告: 未提取到任何pTM数据")
+        if os.path.exists(output_csv):
+            os.remove(output_csv)
+        print("警告: 未提取到任何pTM数据")
+    manifest.save()
+
+    # 保存错误日志
+    if error_log:
+        error_log_path = os.path.join(output_dir, "ptm_errors.log")
+        with open(error_log_path, "w") as f:
+            f.write("\n".join(error_log))
+        print(f"发现 {len(error_log)} 个错误，已保存到: {error_log_path}")
 
-# 保存错误日志
-if error_log:
-    error_log_path = os.path.join(output_dir, "ptm_errors.log")
-    with open(error_log_path, "w") as f:
-        f.write("\n".join(error_log))
-    print(f"发现 {len(error_log)} 个错误，已保存到: {error_log_path}")
+    print("处理完成!")
 
-print("处理完成!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
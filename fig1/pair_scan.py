@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""流式扫描Foldseek比对结果中的结构对：只读 query/target/rmsd 列，ID整数化，结构对去重"""
+import numpy as np
+import pandas as pd
+
+# Foldseek输出中 query、target、rmsd 所在的列号（qaln/taln等大字段不读取）
+PAIR_USECOLS = [0, 1, 5]
+PAIR_COLUMNS = ['query', 'target', 'rmsd']
+
+
+def read_pair_chunks(path, chunksize=1000000):
+    """分块读取比对结果，只保留 query、target、rmsd 三列"""
+    return pd.read_csv(path, sep='\t', header=None, usecols=PAIR_USECOLS, names=PAIR_COLUMNS,
+                       dtype={'query': str, 'target': str, 'rmsd': np.float64}, chunksize=chunksize)
+
+
+class IdInterner:
+    """把结构ID映射为连续的整数编号（首次出现的顺序）"""
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, values):
+        """返回与 values 等长的 int64 编号数组，新ID追加到末尾"""
+        inverse, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+        lookup = np.empty(len(uniques), dtype=np.int64)
+        for k, name in enumerate(uniques):
+            code = self.codes.get(name)
+            if code is None:
+                code = len(self.names)
+                self.codes[name] = code
+                self.names.append(name)
+            lookup[k] = code
+        return lookup[inverse]
+
+
+def canonical_pair_keys(codes_a, codes_b):
+    """无序结构对的规范整数键：(较小编号 << 32) | 较大编号"""
+    codes_a = np.asarray(codes_a, dtype=np.int64)
+    codes_b = np.asarray(codes_b, dtype=np.int64)
+    return (np.minimum(codes_a, codes_b) << 32) | np.maximum(codes_a, codes_b)
+
+
+class PairDeduplicator:
+    """记录已出现过的结构对键，判断新数据块中哪些行是首次出现
+
+    已见键保存为若干个有序的 int64 数组（按大小逐级合并），比Python集合省内存。
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    def _seen(self, keys):
+        seen = np.zeros(len(keys), dtype=bool)
+        for run in self._runs:
+            pos = np.searchsorted(run, keys)
+            pos[pos == len(run)] = 0
+            seen |= run[pos] == keys
+        return seen
+
+    def first_occurrences(self, keys):
+        """返回布尔掩码：该行的键在块内首次出现且之前的块中未出现过；同时记录这些键"""
+        keys = np.asarray(keys, dtype=np.int64)
+        mask = np.zeros(len(keys), dtype=bool)
+        if not len(keys):
+            return mask
+        unique_keys, first_index = np.unique(keys, return_index=True)
+        new = ~self._seen(unique_keys)
+        mask[first_index[new]] = True
+        if new.any():
+            self._runs.append(unique_keys[new])
+            # 末尾的有序数组不小于前一个的一半时合并，数组个数保持在对数级
+            while len(self._runs) > 1 and 2 * len(self._runs[-1]) >= len(self._runs[-2]):
+                last = self._runs.pop()
+                self._runs[-1] = np.union1d(self._runs[-1], last)
+        return mask
+
+
+class RunningStats:
+    """可合并的流式计数、均值、方差、最小值、最大值"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        n_b = len(values)
+        mean_b = values.mean()
+        m2_b = np.sum((values - mean_b) ** 2)
+        self._merge(n_b, mean_b, m2_b, values.min(), values.max())
+
+    def _merge(self, n_b, mean_b, m2_b, min_b, max_b):
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.count * n_b / n
+        self.count = n
+        self.min = min(self.min, min_b)
+        self.max = max(self.max, max_b)
+
+    def merge(self, other):
+        if other.count:
+            self._merge(other.count, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def std(self, ddof=0):
+        return float(np.sqrt(self.m2 / (self.count - ddof))) if self.count > ddof else np.nan
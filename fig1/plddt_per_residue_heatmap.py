@@ -1,65 +1,64 @@
 import os
-import glob
-import numpy as np
-import pandas as pd
-from Bio.PDB import PDBParser
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
+
+if __package__:
+    from .plddt_matrix import build_plddt_matrix, column_frame
+else:
+    from plddt_matrix import build_plddt_matrix, column_frame
 
 # 设置路径
 data_dir = "path.."
 aa_fasta_path = "path.."
-pdb_files = glob.glob(os.path.join(data_dir, "*.pdb"))
+output_dir = "path.."
+HEATMAP_NAME = "plddt_heatmap.png"
 
-# 读取对齐的氨基酸序列（用来确定序列长度和位置）
-from Bio import SeqIO
 
-# 读取所有记录
-records = list(SeqIO.parse(aa_fasta_path, "fasta"))
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="按多序列比对的位置统计所有结构的平均pLDDT并绘制热图")
+    parser.add_argument('--pdb-dir', default=data_dir, help="PDB结构目录（文件名去掉扩展名即比对中的记录ID）")
+    parser.add_argument('--alignment', default=aa_fasta_path, help="比对后的氨基酸序列（FASTA）")
+    parser.add_argument('--output-dir', default=output_dir,
+                        help="输出目录（pLDDT矩阵、每列统计等，见 plddt_matrix.py）")
+    parser.add_argument('--workers', type=int, default=1, help="读取结构文件的进程数")
+    parser.add_argument('--chunk-rows', type=int, default=1024, help="每次写入矩阵并累积统计量的结构数")
+    parser.add_argument('--no-plot', action='store_true', help="只构建矩阵和统计表，不绘图")
+    parser.add_argument('--show', action='store_true', help="保存热图后再在窗口中显示（需要图形界面）")
+    return parser.parse_args(argv)
 
-# 如果你只关心第一条
-aa_record = records[0]
-aa_sequence = str(aa_record.seq)
-seq_length = len(aa_sequence)
 
-# 初始化存储pLDDT值的矩阵（结构数×序列长度）
-plddt_values = []
+def plot_heatmap(mean_plddt, output_path, show=False):
+    """绘制每个比对位置平均pLDDT的热图并保存；show 为True时再打开窗口显示（阻塞到窗口关闭）"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-# 初始化PDB解析器
-parser = PDBParser(QUIET=True)
+    plt.figure(figsize=(20, 4))
+    sns.heatmap([mean_plddt], cmap='rainbow', cbar=True, vmin=0, vmax=100, xticklabels=100)
+    plt.xlabel("Alignment Position")
+    plt.title("Average pLDDT per Position")
+    plt.savefig(output_path, bbox_inches='tight')
+    if show:
+        plt.show()
+    plt.close()
 
-for pdb_file in pdb_files:
-    structure_id = os.path.basename(pdb_file).split('.')[0]
-    structure = parser.get_structure(structure_id, pdb_file)
-    # 假设结构中只有一条链，或者目标链为链A
-    model = structure[0]
-    chain = next(model.get_chains())
 
-    # 提取每个残基的pLDDT (B因子)
-    # 按照对齐位置提取
-    residues = list(chain.get_residues())
-    res_bfactors = []
-    for res in residues:
-        # 只考虑标准残基
-        if res.id[0] == ' ':
-            res_bfactors.append(res['CA'].bfactor)
-    # 填补到对齐长度，缺失位置用np.nan
-    res_bfactors_full = np.full(seq_length, np.nan)
-    for i, res in enumerate(residues):
-        if i >= seq_length:
-            break
-        res_bfactors_full[i] = res['CA'].bfactor
-    plddt_values.append(res_bfactors_full)
+def main(argv=None):
+    args = parse_args(argv)
+    # 每个结构按自己的比对记录放入对应的比对列，矩阵写入内存映射文件，每列统计量流式累积
+    stats, rows = build_plddt_matrix(args.pdb_dir, args.alignment, args.output_dir,
+                                     workers=args.workers, chunk_rows=args.chunk_rows)
+    columns = column_frame(stats, len(stats.count), len(rows))
+    print(f"共 {len(rows)} 个结构，{len(columns)} 个比对位置；"
+          f"平均覆盖率 {columns['coverage'].mean():.3f}，结果已保存到: {os.path.abspath(args.output_dir)}")
+    low_identity = rows[rows['identity'] < 0.9]
+    if len(low_identity):
+        print(f"警告: {len(low_identity)} 个结构的序列与比对记录一致度低于 0.9，请检查ID是否对应")
 
-# 将数据转换为DataFrame，行是结构，列是位置
-df_plddt = pd.DataFrame(plddt_values)
+    if not args.no_plot and len(columns):
+        # 每个位置的平均值（跳过NaN）
+        heatmap_path = os.path.join(args.output_dir, HEATMAP_NAME)
+        plot_heatmap(columns['mean'].to_numpy(), heatmap_path, show=args.show)
+        print(f"热图已保存到: {heatmap_path}")
 
-# 计算每个位置的平均值（跳过NaN）
-mean_plddt = df_plddt.mean(axis=0)
 
-# 绘制热图
-plt.figure(figsize=(20, 4))
-sns.heatmap([mean_plddt], cmap='rainbow', cbar=True, vmin=0, vmax=100, xticklabels=100)
-plt.xlabel("Alignment Position")
-plt.title("Average pLDDT per Position")
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
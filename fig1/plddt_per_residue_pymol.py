@@ -1,45 +1,178 @@
 import os
-import numpy as np
+import argparse
 import subprocess
 
+import numpy as np
+
+if __package__:
+    from .bfactor_reader import read_atoms, residue_bfactors, write_residue_bfactors
+    from .plddt_matrix import alignment_columns, load_column_stats, match_structures, read_fasta
+else:
+    from bfactor_reader import read_atoms, residue_bfactors, write_residue_bfactors
+    from plddt_matrix import alignment_columns, load_column_stats, match_structures, read_fasta
+
 # 配置路径
 pdb_filename = "AB039776.pdb"  # 你的参考PDB文件名
 pdb_dir = "D:/tools/data/GII_pdbs"
-pdb_path = os.path.join(pdb_dir, pdb_filename)
-
-# 你的对齐序列长度（请确认）
-# 假设seq_length就是你之前定义的
-seq_length = len([323])  # 替换为你的序列长度
-
-# 你的平均pLDDT值（请确保在之前的代码中已计算）
-# 示例：只演示用随机数作为占位
-# 在实际应用中，请用你之前计算的mean_plddt值
-mean_plddt = np.random.uniform(0, 100, size=seq_length)  # 替换为你的真实数据
-
-# 生成PyMOL脚本路径
-pymol_path = r"C:\Program Files\Pymol\PyMOLWin.exe"
-pml_path = "D:/tools/data/GII_pdbs/mapping_plddt.pml"
-
-# 生成PyMOL脚本内容
-with open(pml_path, "w") as f:
-    f.write(f'load {pdb_path}, protein\n')
-    # 设置每个残基的b因子为对应的pLDDT
-    for resi in range(1, seq_length + 1):
-        plddt_value = mean_plddt[resi - 1]
-        # 忽略NaN或无效值
-        if not np.isnan(plddt_value):
-            f.write(f'alter (resi {resi}), b={plddt_value}\n')
-    f.write('sort\n')
-    f.write('spectrum b, rainbow, all, minimum=0, maximum=100\n')
-    f.write('set ray_shadows, 0\n')
-    f.write('set ray_opaque_background, 0\n')
-    f.write('bg_color white\n')
-    # 保存图片路径
-    output_image = os.path.join(pdb_dir, "structure_plddt_mapped.png")
-    f.write(f'png {output_image}, width=800, height=600, dpi=300\n')
-    f.write('quit\n')
-
-# 调用PyMOL执行脚本
-subprocess.run([pymol_path, "-c", pml_path])
-
-print(f"映射完成，图片已保存到：{output_image}")
\ No newline at end of file
+matrix_dir = "D:/tools/data/plddt_matrix"  # plddt_per_residue_heatmap.py 的输出目录（每个比对位置的平均pLDDT）
+output_dir = "D:/tools/data/GII_pdbs/plddt_mapped"
+
+IMAGE_WIDTH = 800
+IMAGE_HEIGHT = 600
+IMAGE_DPI = 300
+# 每张图共用的显示设置
+PYMOL_SETTINGS = [
+    'set ray_shadows, 0',
+    'set ray_opaque_background, 0',
+    'bg_color white',
+]
+
+
+def position_values(structure_id, records, column_values):
+    """按结构自己的比对记录，把每个比对位置的数值转换为该结构逐残基的数值（顺序同其CA原子）"""
+    if structure_id not in records:
+        raise KeyError(f"{structure_id} 不在比对文件中")
+    columns = alignment_columns(records[structure_id])
+    return column_values[columns[columns < len(column_values)]]
+
+
+def map_structures(structures, records, column_values, output_dir):
+    """把每个位置的数值写入结构副本的B因子列，返回 [(结构ID, 写出的PDB路径)]
+
+    无法写入的结构（没有CA原子、不是PDB格式等）打印警告后跳过，不影响其余结构。
+    """
+    mapped = []
+    for name, path in structures:
+        values = position_values(name, records, column_values)
+        mapped_path = os.path.join(output_dir, f"{name}_plddt_mapped.pdb")
+        try:
+            n_atoms = write_residue_bfactors(path, mapped_path, values)
+        except ValueError as e:
+            print(f"警告: {name} 无法写入B因子，已跳过: {e}")
+            continue
+        print(f"{name}: 已写入 {n_atoms} 个原子的B因子")
+        mapped.append((name, mapped_path))
+    return mapped
+
+
+def image_path(output_dir, name):
+    return os.path.join(output_dir, f"{name}_plddt_mapped.png")
+
+
+def render_pymol_session(mapped, output_dir):
+    """在同一个无界面的PyMOL会话中依次渲染所有结构"""
+    import pymol
+    pymol.finish_launching(['pymol', '-qc'])
+    from pymol import cmd
+
+    for line in PYMOL_SETTINGS:
+        cmd.do(line)
+    for name, path in mapped:
+        cmd.load(path, 'protein')
+        cmd.spectrum('b', 'rainbow', 'protein', minimum=0, maximum=100)
+        cmd.png(image_path(output_dir, name), width=IMAGE_WIDTH, height=IMAGE_HEIGHT, dpi=IMAGE_DPI, ray=1)
+        cmd.delete('all')
+
+
+def render_pymol_script(mapped, output_dir, pymol_path):
+    """写出一个包含所有结构的 .pml 脚本，只启动一次PyMOL可执行文件"""
+    pml_path = os.path.join(output_dir, "mapping_plddt.pml")
+    with open(pml_path, "w") as f:
+        f.write("\n".join(PYMOL_SETTINGS) + "\n")
+        for name, path in mapped:
+            f.write(f'load {path}, protein\n')
+            f.write('spectrum b, rainbow, protein, minimum=0, maximum=100\n')
+            f.write(f'png {image_path(output_dir, name)}, width={IMAGE_WIDTH}, height={IMAGE_HEIGHT}, '
+                    f'dpi={IMAGE_DPI}, ray=1\n')
+            f.write('delete all\n')
+        f.write('quit\n')
+    subprocess.run([pymol_path, "-c", pml_path], check=True)
+
+
+def render_standin(mapped, output_dir):
+    """没有PyMOL时的替代渲染：CA主链投影到前两个主轴上，按B因子用同样的色带着色"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    for name, path in mapped:
+        ca = residue_bfactors(read_atoms(path, coordinates=True), atom_name='CA', include_hetero='polymer')
+        in_chain = ca['chain'] == ca['chain'][0] if len(ca['chain']) else np.zeros(0, dtype=bool)
+        if np.count_nonzero(in_chain) < 2:
+            print(f"警告: {name} 的第一条链CA原子少于两个，无法绘制主链，已跳过")
+            continue
+        coords, bfactor = ca['coord'][in_chain], ca['bfactor'][in_chain]
+        centered = coords - coords.mean(axis=0)
+        _, _, axes = np.linalg.svd(centered, full_matrices=False)
+        xy = centered @ axes[:2].T
+        segments = np.stack([xy[:-1], xy[1:]], axis=1)
+        fig, ax = plt.subplots(figsize=(IMAGE_WIDTH / 100, IMAGE_HEIGHT / 100))
+        lines = LineCollection(segments, cmap='rainbow', norm=plt.Normalize(0, 100), linewidths=3)
+        lines.set_array((bfactor[:-1] + bfactor[1:]) / 2)
+        ax.add_collection(lines)
+        ax.autoscale()
+        ax.set_aspect('equal')
+        ax.axis('off')
+        fig.colorbar(lines, ax=ax, label='pLDDT')
+        ax.set_title(name)
+        fig.savefig(image_path(output_dir, name), dpi=100)
+        plt.close(fig)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="把每个比对位置的平均pLDDT映射到结构的B因子上并批量渲染")
+    parser.add_argument('--matrix-dir', default=matrix_dir,
+                        help="plddt_per_residue_heatmap.py 的输出目录（读取 plddt_column_stats.csv）")
+    parser.add_argument('--pdb-dir', default=pdb_dir, help="PDB结构目录")
+    parser.add_argument('--output-dir', default=output_dir, help="写出映射后的PDB和图片的目录")
+    parser.add_argument('--structures', nargs='+', default=[os.path.splitext(pdb_filename)[0]],
+                        help="要映射的结构ID（比对中的记录ID，即文件名去掉扩展名）")
+    parser.add_argument('--all', action='store_true', help="映射目录中所有在比对里有记录的结构")
+    parser.add_argument('--value', default='mean', help="使用每列统计表中的哪一列（mean、median 等）")
+    parser.add_argument('--renderer', choices=['auto', 'pymol', 'standin', 'none'], default='auto',
+                        help="auto：能导入 pymol 时用PyMOL会话，否则用 matplotlib 替代渲染")
+    parser.add_argument('--pymol', default=None,
+                        help="PyMOL可执行文件路径；给出时用一个 .pml 脚本在单个进程中渲染所有结构")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # 每个比对位置的统计值（由 plddt_per_residue_heatmap.py 计算），以及计算时使用的比对文件
+    columns, meta = load_column_stats(args.matrix_dir)
+    column_values = columns[args.value].to_numpy(dtype=np.float64)
+    records = read_fasta(meta['alignment'])
+    structures, _ = match_structures(args.pdb_dir, records)
+    if not args.all:
+        wanted = set(args.structures)
+        structures = [(name, path) for name, path in structures if name in wanted]
+        missing = wanted - {name for name, _ in structures}
+        if missing:
+            print(f"警告: 未找到结构文件或比对记录: {', '.join(sorted(missing))}")
+
+    mapped = map_structures(structures, records, column_values, args.output_dir)
+
+    renderer = args.renderer
+    if args.pymol:
+        render_pymol_script(mapped, args.output_dir, args.pymol)
+        renderer = 'none'
+    elif renderer == 'auto':
+        try:
+            import pymol  # noqa: F401
+            renderer = 'pymol'
+        except ImportError:
+            print("未安装PyMOL，使用 matplotlib 替代渲染")
+            renderer = 'standin'
+    if renderer == 'pymol':
+        render_pymol_session(mapped, args.output_dir)
+    elif renderer == 'standin':
+        render_standin(mapped, args.output_dir)
+
+    print(f"映射完成，{len(mapped)} 个结构已保存到：{args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
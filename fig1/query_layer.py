@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""把比对结果和逐残基RMSD贡献导入一个本地SQLite查询库，之后的统计都是带索引的查询
+
+库中的表：
+    structures     code, structure_id, grp        结构ID表及其所属组（建库时按前缀或正则分组）
+    alignments     row, query, target, evalue, rmsd          每条Foldseek比对（row为输入中的行号）
+    contributions  query, target, residue_number, rmsd_contribution, total_rmsd, aligned_length
+    meta           key, value                     数据来源和分组方式
+索引：structures(grp)、alignments(query, target)、alignments(target)、
+contributions(query, residue_number)、contributions(residue_number)。
+结构ID在表中存为整数编号；按组、query、e-value或残基范围的筛选只读取相关的行，
+不再需要为每个新问题写一个全文件扫描的脚本。
+"""
+import os
+import json
+import sqlite3
+import argparse
+
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .aln_store import AlignmentStore, is_alignment_store
+    from .contrib_io import iter_contribution_batches
+    from .group_matrix import GROUP_PREFIXES, GroupMatcher
+    from .pair_scan import IdInterner
+    from .residue_stats import ResidueStats
+else:
+    from aln_store import AlignmentStore, is_alignment_store
+    from contrib_io import iter_contribution_batches
+    from group_matrix import GROUP_PREFIXES, GroupMatcher
+    from pair_scan import IdInterner
+    from residue_stats import ResidueStats
+
+DB_PATH = "path.."
+CHUNKSIZE = 1000000  # 导入时每块的行数
+SHIFT_SAMPLE = 10000  # 残基统计的平移量取筛选后前多少行的均值
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE structures (code INTEGER PRIMARY KEY, structure_id TEXT NOT NULL UNIQUE, grp TEXT);
+CREATE TABLE alignments (row INTEGER PRIMARY KEY, query INTEGER NOT NULL, target INTEGER NOT NULL,
+                         evalue REAL, rmsd REAL);
+CREATE TABLE contributions (query INTEGER NOT NULL, target INTEGER NOT NULL, residue_number INTEGER NOT NULL,
+                            rmsd_contribution REAL, total_rmsd REAL, aligned_length INTEGER);
+"""
+# 导入完成后再建索引，比逐行维护索引快得多
+INDEXES = """
+CREATE INDEX structures_grp ON structures(grp);
+CREATE INDEX alignments_pair ON alignments(query, target);
+CREATE INDEX alignments_target ON alignments(target);
+CREATE INDEX contributions_query_residue ON contributions(query, residue_number);
+CREATE INDEX contributions_residue ON contributions(residue_number);
+"""
+
+
+def is_query_store(path):
+    """判断路径是否为SQLite查询库"""
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+def iter_alignment_rows(path, chunksize=CHUNKSIZE):
+    """分块读取比对结果的 query / target / evalue / rmsd 四列（Foldseek TSV或aln_store比对库）"""
+    columns = ['query', 'target', 'evalue', 'rmsd']
+    if is_alignment_store(path):
+        store = AlignmentStore(path)
+        for start in range(0, len(store), chunksize):
+            yield store.rows(start, start + chunksize, columns)
+        return
+    start = 0
+    for chunk in pd.read_csv(path, sep='\t', header=None, usecols=[0, 1, 4, 5], names=columns,
+                             dtype={'query': str, 'target': str}, chunksize=chunksize):
+        # 行号与输入文件中的行号一致
+        yield chunk.set_axis(np.arange(start, start + len(chunk)))
+        start += len(chunk)
+
+
+def build_query_store(db_path, alignments=None, contributions=None, group_prefixes=None, group_pattern=None,
+                      chunksize=CHUNKSIZE):
+    """建立查询库：导入比对结果和/或残基贡献结果（CSV或Parquet），按前缀或正则给结构分组
+
+    先写入临时文件，建好索引后再替换 db_path，中途失败不会留下半个库。
+    返回 {表名: 行数}。
+    """
+    if alignments is None and contributions is None:
+        raise ValueError("Nothing to import: give alignments and/or contributions")
+    if group_pattern is None and group_prefixes is None:
+        group_prefixes = GROUP_PREFIXES
+    matcher = GroupMatcher(prefixes=group_prefixes) if group_pattern is None else GroupMatcher(pattern=group_pattern)
+    interner = IdInterner()
+
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # 临时文件失败即丢弃，不需要日志和同步
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        counts = {'alignments': 0, 'contributions': 0}
+        if alignments is not None:
+            for chunk in iter_alignment_rows(alignments, chunksize=chunksize):
+                q_codes = interner.encode(chunk['query'].to_numpy())
+                t_codes = interner.encode(chunk['target'].to_numpy())
+                conn.executemany("INSERT INTO alignments VALUES (?, ?, ?, ?, ?)", zip(
+                    chunk.index.tolist(), q_codes.tolist(), t_codes.tolist(),
+                    chunk['evalue'].astype(float).tolist(), chunk['rmsd'].astype(float).tolist()))
+                counts['alignments'] += len(chunk)
+        if contributions is not None:
+            for chunk in iter_contribution_batches(contributions, chunksize=chunksize):
+                q_codes = interner.encode(chunk['query'].to_numpy())
+                t_codes = interner.encode(chunk['target'].to_numpy())
+                conn.executemany("INSERT INTO contributions VALUES (?, ?, ?, ?, ?, ?)", zip(
+                    q_codes.tolist(), t_codes.tolist(), chunk['residue_number'].astype(int).tolist(),
+                    chunk['rmsd_contribution'].astype(float).tolist(), chunk['total_rmsd'].astype(float).tolist(),
+                    chunk['aligned_length'].astype(int).tolist()))
+                counts['contributions'] += len(chunk)
+
+        membership = matcher.update(interner.names)
+        labels = np.array(matcher.labels + [None], dtype=object)
+        conn.executemany("INSERT INTO structures VALUES (?, ?, ?)",
+                         zip(range(len(interner.names)), interner.names, labels[membership].tolist()))
+        counts['structures'] = len(interner.names)
+        meta = {
+            'alignments': os.path.abspath(alignments) if alignments is not None else None,
+            'contributions': os.path.abspath(contributions) if contributions is not None else None,
+            'group_prefixes': group_prefixes if group_pattern is None else None,
+            'group_pattern': group_pattern,
+            'groups': matcher.labels,
+        }
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in meta.items()])
+        conn.executescript(INDEXES)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return counts
+
+
+class QueryStore:
+    """只读打开的查询库
+
+    所有筛选参数都可以组合使用：
+        queries      只保留这些query结构ID
+        groups       只保留query属于这些组的行
+        max_evalue   只保留 e-value 不大于此值的比对（残基贡献通过 (query, target) 关联到比对）
+        residue_range  (起, 止) 残基编号闭区间
+    """
+
+    def __init__(self, path):
+        if not is_query_store(path):
+            raise ValueError(f"{path} is not a query store (build it with query_layer.py build)")
+        self.path = path
+        self.conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        self.conn.execute("PRAGMA mmap_size = 1073741824")
+        self.meta = {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM meta")}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def groups(self):
+        return list(self.meta['groups'])
+
+    def _where(self, table, queries=None, groups=None, max_evalue=None, residue_range=None):
+        """拼出筛选条件，返回 (WHERE子句, 参数)；query列表放入临时表，避免超出SQL参数个数上限"""
+        clauses, params = [], []
+        if queries is not None:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS selected_ids (structure_id TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM selected_ids")
+            self.conn.executemany("INSERT OR IGNORE INTO selected_ids VALUES (?)", [(q,) for q in queries])
+            clauses.append(f"{table}.query IN (SELECT code FROM structures "
+                           f"WHERE structure_id IN (SELECT structure_id FROM selected_ids))")
+        if groups is not None:
+            groups = list(groups)
+            clauses.append(f"{table}.query IN (SELECT code FROM structures WHERE grp IN "
+                           f"({', '.join('?' * len(groups))}))")
+            params.extend(groups)
+        if max_evalue is not None:
+            if table == 'alignments':
+                clauses.append("alignments.evalue <= ?")
+            else:
+                clauses.append(f"EXISTS (SELECT 1 FROM alignments AS a WHERE a.query = {table}.query "
+                               f"AND a.target = {table}.target AND a.evalue <= ?)")
+            params.append(float(max_evalue))
+        if residue_range is not None:
+            clauses.append(f"{table}.residue_number BETWEEN ? AND ?")
+            params.extend(int(v) for v in residue_range)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def sql(self, query, params=()):
+        """执行任意只读SQL，返回DataFrame"""
+        return pd.read_sql_query(query, self.conn, params=list(params))
+
+    def structures(self, groups=None):
+        """结构ID及其所属组"""
+        if groups is None:
+            return self.sql("SELECT structure_id, grp FROM structures ORDER BY code")
+        groups = list(groups)
+        return self.sql(f"SELECT structure_id, grp FROM structures WHERE grp IN ({', '.join('?' * len(groups))}) "
+                        f"ORDER BY code", groups)
+
+    def alignments(self, queries=None, groups=None, max_evalue=None):
+        """筛选后的比对（query, target, evalue, rmsd），按输入中的顺序"""
+        where, params = self._where('alignments', queries, groups, max_evalue)
+        return self.sql("SELECT q.structure_id AS query, t.structure_id AS target, evalue, rmsd "
+                        "FROM alignments JOIN structures AS q ON q.code = alignments.query "
+                        "JOIN structures AS t ON t.code = alignments.target"
+                        f"{where} ORDER BY alignments.row", params)
+
+    def group_pairs(self, group_a, group_b, max_evalue=None):
+        """两组结构之间的比对，无序结构对去重（保留首次出现的方向），自身比对除外"""
+        where, params = self._where('alignments', max_evalue=max_evalue)
+        where = (where + " AND" if where else " WHERE") + " alignments.query != alignments.target"
+        rows = self.sql(
+            "SELECT MIN(alignments.row) AS row FROM alignments "
+            "JOIN structures AS q ON q.code = alignments.query JOIN structures AS t ON t.code = alignments.target"
+            f"{where} AND ((q.grp = ? AND t.grp = ?) OR (q.grp = ? AND t.grp = ?)) "
+            "GROUP BY MIN(alignments.query, alignments.target), MAX(alignments.query, alignments.target)",
+            params + [group_a, group_b, group_b, group_a])['row']
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS selected_rows (row INTEGER PRIMARY KEY)")
+        self.conn.execute("DELETE FROM selected_rows")
+        self.conn.executemany("INSERT INTO selected_rows VALUES (?)", [(int(r),) for r in rows])
+        return self.sql("SELECT q.structure_id AS query, t.structure_id AS target, rmsd "
+                        "FROM selected_rows JOIN alignments USING (row) "
+                        "JOIN structures AS q ON q.code = alignments.query "
+                        "JOIN structures AS t ON t.code = alignments.target ORDER BY row")
+
+    def residue_stats(self, queries=None, groups=None, max_evalue=None, residue_range=None, quantiles=False):
+        """每个残基RMSD贡献的累积统计量（ResidueStats）
+
+        默认由SQL单遍分组聚合得到 count / mean / M2（平移数据法），不含分位数；
+        quantiles=True 时逐块取出筛选后的数值，同时累积分位数草图。
+        """
+        where, params = self._where('contributions', queries, groups, max_evalue, residue_range)
+        if quantiles:
+            stats = ResidueStats()
+            cursor = self.conn.execute(f"SELECT residue_number, rmsd_contribution FROM contributions{where}", params)
+            while True:
+                rows = cursor.fetchmany(CHUNKSIZE)
+                if not rows:
+                    break
+                data = np.array(rows, dtype=np.float64)
+                stats.update(data[:, 0].astype(np.int64), data[:, 1])
+            return stats
+
+        # 单遍分组聚合：数值先减去一个接近数据的平移量再求和与平方和（平移数据法），
+        # M2 = Σd² - (Σd)²/n 不会因两个大数相减而损失精度，也不必第二遍按残基均值逐行回表。
+        # 平移量取筛选后前 SHIFT_SAMPLE 行的均值，只需读很少的行
+        shift = self.conn.execute(f"SELECT AVG(rmsd_contribution) FROM (SELECT rmsd_contribution "
+                                  f"FROM contributions{where} LIMIT {SHIFT_SAMPLE})", params).fetchone()[0] or 0.0
+        # 按 +residue_number 分组：不让SQLite为了分组沿残基索引逐行回表（比顺序扫描加临时B树慢数倍），
+        # 有筛选条件时仍可使用query或残基范围的索引
+        frame = self.sql(
+            "SELECT residue_number, COUNT(rmsd_contribution) AS n, SUM(rmsd_contribution - ?) AS s1, "
+            "SUM((rmsd_contribution - ?) * (rmsd_contribution - ?)) AS s2 "
+            f"FROM contributions{where} GROUP BY +residue_number HAVING COUNT(rmsd_contribution) > 0 "
+            "ORDER BY residue_number", [shift] * 3 + params)
+        n = frame['n'].to_numpy(dtype=np.int64)
+        s1 = frame['s1'].to_numpy(dtype=np.float64)
+        s2 = frame['s2'].to_numpy(dtype=np.float64)
+        return ResidueStats.from_arrays(frame['residue_number'].to_numpy(dtype=np.int64), n,
+                                        shift + s1 / n, np.maximum(s2 - s1 * s1 / n, 0.0))
+
+    def iter_pair_codes(self, chunksize=CHUNKSIZE):
+        """按输入顺序分块产出 (query编号, target编号, rmsd, 结构ID表)，与 aln_store.iter_pair_codes 相同"""
+        names = np.array([row[0] for row in self.conn.execute("SELECT structure_id FROM structures ORDER BY code")],
+                         dtype=object)
+        cursor = self.conn.execute("SELECT query, target, rmsd FROM alignments ORDER BY row")
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            data = np.array(rows, dtype=np.float64)
+            yield data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2], names
+
+    def summary(self, **filters):
+        """每个残基的 count / mean / std / cv 表（同 ResidueStats.to_frame）"""
+        return self.residue_stats(**filters).to_frame(ddof=0)
+
+
+def _add_filters(parser):
+    parser.add_argument('--queries', nargs='+', default=None, help="只统计这些query结构")
+    parser.add_argument('--groups', nargs='+', default=None, help="只统计query属于这些组的行")
+    parser.add_argument('--max-evalue', type=float, default=None, help="只统计 e-value 不大于此值的比对")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="比对结果和残基RMSD贡献的SQLite查询库")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="导入比对结果和/或残基贡献结果，建立查询库")
+    build.add_argument('--db', default=DB_PATH, help="查询库文件")
+    build.add_argument('--alignments', default=None, help="Foldseek比对结果TSV或aln_store导入的比对库目录")
+    build.add_argument('--contributions', default=None, help="RMSD_1_batch 写出的残基贡献CSV或Parquet数据集")
+    build.add_argument('--group-prefixes', nargs='+', default=None,
+                       help=f"按ID前缀分组（默认 {' '.join(GROUP_PREFIXES)}）")
+    build.add_argument('--group-pattern', default=None, help="按正则表达式分组（第一个捕获组为组名）")
+    build.add_argument('--chunksize', type=int, default=CHUNKSIZE, help="每块导入的行数")
+
+    residues = sub.add_parser('residues', help="每个残基RMSD贡献的统计表")
+    residues.add_argument('--db', default=DB_PATH, help="查询库文件")
+    _add_filters(residues)
+    residues.add_argument('--residue-range', type=int, nargs=2, default=None, metavar=('START', 'END'),
+                          help="只统计这一残基编号区间（闭区间）")
+    residues.add_argument('--quantiles', action='store_true', help="同时估计分位数（需逐行取出数值，较慢）")
+    residues.add_argument('--output', default=None, help="写出汇总表（save_summary格式）；不指定时打印")
+
+    pairs = sub.add_parser('pairs', help="两组结构之间去重后的比对RMSD")
+    pairs.add_argument('--db', default=DB_PATH, help="查询库文件")
+    pairs.add_argument('--group-a', required=True, help="第一组")
+    pairs.add_argument('--group-b', required=True, help="第二组")
+    pairs.add_argument('--max-evalue', type=float, default=None, help="只统计 e-value 不大于此值的比对")
+    pairs.add_argument('--output', default=None, help="写出CSV；不指定时打印统计量")
+
+    sql = sub.add_parser('sql', help="执行任意只读SQL")
+    sql.add_argument('--db', default=DB_PATH, help="查询库文件")
+    sql.add_argument('query', help="SQL语句")
+    sql.add_argument('--output', default=None, help="写出CSV；不指定时打印")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'build':
+        counts = build_query_store(args.db, alignments=args.alignments, contributions=args.contributions,
+                                   group_prefixes=args.group_prefixes, group_pattern=args.group_pattern,
+                                   chunksize=args.chunksize)
+        print(f"Imported {counts['alignments']} alignments, {counts['contributions']} residue contributions "
+              f"and {counts['structures']} structures into {args.db}")
+        return
+
+    with QueryStore(args.db) as store:
+        if args.command == 'residues':
+            stats = store.residue_stats(queries=args.queries, groups=args.groups, max_evalue=args.max_evalue,
+                                        residue_range=args.residue_range, quantiles=args.quantiles)
+            print(f"Accumulated {stats.total_count} residue contributions")
+            if args.output:
+                stats.save_summary(args.output)
+                print(f"Residue summary saved to: {args.output}")
+            else:
+                print(stats.to_frame(ddof=0).to_string())
+        elif args.command == 'pairs':
+            pairs = store.group_pairs(args.group_a, args.group_b, max_evalue=args.max_evalue)
+            print(f"Found {len(pairs)} unique {args.group_a} vs {args.group_b} alignments")
+            if args.output:
+                pairs.to_csv(args.output, index=False)
+                print(f"Pairs saved to: {args.output}")
+            elif len(pairs):
+                print(pairs['rmsd'].describe().to_string())
+        else:
+            frame = store.sql(args.query)
+            if args.output:
+                frame.to_csv(args.output, index=False)
+            else:
+                print(frame.to_string())
+
+
+if __name__ == "__main__":
+    main()
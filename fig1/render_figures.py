@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""fig1 的绘图阶段：从预先算好的小汇总表并行渲染所有图，输入和绘图参数都没变的图直接跳过
+
+输入（只给出其中一部分时只渲染对应的图）：
+    --residue-summary   RMSD_1_batch --aggregate-only 的 residue_rmsd_summary.csv，
+                        或 RMSD_2_bubble_chunck.py 写出的保守性表（同为汇总表格式）
+    --ptm-summary       pTM_1.py 的 ptm_summary.csv
+    --plddt-summary     all_plddt_distribution.py 的 structure_summary.csv
+每张图的缓存键为 输入文件内容的SHA-256 + 绘图参数，记录在输出目录的 figure_cache.json 中。
+工作进程使用无界面的 Agg 后端。
+"""
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+CACHE_NAME = "figure_cache.json"
+CACHE_VERSION = 1  # 绘图函数改动时加一，使所有缓存失效
+
+# 图名 -> 输入种类、输出文件名、绘图函数（figures 模块中的函数名）和默认参数
+FIGURES = {
+    'conservation_bubble': {'input': 'residue_summary', 'output': 'conservation_analysis_final.png',
+                            'params': {'dpi': 300, 'ddof': 0}},
+    'rmsd_stability': {'input': 'residue_summary', 'output': 'residue_rmsd_stability.png',
+                       'params': {'dpi': 300, 'ddof': 1}},
+    'ptm_distribution': {'input': 'ptm_summary', 'output': 'ptm_basic_distribution.png',
+                         'params': {'dpi': 300}},
+    'plddt_mean_distribution': {'input': 'plddt_summary', 'output': 'mean_plddt_distribution.png',
+                                'params': {'dpi': 100}},
+    'plddt_summary_boxplot': {'input': 'plddt_summary', 'output': 'plddt_summary_boxplot.png',
+                              'params': {'dpi': 100}},
+}
+
+
+def input_files(kind, path):
+    """一张图实际读取的文件（残基汇总表另有分位数草图文件）"""
+    files = [path]
+    if kind == 'residue_summary':
+        if __package__:
+            from .residue_stats import ResidueStats
+        else:
+            from residue_stats import ResidueStats
+        files.append(ResidueStats.sketch_path(path))
+    return [f for f in files if os.path.exists(f)]
+
+
+def file_digest(path, block_size=1 << 20):
+    """文件内容的SHA-256；目录（如Parquet数据集）用其中各文件的相对路径、大小和修改时间"""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                st = os.stat(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(os.path.join(root, name), path)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(name, files, params):
+    payload = {'version': CACHE_VERSION, 'figure': name, 'params': params,
+               'inputs': [file_digest(path) for path in files]}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_cache(path, cache):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def render_figure(name, input_path, output_path, params):
+    """在工作进程中读取汇总表并绘制一张图"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import pandas as pd
+    if __package__:
+        from . import figures
+    else:
+        import figures
+
+    kind = FIGURES[name]['input']
+    draw = getattr(figures, name)
+    if kind == 'residue_summary':
+        if __package__:
+            from .contrib_io import read_residue_stats
+        else:
+            from contrib_io import read_residue_stats
+        stats = read_residue_stats(input_path)
+        draw(stats.to_frame(ddof=params['ddof']), stats.global_mean(), output_path, dpi=params['dpi'])
+    elif kind == 'ptm_summary':
+        draw(pd.read_csv(input_path, usecols=['ptm'])['ptm'], output_path, dpi=params['dpi'])
+    else:
+        summary_df = pd.read_csv(input_path, usecols=['mean_plddt', 'min_plddt', 'max_plddt'])
+        draw(summary_df, output_path, dpi=params['dpi'])
+    return name
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="从汇总表并行渲染fig1的所有图（输入和参数未变的图跳过）")
+    parser.add_argument('--residue-summary', default=None, help="残基RMSD贡献汇总表")
+    parser.add_argument('--ptm-summary', default=None, help="pTM汇总表 ptm_summary.csv")
+    parser.add_argument('--plddt-summary', default=None, help="pLDDT结构摘要 structure_summary.csv")
+    parser.add_argument('--output-dir', required=True, help="图片输出目录")
+    parser.add_argument('--figures', nargs='+', choices=sorted(FIGURES), default=None,
+                        help="只渲染这些图（默认所有输入已给出的图）")
+    parser.add_argument('--dpi', type=int, default=None, help="覆盖所有图的分辨率")
+    parser.add_argument('--workers', type=int, default=None, help="并行绘图进程数（默认CPU核数）")
+    parser.add_argument('--force', action='store_true', help="忽略缓存，重新渲染")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    inputs = {'residue_summary': args.residue_summary, 'ptm_summary': args.ptm_summary,
+              'plddt_summary': args.plddt_summary}
+    cache_path = os.path.join(args.output_dir, CACHE_NAME)
+    cache = {} if args.force else load_cache(cache_path)
+
+    jobs = {}
+    for name in args.figures or FIGURES:
+        spec = FIGURES[name]
+        input_path = inputs[spec['input']]
+        if input_path is None:
+            if args.figures:
+                print(f"跳过 {name}: 未给出 --{spec['input'].replace('_', '-')}")
+            continue
+        params = dict(spec['params'])
+        if args.dpi is not None:
+            params['dpi'] = args.dpi
+        output_path = os.path.join(args.output_dir, spec['output'])
+        key = cache_key(name, input_files(spec['input'], input_path), params)
+        if cache.get(name) == key and os.path.exists(output_path):
+            print(f"{name}: 输入和参数未变，跳过")
+            continue
+        jobs[name] = (input_path, output_path, params, key)
+
+    if not jobs:
+        print("没有需要渲染的图")
+        return
+    workers = min(args.workers or os.cpu_count() or 1, len(jobs))
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(render_figure, name, *job[:3]): name for name, job in jobs.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{name}: 渲染失败 - {e}")
+                continue
+            # 渲染成功后才记入缓存
+            cache[name] = jobs[name][3]
+            save_cache(cache_path, cache)
+            print(f"{name}: 已保存到 {jobs[name][1]}")
+    print(f"完成: 渲染 {len(jobs) - failed} 张图，失败 {failed} 张")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""按残基编号流式累积RMSD贡献的统计量（计数、均值、方差、分位数）
+
+每块数据用 np.bincount 计算块内统计量，再按 Chan 等人的并行方差公式合并，
+因此数据块之间、工作进程之间、多次运行之间的结果都可以直接合并，
+且不会像 E[x^2] - E[x]^2 那样在海量数据上损失精度。
+分位数（中位数、IQR、p5/p95）由同样可合并的对数分箱直方图（quantile_sketch）近似。
+残基编号可以为0或负数（标签、信号肽等），数组从 offset 对应的编号开始存放。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .quantile_sketch import ResidueHistogram
+else:
+    from quantile_sketch import ResidueHistogram
+
+
+class ResidueStats:
+    """count / mean / M2 数组（第 i 个元素对应残基编号 offset + i），以及行对齐的分位数草图 sketch"""
+
+    def __init__(self, size=0, sketch=None, offset=0):
+        self.offset = offset
+        self.count = np.zeros(size, dtype=np.int64)
+        self.mean = np.zeros(size, dtype=np.float64)
+        self.m2 = np.zeros(size, dtype=np.float64)
+        # 默认分箱适合RMSD贡献（Å）；其他量可传入按其取值范围分箱的草图
+        self.sketch = sketch if sketch is not None else ResidueHistogram()
+
+    @classmethod
+    def from_arrays(cls, residue_numbers, count, mean, m2):
+        """由每个残基的 count / mean / M2 构造（残基编号任意，可为负）"""
+        residue_numbers = np.asarray(residue_numbers, dtype=np.int64)
+        if not len(residue_numbers):
+            return cls()
+        offset = min(int(residue_numbers.min()), 0)
+        stats = cls(int(residue_numbers.max()) - offset + 1, offset=offset)
+        stats.count[residue_numbers - offset] = count
+        stats.mean[residue_numbers - offset] = mean
+        stats.m2[residue_numbers - offset] = m2
+        return stats
+
+    def _reserve(self, low, high):
+        """保证残基编号 [low, high) 都有位置：低于 offset 时在前面补零，超出末尾时在后面补零"""
+        front = self.offset - low
+        if front > 0:
+            self.count = np.concatenate([np.zeros(front, dtype=np.int64), self.count])
+            self.mean = np.concatenate([np.zeros(front), self.mean])
+            self.m2 = np.concatenate([np.zeros(front), self.m2])
+            self.sketch.grow_front(front)
+            self.offset = low
+        extra = high - self.offset - len(self.count)
+        if extra > 0:
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+            self.mean = np.concatenate([self.mean, np.zeros(extra)])
+            self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+
+    def _merge_arrays(self, count, mean, m2, offset=0):
+        """合并从残基编号 offset 开始的 count / mean / M2 数组"""
+        size = len(count)
+        self._reserve(min(offset, self.offset), offset + size)
+        part = slice(offset - self.offset, offset - self.offset + size)
+        n_a = self.count[part].astype(np.float64)
+        n_b = count.astype(np.float64)
+        n = n_a + n_b
+        safe_n = np.where(n > 0, n, 1.0)
+        delta = mean - self.mean[part]
+        self.mean[part] += np.where(n > 0, delta * n_b / safe_n, 0.0)
+        self.m2[part] += m2 + delta ** 2 * n_a * n_b / safe_n
+        self.count[part] += count
+
+    def update(self, residue_numbers, values):
+        """加入一块数据（NaN值被忽略）"""
+        residue_numbers = np.asarray(residue_numbers)
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values)
+        residue_numbers = residue_numbers[keep].astype(np.int64)
+        values = values[keep]
+        if not len(values):
+            return
+        # 块内统计量以块内最小编号为起点，编号为负时也能用 bincount
+        low = min(int(residue_numbers.min()), 0)
+        local = residue_numbers - low
+        size = int(local.max()) + 1
+        count = np.bincount(local, minlength=size)
+        total = np.bincount(local, weights=values, minlength=size)
+        mean = total / np.where(count > 0, count, 1)
+        m2 = np.bincount(local, weights=(values - mean[local]) ** 2, minlength=size)
+        self._merge_arrays(count, mean, m2, offset=low)
+        self.sketch.update(residue_numbers - self.offset, values)
+
+    def merge(self, other):
+        """合并另一个累积器（其他数据块、工作进程或运行的结果）"""
+        self._merge_arrays(other.count, other.mean, other.m2, offset=other.offset)
+        self.sketch.merge(other.sketch, offset=other.offset - self.offset)
+        return self
+
+    @property
+    def total_count(self):
+        return int(self.count.sum())
+
+    def global_mean(self):
+        """所有数值的总体均值"""
+        total = self.count.sum()
+        return float(np.sum(self.count * self.mean) / total) if total else np.nan
+
+    def to_frame(self, ddof=0):
+        """返回以 residue_number 为索引的 count / mean / std / cv 及 p5 / q1 / median / q3 / p95 / iqr 表
+
+        分位数来自草图；从不带草图的汇总表恢复的累积器，分位数列为 NaN。
+        """
+        present = np.flatnonzero(self.count > 0)
+        count = self.count[present]
+        mean = self.mean[present]
+        denom = count - ddof
+        variance = np.where(denom > 0, self.m2[present] / np.where(denom > 0, denom, 1), np.nan)
+        std = np.sqrt(np.maximum(variance, 0.0))
+        cv = np.where(mean != 0, std / np.where(mean != 0, mean, 1.0), 0.0)
+        frame = pd.DataFrame({'count': count, 'mean': mean, 'std': std, 'cv': cv},
+                             index=pd.Index(present + self.offset, name='residue_number'))
+        for name, values in self.sketch.summary(present).items():
+            frame[name] = values
+        return frame
+
+    @staticmethod
+    def sketch_path(path):
+        """汇总表对应的分位数草图文件（与汇总表放在一起）"""
+        return os.path.splitext(path)[0] + "_sketch.npz"
+
+    def save_summary(self, path):
+        """写出每个残基一行的汇总表（含 m2，可无损恢复累积状态），草图计数另存为 npz"""
+        frame = self.to_frame(ddof=0)
+        frame.insert(2, 'm2', self.m2[frame.index.to_numpy() - self.offset])
+        frame.to_csv(path)
+        np.savez(self.sketch_path(path), sketch=self.sketch.counts, sketch_params=np.array(self.sketch.params),
+                 offset=self.offset)
+
+    @classmethod
+    def load_summary(cls, path):
+        """从 save_summary 写出的汇总表（及草图文件，若存在）恢复累积状态"""
+        frame = pd.read_csv(path, usecols=['residue_number', 'count', 'mean', 'm2'])
+        stats = cls.from_arrays(frame['residue_number'].to_numpy(dtype=np.int64),
+                                frame['count'].to_numpy(dtype=np.int64),
+                                frame['mean'].to_numpy(dtype=np.float64),
+                                frame['m2'].to_numpy(dtype=np.float64))
+        if os.path.exists(cls.sketch_path(path)):
+            with np.load(cls.sketch_path(path)) as data:
+                stats._load_sketch(data)
+        return stats
+
+    def _load_sketch(self, data):
+        if 'sketch' not in data:
+            return
+        saved = ResidueHistogram(*data['sketch_params'])
+        saved.counts = data['sketch']
+        # 草图的行从保存时的 offset 开始（旧文件没有 offset，为0），按当前 offset 对齐；
+        # 当前 offset 之前的行对应计数为0的残基，没有数据
+        shift = (int(data['offset']) if 'offset' in data else 0) - self.offset
+        if shift < 0:
+            saved.counts = saved.counts[-shift:]
+            shift = 0
+        self.sketch = ResidueHistogram(*data['sketch_params']).merge(saved, offset=shift)
+
+    @staticmethod
+    def is_summary_file(path):
+        """判断CSV文件是否为 save_summary 写出的汇总表"""
+        header = pd.read_csv(path, nrows=0).columns
+        return 'm2' in header and 'residue_number' in header
+
+    def save(self, path):
+        """保存累积状态，便于之后与其他运行合并"""
+        np.savez(path, count=self.count, mean=self.mean, m2=self.m2, offset=self.offset,
+                 sketch=self.sketch.counts, sketch_params=np.array(self.sketch.params))
+
+    @classmethod
+    def load(cls, path):
+        stats = cls()
+        with np.load(path) as data:
+            stats.count = data['count']
+            stats.mean = data['mean']
+            stats.m2 = data['m2']
+            stats.offset = int(data['offset']) if 'offset' in data else 0
+            stats._load_sketch(data)
+        return stats
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""长时间运行任务的指标：分阶段计时、计数器、按原因分类的跳过计数，以JSON行的形式写出"""
+import json
+import time
+from contextlib import contextmanager
+
+
+class RunMetrics:
+    """可以在进程之间传递并合并的计时器和计数器
+
+    - timers：阶段名 -> 累计秒数（多进程时为各进程之和）
+    - counters：名称 -> 计数（输入行数、结构缓存命中等）
+    - skips：跳过原因 -> 跳过的行数
+    """
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.skips = {}
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage, seconds):
+        self.timers[stage] = self.timers.get(stage, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def skip(self, reason, n=1):
+        if n:
+            self.skips[reason] = self.skips.get(reason, 0) + int(n)
+
+    def timed_iter(self, iterable, stage):
+        """逐项产出 iterable，取下一项所花的时间计入 stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.timer(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def merge(self, other):
+        for mine, theirs in ((self.timers, other.timers), (self.counters, other.counters),
+                             (self.skips, other.skips)):
+            for key, value in theirs.items():
+                mine[key] = mine.get(key, 0) + value
+        return self
+
+    def to_dict(self):
+        return {
+            'timers': {stage: round(seconds, 6) for stage, seconds in self.timers.items()},
+            'counters': dict(self.counters),
+            'skips': dict(self.skips),
+        }
+
+
+class MetricsLog:
+    """JSON行格式的指标文件：每隔 interval 秒写一条进度记录，结束时写一条最终报告
+
+    interval 为0时只写最终报告。append=True 时追加到已有文件（断点续跑）。
+    """
+
+    def __init__(self, path, interval=30.0, append=False):
+        self.path = path
+        self.interval = interval
+        self.start = time.perf_counter()
+        self._last = self.start
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def due(self):
+        return self.interval > 0 and time.perf_counter() - self._last >= self.interval
+
+    def emit(self, event, metrics, **fields):
+        """写出一条记录并返回它"""
+        self._last = time.perf_counter()
+        record = {'event': event, 'time': time.time(), 'elapsed': round(self.elapsed(), 3)}
+        record.update(fields)
+        record.update(metrics.to_dict())
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        return record
+
+    def close(self):
+        self._file.close()
+
+
+def profile_call(func, args, output_prefix, trace_memory=False, top=25):
+    """在cProfile（和可选的tracemalloc）下运行一次 func(*args)
+
+    写出 output_prefix.prof（可用 pstats / snakeviz 查看），
+    trace_memory 为True时另写 output_prefix_memory.txt：峰值内存和分配最多的代码行。
+    """
+    import cProfile
+    import tracemalloc
+
+    if trace_memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(output_prefix + '.prof')
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(output_prefix + '_memory.txt', 'w', encoding='utf-8') as f:
+                f.write(f"peak traced memory: {peak / 2**20:.1f} MiB\n")
+                for stat in snapshot.statistics('lineno')[:top]:
+                    f.write(f"{stat}\n")
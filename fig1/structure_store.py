@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""PDB结构缓存：内存LRU + 磁盘NumPy缓存，每个结构每次运行最多解析一次"""
+import os
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class StructureStore:
+    """按结构ID提供CA坐标数组和残基编号
+
+    - 目录只扫描一次，建立文件名索引，代替逐次的 os.path.exists 大小写探测
+    - 内存中保留最近使用的 max_items 个结构（LRU）
+    - cache_dir 不为空时，解析结果以 .npz 形式落盘，键为 路径+大小+修改时间，
+      文件变化后自动失效
+    """
+
+    def __init__(self, pdb_dir, cache_dir=None, max_items=4096):
+        self.pdb_dir = pdb_dir
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self._parser = None  # Bio.PDB 只在第一次需要解析PDB文件时导入
+        self._index = None
+        self._lru = OrderedDict()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'parsed': 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _build_index(self):
+        """扫描一次PDB目录，建立 文件名 -> 路径 的索引"""
+        index = {}
+        with os.scandir(self.pdb_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.pdb') and entry.is_file():
+                    index[entry.name] = entry.path
+        self._index = index
+
+    def resolve(self, pdb_id):
+        """按 原样/小写/大写 的顺序查找结构文件路径"""
+        if self._index is None:
+            self._build_index()
+        for fname in (f"{pdb_id}.pdb", f"{pdb_id.lower()}.pdb", f"{pdb_id.upper()}.pdb"):
+            path = self._index.get(fname)
+            if path is not None:
+                return path
+        raise FileNotFoundError(f"No PDB file found for {pdb_id}")
+
+    def _disk_path(self, pdb_path, st):
+        key = f"{os.path.abspath(pdb_path)}|{st.st_size}|{st.st_mtime_ns}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npz')
+
+    def _parse(self, pdb_id, pdb_path):
+        """解析PDB文件，返回所有模型、所有链中CA原子的坐标和残基编号"""
+        if self._parser is None:
+            from Bio.PDB import PDBParser
+            self._parser = PDBParser(QUIET=True)
+        structure = self._parser.get_structure(pdb_id, pdb_path)
+        coords = []
+        res_nums = []
+        for model in structure:
+            for chain in model:
+                for residue in chain:
+                    if 'CA' in residue:
+                        coords.append(residue['CA'].get_coord())
+                        res_nums.append(residue.id[1])
+        coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+        res_nums = np.asarray(res_nums, dtype=np.int32)
+        return coords, res_nums
+
+    def get(self, pdb_id):
+        """返回 (CA坐标 (N, 3) float32, 残基编号 (N,) int32)"""
+        cached = self._lru.get(pdb_id)
+        if cached is not None:
+            self._lru.move_to_end(pdb_id)
+            self.stats['memory_hits'] += 1
+            return cached
+
+        pdb_path = self.resolve(pdb_id)
+        item = None
+        disk_path = None
+        if self.cache_dir:
+            disk_path = self._disk_path(pdb_path, os.stat(pdb_path))
+            if os.path.exists(disk_path):
+                with np.load(disk_path) as data:
+                    item = (data['coords'], data['res_nums'])
+                self.stats['disk_hits'] += 1
+
+        if item is None:
+            item = self._parse(pdb_id, pdb_path)
+            self.stats['parsed'] += 1
+            if disk_path is not None:
+                # 先写临时文件再替换，避免并发进程读到半个文件
+                tmp_path = f"{disk_path}.{os.getpid()}.tmp.npz"
+                np.savez(tmp_path, coords=item[0], res_nums=item[1])
+                os.replace(tmp_path, disk_path)
+
+        self._lru[pdb_id] = item
+        if len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+        return item
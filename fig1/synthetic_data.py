@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""确定性的合成数据：类AlphaFold的PDB结构、Foldseek比对TSV、预测结果JSON和残基贡献表
+
+同一个种子总是生成完全相同的文件，用于基准测试（benchmark.py）和比较改动前后的结果。
+结构按家族生成：同一家族的结构由同一条随机游走主链加噪声和少量插入/缺失得到，
+因此家族内的比对和叠合有意义；B因子（pLDDT）沿序列平滑变化，末端较低。
+"""
+import os
+import json
+
+import numpy as np
+
+AMINO_ACIDS = ['ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
+               'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL']
+ONE_LETTER = 'ARNDCQEGHILKMFPSTWYV'
+# 每个残基写出的主链原子及其相对CA的偏移（Å）
+BACKBONE = [('N', 'N', (-1.2, 0.6, 0.0)), ('CA', 'C', (0.0, 0.0, 0.0)),
+            ('C', 'C', (1.3, 0.7, 0.0)), ('O', 'O', (1.5, 1.9, 0.3))]
+
+
+def _random_walk(rng, n, step=3.8):
+    """CA主链：步长固定的随机游走，方向缓慢变化（近似二级结构的局部连续性）"""
+    directions = np.cumsum(rng.normal(scale=0.6, size=(n, 3)), axis=0) + rng.normal(size=3) * 3
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return np.cumsum(directions * step, axis=0)
+
+
+def _plddt_profile(rng, n):
+    """沿序列平滑变化的pLDDT，两端较低，取值在 20-98 之间"""
+    noise = np.convolve(rng.normal(size=n + 20), np.ones(21) / 21, mode='valid')[:n]
+    ends = np.minimum(np.arange(n), np.arange(n)[::-1])
+    values = 88 + 40 * noise - 30 * np.exp(-ends / 8.0)
+    return np.clip(values, 20, 98)
+
+
+def family_members(rng, family_size, length):
+    """生成一个家族：返回 [(CA坐标, 残基名数组, pLDDT, 祖先位置)]，成员相对共同祖先有噪声、插入和缺失
+
+    祖先位置为每个残基在共同祖先中的下标（插入的残基为 -1），用于生成家族内的真实比对。
+    """
+    ancestor = _random_walk(rng, length)
+    residues = rng.choice(AMINO_ACIDS, size=length)
+    members = []
+    for _ in range(family_size):
+        keep = rng.random(length) > 0.03  # 约3%的残基缺失
+        coords = ancestor[keep] + rng.normal(scale=0.8, size=(keep.sum(), 3))
+        names = residues[keep].copy()
+        ancestry = np.flatnonzero(keep)
+        mutate = rng.random(len(names)) < 0.2
+        names[mutate] = rng.choice(AMINO_ACIDS, size=mutate.sum())
+        # 少量插入：在随机位置插入短片段
+        for _ in range(rng.poisson(1.5)):
+            at = int(rng.integers(1, len(coords)))
+            size = int(rng.integers(1, 6))
+            insert = coords[at - 1] + np.cumsum(rng.normal(scale=2.2, size=(size, 3)), axis=0)
+            coords = np.concatenate([coords[:at], insert, coords[at:]])
+            names = np.concatenate([names[:at], rng.choice(AMINO_ACIDS, size=size), names[at:]])
+            ancestry = np.concatenate([ancestry[:at], np.full(size, -1), ancestry[at:]])
+        members.append((coords, names, _plddt_profile(rng, len(coords)), ancestry))
+    return members
+
+
+def format_pdb(coords, residue_names, bfactors, chain='A'):
+    """按PDB固定列格式写出主链原子（B因子列为pLDDT）"""
+    lines = []
+    serial = 1
+    for i, (ca, name, b) in enumerate(zip(coords, residue_names, bfactors)):
+        for atom, element, offset in BACKBONE:
+            x, y, z = ca + np.asarray(offset)
+            lines.append(f"ATOM  {serial:5d}  {atom:<3s} {name:3s} {chain}{i + 1:4d}    "
+                         f"{x:8.3f}{y:8.3f}{z:8.3f}{1.0:6.2f}{b:6.2f}           {element}")
+            serial += 1
+    lines.append(f"TER   {serial:5d}      {residue_names[-1]:3s} {chain}{len(coords):4d}")
+    lines.append("END")
+    return "\n".join(lines) + "\n"
+
+
+def _homologous_strings(seq_q, anc_q, seq_t, anc_t):
+    """同一家族的两条序列按共同祖先位置比对：祖先位置相同的残基对齐，其余对gap"""
+    q_out, t_out = [], []
+    i = j = 0
+    while i < len(seq_q) or j < len(seq_t):
+        if i < len(seq_q) and j < len(seq_t) and anc_q[i] == anc_t[j] >= 0:
+            q_out.append(seq_q[i])
+            t_out.append(seq_t[j])
+            i += 1
+            j += 1
+        elif j >= len(seq_t) or (i < len(seq_q) and (anc_q[i] < 0 or (anc_t[j] >= 0 and anc_q[i] < anc_t[j]))):
+            q_out.append(seq_q[i])
+            t_out.append('-')
+            i += 1
+        else:
+            q_out.append('-')
+            t_out.append(seq_t[j])
+            j += 1
+    return ''.join(q_out), ''.join(t_out)
+
+
+def _aligned_strings(rng, seq_q, seq_t):
+    """两条序列从头开始的带gap比对（匹配段中穿插几何分布长度的插入/缺失），返回 (qaln, taln)"""
+    q_out, t_out = [], []
+    i = j = 0
+    while i < len(seq_q) and j < len(seq_t):
+        r = rng.random()
+        if r < 0.04:
+            size = min(int(rng.geometric(0.4)), len(seq_q) - i)
+            q_out.append(seq_q[i:i + size])
+            t_out.append('-' * size)
+            i += size
+        elif r < 0.08:
+            size = min(int(rng.geometric(0.4)), len(seq_t) - j)
+            q_out.append('-' * size)
+            t_out.append(seq_t[j:j + size])
+            j += size
+        else:
+            size = min(int(rng.geometric(0.1)), len(seq_q) - i, len(seq_t) - j)
+            q_out.append(seq_q[i:i + size])
+            t_out.append(seq_t[j:j + size])
+            i += size
+            j += size
+    return ''.join(q_out), ''.join(t_out)
+
+
+def write_structures(pdb_dir, n_structures, seed=0, family_size=10, length=(280, 340), prefixes=('GII', 'GIX')):
+    """在 pdb_dir 中写出 n_structures 个PDB文件，返回 {结构ID: (一字母序列, 家族编号, 祖先位置)}
+
+    结构ID为 <前缀>_pdb<编号>，前缀在 prefixes 之间按家族轮换（便于分组比较）。
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(pdb_dir, exist_ok=True)
+    structures = {}
+    family = 0
+    while len(structures) < n_structures:
+        size = min(family_size, n_structures - len(structures))
+        prefix = prefixes[family % len(prefixes)]
+        for coords, names, plddt, ancestry in family_members(rng, size, int(rng.integers(*length))):
+            structure_id = f"{prefix}_pdb{len(structures)}"
+            with open(os.path.join(pdb_dir, f"{structure_id}.pdb"), 'w') as f:
+                f.write(format_pdb(coords, names, plddt))
+            sequence = ''.join(ONE_LETTER[AMINO_ACIDS.index(name)] for name in names)
+            structures[structure_id] = (sequence, family, ancestry)
+        family += 1
+    return structures
+
+
+def write_alignments(path, structures, n_rows, seed=0, self_hits=0.02, reverse_pairs=0.5):
+    """写出Foldseek格式（query target qaln taln evalue rmsd）的比对TSV，structures 为 write_structures 的返回值
+
+    多数比对在同一家族（编号相邻）的结构之间，按共同祖先对齐；不同家族之间为随机的带gap比对。
+    约 self_hits 比例为自比对，
+    约 reverse_pairs 比例的结构对同时写出反方向的比对（all-vs-all 搜索的典型情况）。
+    """
+    rng = np.random.default_rng(seed)
+    names = list(structures)
+    written = 0
+    with open(path, 'w') as f:
+        while written < n_rows:
+            q = int(rng.integers(len(names)))
+            if rng.random() < self_hits:
+                t = q
+            elif rng.random() < 0.8:
+                t = min(max(q + int(rng.integers(-9, 10)), 0), len(names) - 1)
+            else:
+                t = int(rng.integers(len(names)))
+            pairs = [(q, t)]
+            if q != t and rng.random() < reverse_pairs:
+                pairs.append((t, q))
+            for a, b in pairs[:n_rows - written]:
+                seq_a, family_a, anc_a = structures[names[a]]
+                seq_b, family_b, anc_b = structures[names[b]]
+                if a == b:
+                    qaln = taln = seq_a
+                elif family_a == family_b:
+                    qaln, taln = _homologous_strings(seq_a, anc_a, seq_b, anc_b)
+                else:
+                    qaln, taln = _aligned_strings(rng, seq_a, seq_b)
+                evalue = 0.0 if a == b else float(10 ** -rng.uniform(3, 40))
+                rmsd = 0.0 if a == b else float(rng.uniform(0.5, 6.0) if family_a == family_b else rng.uniform(8, 25))
+                f.write(f"{names[a]}\t{names[b]}\t{qaln}\t{taln}\t{evalue:.3E}\t{rmsd:.3f}\n")
+                written += 1
+    return written
+
+
+def write_contributions(path, n_rows, seed=0, n_structures=200, max_residue=330, chunk_rows=1000000):
+    """写出 RMSD_1_batch 输出格式的逐残基贡献CSV（n_rows 行）"""
+    rng = np.random.default_rng(seed)
+    import pandas as pd
+    names = np.array([f"GII_pdb{i}" for i in range(n_structures)], dtype=object)
+    residue_scale = 0.5 + 2.5 * rng.random(max_residue + 1)
+    header = True
+    remaining = n_rows
+    while remaining > 0:
+        n = min(chunk_rows, remaining)
+        residue = rng.integers(1, max_residue + 1, size=n)
+        frame = pd.DataFrame({
+            'query': names[rng.integers(n_structures, size=n)],
+            'target': names[rng.integers(n_structures, size=n)],
+            'residue_number': residue,
+            'rmsd_contribution': rng.lognormal(mean=0.0, sigma=0.6, size=n) * residue_scale[residue],
+            'total_rmsd': rng.uniform(0.5, 6.0, size=n).round(3),
+            'aligned_length': rng.integers(200, max_residue, size=n),
+        })
+        frame.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        remaining -= n
+    return n_rows
+
+
+def prediction_json(rng, n_residues, layout='top'):
+    """AlphaFold风格的结果JSON：plddt、完整的PAE矩阵，以及 ptm / iptm
+
+    layout 为 'top' 时 ptm 在顶层（位于PAE之后），为 'model' 时在 model_1 子对象中。
+    """
+    pae = np.round(rng.gamma(2.0, 4.0, size=(n_residues, n_residues)), 2)
+    scores = {
+        'plddt': np.round(_plddt_profile(rng, n_residues), 2).tolist(),
+        'pae': pae.tolist(),
+        'max_pae': float(pae.max()),
+    }
+    ptm = round(float(rng.uniform(0.3, 0.95)), 4)
+    if layout == 'model':
+        return {'model_1': dict(scores, ptm=ptm)}
+    return dict(scores, ptm=ptm, iptm=round(ptm * 0.9, 4))
+
+
+def write_predictions(root, n_predictions, seed=0, n_residues=(150, 250), models_per_dir=3):
+    """写出预测结果目录树：每个子目录含一个PDB和 models_per_dir 个结果JSON，返回JSON文件数"""
+    rng = np.random.default_rng(seed)
+    written = 0
+    index = 0
+    while written < n_predictions:
+        directory = os.path.join(root, f"GII.{index % 9}_Sydney_{index}")
+        os.makedirs(directory, exist_ok=True)
+        length = int(rng.integers(*n_residues))
+        coords = _random_walk(rng, length)
+        names = rng.choice(AMINO_ACIDS, size=length)
+        with open(os.path.join(directory, f"GII{index % 9}_2012_model.pdb"), 'w') as f:
+            f.write(format_pdb(coords, names, _plddt_profile(rng, length)))
+        for model in range(min(models_per_dir, n_predictions - written)):
+            layout = 'model' if rng.random() < 0.2 else 'top'
+            with open(os.path.join(directory, f"result_{model}.json"), 'w') as f:
+                json.dump(prediction_json(rng, length, layout), f)
+            written += 1
+        index += 1
+    return written
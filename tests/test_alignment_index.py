@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from fig1.alignment_index import alignment_indices, alignment_indices_batch
+
+# 手工计算：
+#   列      0  1  2  3  4  5  6
+#   qaln    A  C  -  D  E  -  F     query下标  0 1 . 2 3 . 4
+#   taln    A  -  G  D  E  H  F     target下标 0 . 1 2 3 4 5
+# 两侧都不是gap的列为 0、3、4、6
+GAPPED = ('AC-DE-F', 'A-GDEHF', [0, 2, 3, 4], [0, 2, 3, 5])
+# 开头两列query为gap，最后一列target为gap，只有第2列对齐
+LEADING = ('--AB', 'XYA-', [0], [2])
+
+
+@pytest.mark.parametrize('qaln, taln, q_expected, t_expected', [GAPPED, LEADING])
+def test_alignment_indices_hand_computed(qaln, taln, q_expected, t_expected):
+    q_idx, t_idx = alignment_indices(qaln, taln)
+    assert q_idx.tolist() == q_expected
+    assert t_idx.tolist() == t_expected
+    # bytes 输入结果相同
+    q_bytes, t_bytes = alignment_indices(qaln.encode(), taln.encode())
+    assert q_bytes.tolist() == q_expected and t_bytes.tolist() == t_expected
+
+
+def test_alignment_indices_length_mismatch():
+    with pytest.raises(ValueError, match='length mismatch'):
+        alignment_indices('AC-', 'AC')
+
+
+def test_batch_matches_single_alignments():
+    # 长度不一致的比对不产生对齐列，其后比对的下标不受影响
+    qalns = [GAPPED[0], 'ABC', LEADING[0], '', GAPPED[0]]
+    talns = [GAPPED[1], 'AB', LEADING[1], '', GAPPED[1]]
+    q_idx, t_idx, row_ids, valid = alignment_indices_batch(qalns, talns)
+
+    assert valid.tolist() == [True, False, True, True, True]
+    assert row_ids.tolist() == [0, 0, 0, 0, 2, 4, 4, 4, 4]
+    expected_q = np.concatenate([GAPPED[2], LEADING[2], GAPPED[2]])
+    expected_t = np.concatenate([GAPPED[3], LEADING[3], GAPPED[3]])
+    np.testing.assert_array_equal(q_idx, expected_q)
+    np.testing.assert_array_equal(t_idx, expected_t)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from fig1 import synthetic_data
+from fig1.aln_store import COLUMN_NAMES, AlignmentStore, ingest_tsv, is_alignment_store, iter_pair_codes
+from fig1.query_layer import build_query_store
+
+
+@pytest.fixture(scope='module')
+def alignments(tmp_path_factory):
+    root = tmp_path_factory.mktemp('aln_store')
+    found = synthetic_data.write_structures(str(root / 'pdbs'), 8, seed=7, family_size=4, length=(20, 40))
+    tsv = str(root / 'aln.tsv')
+    synthetic_data.write_alignments(tsv, found, 90, seed=7)
+    store = str(root / 'store')
+    assert ingest_tsv(tsv, store, chunksize=25) == 90
+    frame = pd.read_csv(tsv, sep='\t', header=None, names=COLUMN_NAMES, dtype={'qaln': str, 'taln': str})
+    return tsv, store, frame
+
+
+def test_store_rows_match_tsv(alignments):
+    _, path, frame = alignments
+    assert is_alignment_store(path)
+    store = AlignmentStore(path)
+    assert len(store) == len(frame)
+    chunks = pd.concat(list(store.iter_chunks(40)))
+    assert chunks.index.tolist() == list(range(len(frame)))
+    for column in ['query', 'target', 'qaln', 'taln']:
+        assert chunks[column].tolist() == frame[column].tolist()
+    # 数值列以float32存储
+    np.testing.assert_allclose(chunks['rmsd'], frame['rmsd'], rtol=1e-6)
+    np.testing.assert_allclose(chunks['evalue'], frame['evalue'], rtol=1e-6)
+
+
+def test_query_and_target_index(alignments):
+    _, path, frame = alignments
+    store = AlignmentStore(path)
+    name = frame['query'].iloc[0]
+    assert store.query_rows(name).tolist() == np.flatnonzero(frame['query'] == name).tolist()
+    assert store.target_rows(name).tolist() == np.flatnonzero(frame['target'] == name).tolist()
+    assert store.query_rows('missing_pdb').tolist() == []
+    rows = store.target_rows(name)
+    subset = store.frame(rows, columns=['query', 'taln'])
+    assert subset['taln'].tolist() == frame['taln'].iloc[rows].tolist()
+
+
+def _pairs(path, chunksize):
+    """把 iter_pair_codes 的编号还原为ID，按行拼接"""
+    rows = []
+    for q_codes, t_codes, rmsd, names in iter_pair_codes(path, chunksize=chunksize):
+        names = np.asarray(names, dtype=object)
+        rows.append(pd.DataFrame({'query': names[q_codes], 'target': names[t_codes], 'rmsd': rmsd}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def test_iter_pair_codes_same_for_all_inputs(alignments, tmp_path):
+    tsv, store, frame = alignments
+    db = str(tmp_path / 'query.db')
+    build_query_store(db, alignments=tsv)
+    expected = _pairs(tsv, 33)
+    assert expected['query'].tolist() == frame['query'].tolist()
+    for path in [store, db]:
+        pairs = _pairs(path, 33)
+        assert pairs[['query', 'target']].equals(expected[['query', 'target']])
+        np.testing.assert_allclose(pairs['rmsd'], expected['rmsd'], rtol=1e-6)
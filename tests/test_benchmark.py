@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+from fig1 import benchmark
+
+TINY = {'structures': 6, 'alignments': 40, 'contributions': 3000, 'predictions': 4}
+
+
+@pytest.fixture
+def tiny_scale(monkeypatch):
+    monkeypatch.setitem(benchmark.SCALES, 'tiny', dict(TINY))
+
+
+def test_prepare_dataset_reuses_matching_data(tmp_path, tiny_scale):
+    root = benchmark.prepare_dataset(str(tmp_path), 'tiny', seed=1)
+    marker = os.path.join(root, 'marker')
+    open(marker, 'w').close()
+    assert benchmark.prepare_dataset(str(tmp_path), 'tiny', seed=1) == root
+    assert os.path.exists(marker)
+    # 参数变化（种子或规模）时重新生成
+    benchmark.prepare_dataset(str(tmp_path), 'tiny', seed=2)
+    assert not os.path.exists(marker)
+    with open(os.path.join(root, benchmark.DATASET_META), encoding='utf-8') as f:
+        assert json.load(f) == dict(TINY, seed=2)
+
+
+def test_compare_reports_throughput_and_memory_regressions():
+    baseline = {'small/a': {'throughput': 100.0, 'peak_mb': 100.0},
+                'small/b': {'throughput': 100.0, 'peak_mb': None},
+                'small/c': {'throughput': 100.0, 'peak_mb': 100.0}}
+    results = {'small/a': {'throughput': 76.0, 'peak_mb': 124.0},
+               'small/b': {'throughput': 74.0, 'peak_mb': 500.0},
+               'small/c': {'throughput': 200.0, 'peak_mb': 126.0},
+               'small/new': {'throughput': 1.0, 'peak_mb': 1.0}}
+    regressions = benchmark.compare(results, baseline, tolerance=0.25, memory_tolerance=0.25)
+    assert [line.split(':')[0] for line in regressions] == ['small/b', 'small/c']
+    assert '吞吐量' in regressions[0] and '峰值内存' in regressions[1]
+
+
+def test_main_saves_and_checks_baseline(tmp_path, tiny_scale):
+    args = ['--data-dir', str(tmp_path / 'data'), '--scales', 'tiny', '--repeat', '1',
+            '--stages', 'residue_aggregation', 'ptm_harvest']
+    baseline = tmp_path / 'baseline.json'
+    assert benchmark.main(args + ['--save-baseline', str(baseline)]) == 0
+    results = json.loads(baseline.read_text(encoding='utf-8'))
+    assert set(results) == {'tiny/residue_aggregation', 'tiny/ptm_harvest'}
+    assert results['tiny/residue_aggregation']['items'] == TINY['contributions']
+    assert results['tiny/ptm_harvest']['items'] == TINY['predictions']
+
+    # 基准吞吐量远高于本次结果时报告回归
+    for result in results.values():
+        result['throughput'] *= 100
+    baseline.write_text(json.dumps(results), encoding='utf-8')
+    assert benchmark.main(args + ['--baseline', str(baseline)]) == 1
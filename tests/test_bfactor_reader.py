@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from fig1 import synthetic_data
+from fig1.bfactor_reader import read_atoms, read_cif_atoms, read_pdb_atoms, residue_bfactors
+
+Bio = pytest.importorskip('Bio.PDB')
+
+
+def _line(record, serial, name, residue_name, chain, number, icode, xyz, bfactor):
+    x, y, z = xyz
+    return (f"{record:<6}{serial:>5} {name:<4} {residue_name:>3} {chain}{number:>4}{icode}   "
+            f"{x:8.3f}{y:8.3f}{z:8.3f}{1.0:6.2f}{bfactor:6.2f}          {name[0]:>2}")
+
+
+# (记录类型, 残基名, 链, 编号, 插入码, 原子名列表)：负编号、插入码、修饰氨基酸、水分子，以及第二条链
+RESIDUES = [
+    ('ATOM', 'MET', 'A', -2, ' ', [' N', ' CA', ' C', ' O', ' CB']),
+    ('ATOM', 'GLY', 'A', -1, ' ', [' N', ' CA', ' C', ' O']),
+    ('ATOM', 'ALA', 'A', 100, ' ', [' N', ' CA', ' C', ' O']),
+    ('ATOM', 'SER', 'A', 100, 'A', [' N', ' CA', ' C', ' O', ' OG']),
+    ('HETATM', 'MSE', 'A', 101, ' ', [' N', ' CA', ' C', ' O', 'SE']),
+    ('HETATM', 'HOH', 'A', 201, ' ', [' O']),
+    ('ATOM', 'LYS', 'B', 1, ' ', [' N', ' CA', ' C', ' O']),
+]
+
+
+@pytest.fixture
+def handmade_pdb(tmp_path):
+    rng = np.random.default_rng(9)
+    lines, serial = [], 1
+    for model in (1, 2):
+        lines.append(f"MODEL     {model:>4}")
+        for record, residue_name, chain, number, icode, names in RESIDUES:
+            for name in names:
+                bfactor = rng.uniform(0, 100) if model == 1 else 0.0
+                lines.append(_line(record, serial, name, residue_name, chain, number, icode,
+                                   rng.uniform(-999, 999, 3), bfactor))
+                serial += 1
+        lines.append("ENDMDL")
+    lines.append("END")
+    path = tmp_path / 'handmade.pdb'
+    # Windows换行也能读取
+    path.write_bytes(('\r\n'.join(lines) + '\r\n').encode('ascii'))
+    return str(path)
+
+
+def _parser_atoms(path):
+    """Bio.PDB 解析的第一个模型中的所有原子"""
+    structure = Bio.PDBParser(QUIET=True).get_structure('s', path)
+    model = next(iter(structure))
+    return [(atom.get_parent().id[0] != ' ', atom.get_parent().get_parent().id, atom.get_parent().id[1],
+             atom.get_parent().id[2], atom.get_parent().get_resname(), atom.get_id(), atom.get_bfactor(),
+             atom.get_coord()) for atom in model.get_atoms()]
+
+
+def _reader_atoms(atoms):
+    return list(zip(atoms['hetero'], atoms['chain'], atoms['residue_number'], atoms['insertion_code'],
+                    atoms['residue_name'], atoms['atom_name'], atoms['bfactor'], atoms['coord']))
+
+
+def _assert_same_atoms(atoms, expected):
+    assert len(atoms) == len(expected)
+    for got, want in zip(atoms, expected):
+        assert got[:6] == (want[0], want[1], want[2], want[3].strip(), want[4], want[5])
+        assert got[6] == pytest.approx(want[6])
+        np.testing.assert_allclose(got[7], want[7], atol=1e-3)
+
+
+def test_pdb_reader_matches_pdbparser(handmade_pdb):
+    atoms = read_pdb_atoms(handmade_pdb, coordinates=True)
+    _assert_same_atoms(_reader_atoms(atoms), _parser_atoms(handmade_pdb))
+    assert len(read_pdb_atoms(handmade_pdb, first_model=False)['bfactor']) == 2 * len(atoms['bfactor'])
+
+
+def test_cif_reader_matches_pdb_reader(handmade_pdb, tmp_path):
+    structure = Bio.PDBParser(QUIET=True).get_structure('s', handmade_pdb)
+    io = Bio.MMCIFIO()
+    io.set_structure(structure)
+    cif = str(tmp_path / 'handmade.cif')
+    io.save(cif)
+    expected = read_pdb_atoms(handmade_pdb, coordinates=True)
+    atoms = read_cif_atoms(cif, coordinates=True)
+    for name in ['hetero', 'atom_name', 'residue_name', 'chain', 'residue_number', 'insertion_code']:
+        assert atoms[name].tolist() == expected[name].tolist(), name
+    np.testing.assert_allclose(atoms['bfactor'], expected['bfactor'])
+    np.testing.assert_allclose(atoms['coord'], expected['coord'], atol=1e-3)
+    assert read_atoms(cif)['atom_name'].tolist() == expected['atom_name'].tolist()
+
+
+def test_residue_bfactors_matches_first_atom_loop(tmp_path):
+    # AlphaFold风格的合成结构：逐残基取第一个原子的B因子（原脚本遍历 Bio.PDB 原子时 break 的写法）
+    synthetic_data.write_predictions(str(tmp_path), 1, seed=10)
+    path = str(next(tmp_path.glob('*/*.pdb')))
+    structure = Bio.PDBParser(QUIET=True).get_structure('s', path)
+    expected = []
+    for residue in next(iter(structure)).get_residues():
+        for atom in residue:
+            expected.append(atom.get_bfactor())
+            break
+    np.testing.assert_allclose(residue_bfactors(read_atoms(path))['bfactor'], expected)
+    ca = residue_bfactors(read_atoms(path), atom_name='CA')
+    assert len(ca['bfactor']) == len(expected)
+
+
+def test_residue_bfactors_hetero_modes(handmade_pdb):
+    atoms = read_pdb_atoms(handmade_pdb)
+    names = {mode: residue_bfactors(atoms, include_hetero=mode)['residue_name'].tolist()
+             for mode in (False, 'polymer', True)}
+    assert names[False] == ['MET', 'GLY', 'ALA', 'SER', 'LYS']
+    assert names['polymer'] == ['MET', 'GLY', 'ALA', 'SER', 'MSE', 'LYS']
+    assert names[True] == ['MET', 'GLY', 'ALA', 'SER', 'MSE', 'HOH', 'LYS']
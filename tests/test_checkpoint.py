@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from fig1.checkpoint import RunCheckpoint
+
+
+def test_truncate_outputs_drops_uncommitted_tail(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("header\nrow 1\n")
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = RunCheckpoint(path, {'chunksize': 10})
+    checkpoint.commit([str(output)], chunks_done=1, total_processed=1, extra={'parquet_file_index': 3})
+    # 崩溃前写了一半的块
+    with open(output, 'a') as f:
+        f.write("row 2\nro")
+
+    resumed = RunCheckpoint(path, {'chunksize': 10})
+    assert resumed.load()
+    assert resumed.state['chunks_done'] == 1 and resumed.state['extra'] == {'parquet_file_index': 3}
+    resumed.truncate_outputs()
+    assert output.read_text() == "header\nrow 1\n"
+
+
+def test_load_without_checkpoint_or_with_other_settings(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    assert not RunCheckpoint(path, {'chunksize': 10}).load()
+    RunCheckpoint(path, {'chunksize': 10}).commit()
+    with pytest.raises(ValueError):
+        RunCheckpoint(path, {'chunksize': 20}).load()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from fig1 import synthetic_data
+from fig1.contrib_io import (ParquetContributionWriter, is_parquet_dataset, iter_contribution_batches,
+                             read_residue_stats)
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture(scope='module')
+def datasets(tmp_path_factory):
+    root = tmp_path_factory.mktemp('contributions')
+    csv = str(root / 'residue_rmsd_contributions.csv')
+    synthetic_data.write_contributions(csv, 5000, seed=6, n_structures=15, max_residue=240)
+    parquet = str(root / 'residue_rmsd_contributions.parquet')
+    writer = ParquetContributionWriter(parquet, n_partitions=4)
+    for i, chunk in enumerate(pd.read_csv(csv, chunksize=700)):
+        writer.write_chunk(chunk)
+        if i == 3:
+            writer.roll()
+    writer.close()
+    return csv, parquet
+
+
+def _read_all(path, **kwargs):
+    frame = pd.concat(list(iter_contribution_batches(path, chunksize=1000, **kwargs)), ignore_index=True)
+    # 两种格式的行序不同（Parquet按query分区），按所有列排序后比较
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+def _assert_same(parquet_frame, csv_frame):
+    assert list(parquet_frame.columns) == list(csv_frame.columns)
+    for column in parquet_frame.columns:
+        if parquet_frame[column].dtype.kind == 'f':
+            # 数值列以float32存储
+            np.testing.assert_allclose(parquet_frame[column], csv_frame[column], rtol=1e-6)
+        else:
+            assert parquet_frame[column].astype(csv_frame[column].dtype).tolist() == csv_frame[column].tolist()
+
+
+def test_parquet_round_trip_matches_csv(datasets):
+    csv, parquet = datasets
+    assert is_parquet_dataset(parquet) and not is_parquet_dataset(csv)
+    _assert_same(_read_all(parquet), _read_all(csv))
+
+
+def test_parquet_query_filter_and_columns_match_csv(datasets):
+    csv, parquet = datasets
+    queries = sorted(pd.read_csv(csv, usecols=['query'])['query'].unique())[:3] + ['missing_pdb']
+    columns = ['query', 'residue_number', 'rmsd_contribution']
+    expected = _read_all(csv, columns=columns, queries=queries)
+    assert len(expected) and set(expected['query']) <= set(queries)
+    result = _read_all(parquet, columns=columns, queries=queries)
+    _assert_same(result, expected)
+
+    stats = read_residue_stats(parquet, queries=queries).to_frame()
+    expected_stats = read_residue_stats(csv, queries=queries).to_frame()
+    np.testing.assert_allclose(stats['mean'], expected_stats['mean'], rtol=1e-6)
+    assert (stats['count'].to_numpy() == expected_stats['count'].to_numpy()).all()
+
+
+def test_resume_drops_files_after_checkpoint(datasets, tmp_path):
+    csv, _ = datasets
+    chunks = list(pd.read_csv(csv, chunksize=1000))
+    path = str(tmp_path / 'resumed.parquet')
+    writer = ParquetContributionWriter(path, n_partitions=4)
+    writer.write_chunk(chunks[0])
+    writer.roll()
+    # 断点之后写了一半就中断：这些行不能出现在续跑的结果中
+    writer.write_chunk(chunks[1])
+    writer.roll()
+
+    writer = ParquetContributionWriter(path, n_partitions=4, resume_file_index=1)
+    for chunk in chunks[1:]:
+        writer.write_chunk(chunk)
+    writer.close()
+    _assert_same(_read_all(path), _read_all(csv))
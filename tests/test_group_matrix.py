@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from fig1 import group_matrix, synthetic_data
+from fig1.group_matrix import GroupMatcher, matrix_frame, scan_group_matrix, square_matrix
+
+
+def test_matcher_prefix_priority_and_pattern():
+    names = ['GII_pdb1', 'GII_pdb_x2', 'GIX_pdb3', 'other']
+    matcher = GroupMatcher(prefixes=['GII_pdb_x', 'GII_pdb'])
+    assert matcher.update(names).tolist() == [1, 0, -1, -1]
+    # 只为新增的ID计算组别
+    assert matcher.update(names + ['GII_pdb_x9']).tolist() == [1, 0, -1, -1, 0]
+
+    matcher = GroupMatcher(pattern=r'^(G[IVX]+)_')
+    assert matcher.update(names).tolist() == [0, 0, 1, -1]
+    assert matcher.labels == ['GII', 'GIX']
+    with pytest.raises(ValueError):
+        GroupMatcher()
+
+
+@pytest.fixture
+def alignments(tmp_path):
+    found = synthetic_data.write_structures(str(tmp_path / 'pdbs'), 12, seed=8, family_size=5, length=(20, 30))
+    tsv = str(tmp_path / 'aln.tsv')
+    synthetic_data.write_alignments(tsv, found, 300, seed=8)
+    return tsv
+
+
+def _reference(tsv, prefixes):
+    """逐行的pandas参考实现"""
+    frame = pd.read_csv(tsv, sep='\t', header=None, usecols=[0, 1, 5], names=['query', 'target', 'rmsd'])
+
+    def group(name):
+        return next((k for k, prefix in enumerate(prefixes) if name.startswith(prefix)), -1)
+
+    names = pd.unique(pd.concat([frame['query'], frame['target']]))
+    sizes = np.bincount([g for g in map(group, names) if g >= 0], minlength=len(prefixes))
+    frame = frame[frame['query'] != frame['target']]
+    frame = frame.assign(gq=frame['query'].map(group), gt=frame['target'].map(group))
+    frame = frame[(frame['gq'] >= 0) & (frame['gt'] >= 0)]
+    pair = [tuple(sorted(p)) for p in zip(frame['query'], frame['target'])]
+    frame = frame[~pd.Series(pair, index=frame.index).duplicated()]
+    frame = frame.assign(i=np.minimum(frame['gq'], frame['gt']), j=np.maximum(frame['gq'], frame['gt']))
+    cells = frame.groupby(['i', 'j'])['rmsd'].agg(['count', 'mean', 'std', 'min', 'max', 'median'])
+    return sizes, cells
+
+
+def test_scan_matches_reference(alignments):
+    prefixes = ['GII_pdb', 'GIX_pdb']
+    group_sizes, cells = scan_group_matrix(alignments, GroupMatcher(prefixes=prefixes), chunksize=37)
+    expected_sizes, expected = _reference(alignments, prefixes)
+    assert group_sizes.tolist() == expected_sizes.tolist()
+    assert sorted(cells) == list(expected.index)
+
+    frame = matrix_frame(prefixes, group_sizes, cells).set_index(['group_a', 'group_b'])
+    for (i, j), row in expected.iterrows():
+        result = frame.loc[(prefixes[i], prefixes[j])]
+        assert result['pairs'] == row['count']
+        n_i, n_j = group_sizes[i], group_sizes[j]
+        assert result['max_pairs'] == (n_i * (n_i - 1) // 2 if i == j else n_i * n_j)
+        np.testing.assert_allclose(result[['mean', 'min', 'max']].astype(float),
+                                   row[['mean', 'min', 'max']].astype(float), rtol=1e-12)
+        np.testing.assert_allclose(cells[(i, j)].stats.std(ddof=1), row['std'], rtol=1e-9)
+        # 中位数来自分位数草图，误差不超过一个箱宽
+        np.testing.assert_allclose(result['median'], row['median'], rtol=0.012)
+
+    pairs = square_matrix(frame.reset_index(), 'pairs')
+    assert (pairs.to_numpy() == pairs.to_numpy().T).all()
+    assert pairs.loc['GII_pdb', 'GIX_pdb'] == expected.loc[(0, 1), 'count']
+
+
+def test_main_writes_matrices(alignments, tmp_path):
+    group_matrix.main(['--alignments', alignments, '--output-dir', str(tmp_path / 'out'),
+                       '--pattern', r'^(G[IVX]+)_', '--chunksize', '50'])
+    frame = pd.read_csv(tmp_path / 'out' / group_matrix.MATRIX_NAME)
+    # 正则分组的组名按首次出现的顺序编号
+    cells = [frozenset(cell) for cell in zip(frame['group_a'], frame['group_b'])]
+    assert len(cells) == 3 and set(cells) == {frozenset(['GII']), frozenset(['GII', 'GIX']), frozenset(['GIX'])}
+    for value in ['pairs', 'coverage', 'median']:
+        assert (tmp_path / 'out' / f"group_{value}_matrix.csv").exists()
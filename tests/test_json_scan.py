@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import json
+
+import numpy as np
+import pytest
+
+from fig1 import json_scan
+from fig1.json_scan import find_first_value, iter_object_members
+
+KEYS = ['ptm', 'pTM', 'iptm']
+NESTED_IN = ['model_1', 'model_2']
+NESTED_KEYS = ['ptm']
+
+CASES = [
+    # 最高优先级的键在大数组之后
+    ('{"pae": [[0.5, 1.25], [3, 4e-2]], "iptm": 0.3, "ptm": 0.81}', (True, 0.81)),
+    # 字符串中的括号和转义引号不影响跳过
+    ('{"name": "a]}\\"[{", "meta": {"x": ["]", "{"]}, "pTM": 0.7}', (True, 0.7)),
+    # 顶层选中的键为 null 时到子对象中查找
+    ('{"ptm": null, "model_2": {"ptm": 0.6}, "model_1": {"plddt": [1, 2]}}', (True, 0.6)),
+    ('{"model_1": {"ptm": null}, "model_2": {"ptm": 0.5}}', (True, 0.5)),
+    ('{"plddt": [90.1, 80.2]}', (False, None)),
+    ('{}', (False, None)),
+]
+
+
+def _unsupported_layout(*args):
+    raise ValueError("unsupported layout")
+
+
+def _write(tmp_path, text, name='result.json'):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize('text, expected', CASES)
+def test_scan_matches_full_parse(tmp_path, text, expected, monkeypatch):
+    path = _write(tmp_path, text)
+    assert find_first_value(path, KEYS, NESTED_IN, NESTED_KEYS) == expected
+    # 完整解析的退回路径结果相同
+    monkeypatch.setattr(json_scan, '_scan', _unsupported_layout)
+    assert find_first_value(path, KEYS, NESTED_IN, NESTED_KEYS) == expected
+
+
+def test_members_match_json_load():
+    rng = np.random.default_rng(11)
+    data = {'pae': rng.random((5, 5)).round(3).tolist(), 'name': 'x{y}', 'nested': {'a': [None, True, 'b']},
+            'ptm': 0.75, 'empty': [], 'ranking': {}}
+    buf = json.dumps(data, indent=1).encode()
+    members = {key: json.loads(buf[start:end]) for key, start, end in iter_object_members(buf)}
+    assert members == data
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"ptm": 0.1, "pae": [[1, 2]], "ptm": 0.9}', (True, 0.1)),
+    ('{"iptm": 0.2, "iptm": 0.4}', (True, 0.2)),
+    ('{"model_1": {"ptm": 0.3}, "model_1": {"ptm": 0.8}}', (True, 0.3)),
+    ('{"model_1": {"ptm": 0.3, "ptm": 0.8}}', (True, 0.3)),
+])
+def test_duplicate_keys_keep_first_occurrence(tmp_path, text, expected, monkeypatch):
+    # 与 json.load（取最后一次）不同：两条路径都取第一次出现的值
+    path = _write(tmp_path, text)
+    assert find_first_value(path, KEYS, NESTED_IN, NESTED_KEYS) == expected
+    monkeypatch.setattr(json_scan, '_scan', _unsupported_layout)
+    assert find_first_value(path, KEYS, NESTED_IN, NESTED_KEYS) == expected
+
+
+def test_invalid_and_empty_files(tmp_path):
+    # 扫描到最高优先级的键即停止，之后的内容不再检查
+    assert find_first_value(_write(tmp_path, '{"ptm": 0.1, "pae": [[1,', 'truncated.json'), KEYS) == (True, 0.1)
+    # 流式扫描失败时退回完整解析，仍然无法解析时抛出 json 的错误
+    with pytest.raises(json.JSONDecodeError):
+        find_first_value(_write(tmp_path, '{"iptm": 0.1, "pae": [[1,', 'broken.json'), KEYS)
+    with pytest.raises(json.JSONDecodeError):
+        find_first_value(_write(tmp_path, '', 'empty.json'), KEYS)
+    assert find_first_value(_write(tmp_path, '[1, 2]', 'array.json'), KEYS) == (False, None)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from Bio.SVDSuperimposer import SVDSuperimposer
+
+from fig1 import kabsch
+
+
+def _pairs(seed=0, lengths=(3, 5, 17, 40, 120)):
+    rng = np.random.default_rng(seed)
+    pairs = []
+    for n in lengths:
+        fixed = rng.normal(scale=10.0, size=(n, 3))
+        q, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+        moving = fixed @ q + rng.normal(scale=20.0, size=3) + rng.normal(scale=0.5, size=(n, 3))
+        pairs.append((fixed, moving))
+    # 镜像结构：最佳拟合必须是真旋转（det=+1），不能是反射
+    fixed = rng.normal(size=(30, 3))
+    pairs.append((fixed, fixed * np.array([1.0, 1.0, -1.0])))
+    return pairs
+
+
+@pytest.mark.parametrize('block_size', [kabsch.BLOCK_SIZE, 2])
+def test_superpose_ragged_matches_biopython(monkeypatch, block_size):
+    monkeypatch.setattr(kabsch, 'BLOCK_SIZE', block_size)
+    pairs = _pairs()
+    rotations, translations, rmsd, deviations = kabsch.superpose_ragged(
+        [fixed for fixed, _ in pairs], [moving for _, moving in pairs])
+
+    sup = SVDSuperimposer()
+    for k, (fixed, moving) in enumerate(pairs):
+        sup.set(fixed, moving)
+        sup.run()
+        rot, tran = sup.get_rotran()
+        np.testing.assert_allclose(rmsd[k], sup.get_rms(), rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(rotations[k], rot, atol=1e-8)
+        np.testing.assert_allclose(translations[k], tran, atol=1e-7)
+        expected = np.linalg.norm(fixed - (moving @ rot + tran), axis=1)
+        np.testing.assert_allclose(deviations[k], expected, atol=1e-8)
+        assert np.linalg.det(rotations[k]) == pytest.approx(1.0)
+
+
+def test_superpose_padded_masks_padding():
+    fixed, moving = _pairs(lengths=(12,))[0]
+    padded_fixed = np.concatenate([fixed, np.full((4, 3), 1e3)])[None]
+    padded_moving = np.concatenate([moving, np.full((4, 3), -1e3)])[None]
+    mask = np.arange(16)[None, :] < 12
+    _, _, rmsd, deviations = kabsch.superpose_padded(padded_fixed, padded_moving, mask)
+    _, _, expected_rmsd, expected = kabsch.superpose_ragged([fixed], [moving])
+    np.testing.assert_allclose(rmsd, expected_rmsd)
+    np.testing.assert_allclose(deviations[0, :12], expected[0])
+    assert np.isnan(deviations[0, 12:]).all()
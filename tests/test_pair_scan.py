@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from fig1 import synthetic_data
+from fig1.pair_scan import (IdInterner, PairDeduplicator, RunningStats, canonical_pair_keys,
+                            read_pair_chunks)
+
+
+def test_interner_keeps_first_occurrence_order():
+    interner = IdInterner()
+    assert interner.encode(['b', 'a', 'b']).tolist() == [0, 1, 0]
+    assert interner.encode(['c', 'a']).tolist() == [2, 1]
+    assert interner.names == ['b', 'a', 'c'] and len(interner) == 3
+
+
+def test_canonical_pair_keys_ignore_direction():
+    keys = canonical_pair_keys([1, 7, 2 ** 31], [7, 1, 3])
+    assert keys[0] == keys[1] == (1 << 32) | 7
+    assert keys[2] == (3 << 32) | 2 ** 31
+
+
+def test_deduplicator_matches_python_set():
+    rng = np.random.default_rng(0)
+    dedup = PairDeduplicator()
+    seen = set()
+    for size in [0, 50, 1, 400, 30, 1000]:
+        keys = canonical_pair_keys(rng.integers(0, 40, size), rng.integers(0, 40, size))
+        expected = np.zeros(size, dtype=bool)
+        for i, key in enumerate(keys.tolist()):
+            if key not in seen:
+                seen.add(key)
+                expected[i] = True
+        np.testing.assert_array_equal(dedup.first_occurrences(keys), expected)
+    assert len(dedup) == len(seen)
+    # 逐级合并后有序数组的个数保持在对数级
+    assert len(dedup._runs) <= int(np.log2(len(seen))) + 1
+
+
+def test_running_stats_merge_matches_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.normal(1e4, 2.0, 3000)
+    values[::97] = np.nan
+    parts = np.array_split(values, 7)
+    stats = RunningStats()
+    for part in parts[:4]:
+        stats.update(part)
+    other = RunningStats()
+    for part in parts[4:]:
+        other.update(part)
+    stats.merge(other).merge(RunningStats())
+
+    clean = values[~np.isnan(values)]
+    assert stats.count == len(clean)
+    np.testing.assert_allclose(stats.mean, clean.mean(), rtol=1e-12)
+    np.testing.assert_allclose(stats.std(ddof=1), clean.std(ddof=1), rtol=1e-9)
+    assert (stats.min, stats.max) == (clean.min(), clean.max())
+    assert np.isnan(RunningStats().std())
+
+
+def test_read_pair_chunks_reads_only_pair_columns(tmp_path):
+    found = synthetic_data.write_structures(str(tmp_path / 'pdbs'), 4, seed=3, family_size=4, length=(20, 30))
+    path = str(tmp_path / 'aln.tsv')
+    synthetic_data.write_alignments(path, found, 25, seed=3)
+    chunks = list(read_pair_chunks(path, chunksize=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert list(chunks[0].columns) == ['query', 'target', 'rmsd']
+    assert chunks[0]['rmsd'].dtype == np.float64
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from fig1.bfactor_reader import read_atoms, residue_bfactors
+from fig1.plddt_matrix import read_ca_plddt
+
+
+def _atom(record, serial, name, residue_name, number, bfactor, element):
+    return (f"{record:<6}{serial:>5} {name:^4} {residue_name:>3} A{number:>4}    "
+            f"{serial:>8.3f}{0:>8.3f}{0:>8.3f}{1:>6.2f}{bfactor:>6.2f}          {element:>2}\n")
+
+
+def _write_structure(path):
+    lines, serial = [], 1
+    residues = [('ATOM', 'ALA', 1, 90.0), ('HETATM', 'MSE', 2, 80.0), ('ATOM', 'GLY', 3, 70.0)]
+    for record, residue_name, number, bfactor in residues:
+        for name, element in (('N', 'N'), ('CA', 'C'), ('C', 'C'), ('O', 'O')):
+            lines.append(_atom(record, serial, name, residue_name, number, bfactor, element))
+            serial += 1
+    # 同一条链上的钙离子：原子名和残基名都是 CA
+    lines.append(_atom('HETATM', serial, 'CA', 'CA', 101, 50.0, 'CA'))
+    lines.append('END\n')
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+def test_read_ca_plddt_skips_calcium_ions(tmp_path):
+    path = _write_structure(tmp_path / 'model.pdb')
+    plddt, sequence = read_ca_plddt(path)
+    assert sequence == 'AMG'
+    np.testing.assert_allclose(plddt, [90.0, 80.0, 70.0])
+
+
+def test_residue_bfactors_hetero_modes(tmp_path):
+    atoms = read_atoms(_write_structure(tmp_path / 'model.pdb'))
+    names = {mode: list(residue_bfactors(atoms, atom_name='CA', include_hetero=mode)['residue_name'])
+             for mode in (False, 'polymer', True)}
+    assert names[False] == ['ALA', 'GLY']
+    assert names['polymer'] == ['ALA', 'MSE', 'GLY']
+    assert names[True] == ['ALA', 'MSE', 'GLY', 'CA']
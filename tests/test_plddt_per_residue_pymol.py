@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from fig1.bfactor_reader import read_atoms, write_residue_bfactors
+from fig1.plddt_matrix import read_ca_plddt
+from fig1.plddt_per_residue_pymol import render_standin
+
+
+def _atom(record, serial, name, residue_name, chain, number, bfactor, element, x=0.0):
+    return (f"{record:<6}{serial:>5} {name:^4} {residue_name:>3} {chain}{number:>4}    "
+            f"{x:>8.3f}{serial:>8.3f}{0:>8.3f}{1:>6.2f}{bfactor:>6.2f}          {element:>2}\n")
+
+
+def _write_structure(path, residues):
+    """residues: [(记录类型, 残基名, 链, 编号, 原子名列表)]"""
+    lines, serial = [], 1
+    for record, residue_name, chain, number, names in residues:
+        for name in names:
+            element = name if residue_name == name else name[0]
+            lines.append(_atom(record, serial, name, residue_name, chain, number, 50.0, element, x=1.5 * serial))
+            serial += 1
+    lines.append('END\n')
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+BACKBONE = ['N', 'CA', 'C', 'O']
+
+
+def test_write_residue_bfactors_skips_calcium_ions(tmp_path):
+    # 链B中的钙离子排在最前面，链A中间也夹着一个：都不能被当作残基，也不能决定目标链
+    src = _write_structure(tmp_path / 'model.pdb', [
+        ('HETATM', 'CA', 'B', 1, ['CA']),
+        ('ATOM', 'ALA', 'A', 1, BACKBONE),
+        ('HETATM', 'CA', 'A', 2, ['CA']),
+        ('HETATM', 'MSE', 'A', 3, BACKBONE),
+        ('ATOM', 'GLY', 'A', 4, BACKBONE),
+    ])
+    dst = str(tmp_path / 'mapped.pdb')
+    assert write_residue_bfactors(src, dst, [10.0, 20.0, 30.0]) == 12
+
+    atoms = read_atoms(dst)
+    bfactors = dict(zip(zip(atoms['chain'], atoms['residue_number']), atoms['bfactor']))
+    assert bfactors == {('B', 1): 50.0, ('A', 1): 10.0, ('A', 2): 50.0, ('A', 3): 20.0, ('A', 4): 30.0}
+    # 写入的顺序与 read_ca_plddt（pLDDT矩阵的列）一致
+    plddt, sequence = read_ca_plddt(dst)
+    assert sequence == 'AMG'
+    np.testing.assert_allclose(plddt, [10.0, 20.0, 30.0])
+
+
+def test_render_standin_skips_structures_without_ca(tmp_path):
+    ions = _write_structure(tmp_path / 'ions.pdb', [('HETATM', 'CA', 'A', 1, ['CA'])])
+    protein = _write_structure(tmp_path / 'protein.pdb',
+                               [('ATOM', 'GLY', 'A', number, BACKBONE) for number in range(1, 6)])
+    render_standin([('ions', ions), ('protein', protein)], str(tmp_path))
+    assert not (tmp_path / 'ions_plddt_mapped.png').exists()
+    assert (tmp_path / 'protein_plddt_mapped.png').exists()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_load_pandas():
+    # 命令行入口只在真正运行时才导入pandas
+    code = "import sys, fig1.pTM_1; sys.exit('pandas' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code], cwd=ROOT).returncode == 0
+
+
+def _read_summary(output_dir):
+    import pandas as pd
+    frame = pd.read_csv(output_dir / 'ptm_summary.csv', dtype=str, keep_default_na=False)
+    return frame.set_index('source_dir')[['pdb_file', 'genotype']].to_dict('index')
+
+
+def test_incremental_run_picks_up_added_and_renamed_pdbs(tmp_path):
+    from fig1 import pTM_1
+
+    predictions, output_dir = tmp_path / 'predictions', tmp_path / 'out'
+    for name, ptm in [('a', 0.8), ('b', 0.7)]:
+        (predictions / name).mkdir(parents=True)
+        (predictions / name / 'ranking_debug.json').write_text(f'{{"ptm": {ptm}}}')
+    (predictions / 'b' / 'GI.1_model.pdb').write_text('END\n')
+    args = ['--input-dir', str(predictions), '--output-dir', str(output_dir), '--threads', '2']
+    pTM_1.main(args)
+    assert _read_summary(output_dir) == {
+        'a': {'pdb_file': pTM_1.NO_PDB, 'genotype': pTM_1.NO_PDB[:10]},
+        'b': {'pdb_file': 'GI.1_model.pdb', 'genotype': 'GI.1'},
+    }
+
+    # JSON文件都没有改动，只有PDB文件出现或改名
+    (predictions / 'a' / 'GII.4_Sydney.pdb').write_text('END\n')
+    os.rename(predictions / 'b' / 'GI.1_model.pdb', predictions / 'b' / 'GII.17_model.pdb')
+    pTM_1.main(args)
+    assert _read_summary(output_dir) == {
+        'a': {'pdb_file': 'GII.4_Sydney.pdb', 'genotype': 'GII.4'},
+        'b': {'pdb_file': 'GII.17_model.pdb', 'genotype': 'GII.17'},
+    }
+
+
+def _sequential_genotype(filename):
+    """原来的写法：按优先级逐个 re.search，都不匹配时取前10个字符"""
+    import re
+    from fig1 import pTM_1
+
+    for pattern in pTM_1.GENOTYPE_PATTERNS:
+        match = re.search(pattern, filename)
+        if match:
+            return match.group(0)
+    return filename[:10]
+
+
+def test_genotype_regex_matches_sequential_search():
+    import numpy as np
+    from fig1 import pTM_1
+
+    names = ['GII.4_Sydney_model.pdb', 'xx_NoV_GI.1.pdb', 'Norovirus_GII4_a.pdb', 'AB039776.pdb',
+             'model_GII4_2012.pdb', 'P_Domain_GI1.pdb', 'GII4_Sydney.pdb', 'XY12_ab_GII.17.pdb',
+             'ranked_0.pdb', pTM_1.NO_PDB, '', 'gii.4_lower.pdb']
+    # 随机拼接各模式的片段，覆盖多个模式在不同位置同时出现的情况
+    rng = np.random.default_rng(12)
+    pieces = ['GII', '.4', 'GI', '17', '_', 'NoV_', 'Norovirus_', 'P_Domain_', 'Sydney', 'AB', '2012', 'x', 'L']
+    names += [''.join(rng.choice(pieces, size=rng.integers(1, 8))) for _ in range(500)]
+    assert pTM_1.extract_genotypes(names).tolist() == [_sequential_genotype(name) for name in names]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from fig1 import synthetic_data
+from fig1.contrib_io import read_residue_stats
+from fig1.query_layer import QueryStore, build_query_store
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    root = tmp_path_factory.mktemp('query_store')
+    contributions = root / 'residue_rmsd_contributions.csv'
+    synthetic_data.write_contributions(str(contributions), 20000, seed=4, n_structures=20, max_residue=240)
+    frame = pd.read_csv(contributions)
+    # 残基平均贡献远大于其离散程度时，直接用平方和相减会损失精度
+    frame['rmsd_contribution'] += 1e5
+    frame.to_csv(contributions, index=False)
+    db = root / 'query.db'
+    build_query_store(str(db), contributions=str(contributions))
+    return str(db), frame
+
+
+def _reference(frame):
+    return frame.groupby('residue_number')['rmsd_contribution'].agg(['count', 'mean', 'std'])
+
+
+@pytest.mark.parametrize('quantiles', [False, True])
+def test_residue_stats_matches_pandas(store, quantiles):
+    db, frame = store
+    queries = sorted(frame['query'].unique())[:5]
+    stats = read_residue_stats(db, queries=queries, residue_range=(200, 230), quantiles=quantiles)
+    selected = frame[frame['query'].isin(queries) & frame['residue_number'].between(200, 230)]
+    result, expected = stats.to_frame(ddof=1), _reference(selected)
+
+    assert result.index.equals(expected.index)
+    assert (result['count'].to_numpy() == expected['count'].to_numpy()).all()
+    np.testing.assert_allclose(result['mean'], expected['mean'], rtol=1e-12)
+    np.testing.assert_allclose(result['std'], expected['std'], rtol=1e-9)
+    assert result['median'].notna().all() == quantiles
+
+
+def test_residue_stats_without_matching_rows(store):
+    db, _ = store
+    with QueryStore(db) as query_store:
+        stats = query_store.residue_stats(queries=['missing_pdb'])
+    assert stats.total_count == 0 and stats.to_frame().empty
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fig1 import render_figures
+
+pytest.importorskip('matplotlib')
+
+
+@pytest.fixture
+def summaries(tmp_path):
+    rng = np.random.default_rng(13)
+    ptm = tmp_path / 'ptm_summary.csv'
+    pd.DataFrame({'ptm': rng.uniform(0.3, 0.95, 50)}).to_csv(ptm, index=False)
+    plddt = tmp_path / 'structure_summary.csv'
+    mean = rng.uniform(60, 95, 40)
+    pd.DataFrame({'mean_plddt': mean, 'min_plddt': mean - 20, 'max_plddt': mean + 4}).to_csv(plddt, index=False)
+    return ptm, plddt
+
+
+def _render(tmp_path, summaries, capsys, *more):
+    ptm, plddt = summaries
+    render_figures.main(['--ptm-summary', str(ptm), '--plddt-summary', str(plddt),
+                         '--output-dir', str(tmp_path / 'figures'), '--workers', '2'] + list(more))
+    rendered = set()
+    for line in capsys.readouterr().out.splitlines():
+        name, _, message = line.partition(': ')
+        if message.startswith('已保存到'):
+            rendered.add(name)
+    return rendered
+
+
+def test_unchanged_figures_are_skipped(tmp_path, summaries, capsys):
+    ptm, _ = summaries
+    all_figures = {'ptm_distribution', 'plddt_mean_distribution', 'plddt_summary_boxplot'}
+    assert _render(tmp_path, summaries, capsys) == all_figures
+    cache = json.loads((tmp_path / 'figures' / render_figures.CACHE_NAME).read_text(encoding='utf-8'))
+    assert set(cache) == all_figures
+    for name in all_figures:
+        assert (tmp_path / 'figures' / render_figures.FIGURES[name]['output']).exists()
+
+    assert _render(tmp_path, summaries, capsys) == set()
+
+    # 只有输入内容变化的图重新渲染（修改时间变了但内容相同不算）
+    ptm.write_text(ptm.read_text())
+    assert _render(tmp_path, summaries, capsys) == set()
+    frame = pd.read_csv(ptm)
+    frame.loc[0, 'ptm'] = 0.5
+    frame.to_csv(ptm, index=False)
+    assert _render(tmp_path, summaries, capsys) == {'ptm_distribution'}
+
+    # 输出文件被删除、绘图参数改变或 --force 时重新渲染
+    (tmp_path / 'figures' / render_figures.FIGURES['plddt_summary_boxplot']['output']).unlink()
+    assert _render(tmp_path, summaries, capsys) == {'plddt_summary_boxplot'}
+    assert _render(tmp_path, summaries, capsys, '--dpi', '50') == all_figures
+    assert _render(tmp_path, summaries, capsys, '--dpi', '50', '--force') == all_figures
+
+
+def test_failed_figure_is_not_cached(tmp_path, summaries, capsys):
+    ptm, _ = summaries
+    ptm.write_text('other\n1\n')
+    assert _render(tmp_path, summaries, capsys, '--figures', 'ptm_distribution') == set()
+    assert not (tmp_path / 'figures' / render_figures.CACHE_NAME).exists()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from fig1.contrib_io import read_residue_stats
+from fig1.residue_stats import ResidueStats
+
+
+def _reference(residues, values):
+    return pd.DataFrame({'residue_number': residues, 'v': values}).groupby('residue_number')['v'].agg(
+        ['count', 'mean', 'std'])
+
+
+def _data(seed=0, n=5000, low=-5, high=60):
+    rng = np.random.default_rng(seed)
+    return rng.integers(low, high, n), rng.lognormal(size=n)
+
+
+def test_merge_matches_single_pass():
+    residues, values = _data()
+    full = ResidueStats()
+    full.update(residues, values)
+    merged = ResidueStats()
+    for part in np.array_split(np.arange(len(values)), 7):
+        chunk = ResidueStats()
+        chunk.update(residues[part], values[part])
+        merged.merge(chunk)
+
+    a, b = full.to_frame(ddof=1), merged.to_frame(ddof=1)
+    assert a.index.equals(b.index)
+    np.testing.assert_array_equal(a['count'], b['count'])
+    np.testing.assert_allclose(a['mean'], b['mean'], rtol=1e-12)
+    np.testing.assert_allclose(a['std'], b['std'], rtol=1e-10)
+    np.testing.assert_allclose(a['median'], b['median'])
+
+
+def test_negative_and_zero_residue_numbers():
+    residues, values = _data()
+    stats = ResidueStats()
+    # 先加入正编号，再加入负编号，数组需要向前扩展
+    positive = residues > 10
+    stats.update(residues[positive], values[positive])
+    stats.update(residues[~positive], values[~positive])
+
+    frame = stats.to_frame(ddof=1)
+    expected = _reference(residues, values)
+    assert list(frame.index) == list(expected.index)
+    assert frame.index.min() == -5
+    np.testing.assert_array_equal(frame['count'], expected['count'])
+    np.testing.assert_allclose(frame['mean'], expected['mean'], rtol=1e-12)
+    np.testing.assert_allclose(frame['std'], expected['std'], rtol=1e-10)
+    assert frame['median'].notna().all()
+
+
+def test_merge_with_different_offsets():
+    a, b = ResidueStats(), ResidueStats()
+    a.update([5, 6, 6], [1.0, 2.0, 4.0])
+    b.update([-3, 5], [8.0, 3.0])
+    a.merge(b)
+    frame = a.to_frame()
+    assert list(frame.index) == [-3, 5, 6]
+    assert list(frame['count']) == [1, 2, 2]
+    np.testing.assert_allclose(frame['mean'], [8.0, 2.0, 3.0])
+    np.testing.assert_allclose(frame['median'], [8.0, 2.0, 3.0], rtol=0.1)
+
+
+def test_summary_and_state_round_trip(tmp_path):
+    residues, values = _data(seed=1, low=-4, high=30)
+    stats = ResidueStats()
+    stats.update(residues, values)
+    expected = stats.to_frame()
+
+    summary = tmp_path / "summary.csv"
+    stats.save_summary(str(summary))
+    assert ResidueStats.is_summary_file(str(summary))
+    pd.testing.assert_frame_equal(ResidueStats.load_summary(str(summary)).to_frame(), expected)
+
+    state = tmp_path / "state.npz"
+    stats.save(str(state))
+    pd.testing.assert_frame_equal(ResidueStats.load(str(state)).to_frame(), expected)
+
+
+def test_read_residue_stats_with_negative_numbering(tmp_path):
+    # 结构编号从 -4 开始（例如带标签的构建体）
+    path = tmp_path / "residue_rmsd_contributions.csv"
+    pd.DataFrame({
+        'query': ['A', 'A', 'A', 'B'],
+        'target': ['B', 'B', 'B', 'A'],
+        'residue_number': [-4, 0, 1, -4],
+        'rmsd_contribution': [1.0, 2.0, 3.0, 3.0],
+        'total_rmsd': [2.0, 2.0, 2.0, 3.0],
+        'aligned_length': [3, 3, 3, 1],
+    }).to_csv(path, index=False)
+    frame = read_residue_stats(str(path)).to_frame()
+    assert list(frame.index) == [-4, 0, 1]
+    np.testing.assert_allclose(frame['mean'], [2.0, 2.0, 3.0])
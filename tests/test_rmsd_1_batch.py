@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from fig1 import RMSD_1_batch, synthetic_data
+
+
+@pytest.fixture
+def structures(tmp_path):
+    pdb_dir = tmp_path / 'pdbs'
+    found = synthetic_data.write_structures(str(pdb_dir), 4, seed=1, family_size=4, length=(40, 60))
+    yield str(pdb_dir), found
+    RMSD_1_batch.configure(None, None)
+
+
+def _alignment_rows(structures, pairs):
+    rows = []
+    for q, t in pairs:
+        seq_q, _, anc_q = structures[q]
+        seq_t, _, anc_t = structures[t]
+        qaln, taln = synthetic_data._homologous_strings(seq_q, anc_q, seq_t, anc_t)
+        rows.append((q, t, qaln, taln, 1e-10, 1.0))
+    return pd.DataFrame(rows, columns=RMSD_1_batch.COLUMN_NAMES)
+
+
+def test_failed_accumulation_is_recorded_as_errors(structures, monkeypatch):
+    pdb_dir, found = structures
+    names = list(found)
+    chunk = _alignment_rows(found, [(names[0], names[1]), (names[1], names[2])])
+    RMSD_1_batch.configure(pdb_dir, None, aggregate_only=True)
+
+    def broken(results, stats=None):
+        raise MemoryError("out of memory")
+
+    monkeypatch.setattr(RMSD_1_batch, 'accumulate_results', broken)
+    chunk_index, result_df, n_results, error_df, chunk_stats, metrics, _ = RMSD_1_batch._process_chunk(3, chunk)
+
+    assert chunk_index == 3 and n_results == 0 and result_df.empty
+    assert chunk_stats.total_count == 0
+    assert list(error_df['row']) == [0, 1]
+    assert (error_df['chunk'] == 3).all()
+    assert error_df['error'].str.startswith('MemoryError').all()
+    assert metrics.skips == {'exception': 2}
+
+
+def _with_roles(df):
+    codes, _ = pd.factorize(pd.concat([df['query'], df['target']]))
+    return df.assign(pair_role=RMSD_1_batch.pair_roles(codes[:len(df)], codes[len(df):]))
+
+
+def _run(chunks):
+    processed = RMSD_1_batch.iter_processed_chunks(chunks)
+    return list(RMSD_1_batch.resolve_derived_rows(processed, set()))
+
+
+@pytest.mark.parametrize('chunksize', [3, 1])
+def test_dedup_computes_reverse_row_when_primary_is_skipped(structures, chunksize):
+    pdb_dir, found = structures
+    a, b, c = list(found)[:3]
+    df = _with_roles(_alignment_rows(found, [(a, b), (a, c), (b, a), (c, a)]))
+    assert list(df['pair_role']) == [RMSD_1_batch.PAIR_PRIMARY] * 2 + [RMSD_1_batch.PAIR_DERIVED] * 2
+    # A→B 的比对字符串长度不一致，该主行被跳过；B→A 本身有效，必须单独计算而不是随主行丢失
+    df.loc[0, 'qaln'] = df.loc[0, 'qaln'][:-2]
+    RMSD_1_batch.configure(pdb_dir, None)
+    chunks = [df.iloc[i:i + chunksize] for i in range(0, len(df), chunksize)]
+    outputs = _run(chunks)
+
+    results = pd.concat([out[1] for out in outputs if len(out[1])])
+    pairs = set(zip(results['query'], results['target']))
+    assert pairs == {(a, c), (c, a), (b, a)}
+    assert sum(out[2] for out in outputs) == 3
+
+    # 补算的 B→A 与不去重时的结果相同；C→A 由 A→C 导出
+    plain = RMSD_1_batch.results_to_frame(
+        RMSD_1_batch.calculate_residue_rmsd_contributions_batch(df.drop(columns='pair_role'), errors=[]))
+    key = ['query', 'target', 'residue_number']
+    reverse = results[(results['query'] == b)].sort_values(key).reset_index(drop=True)
+    expected = plain[(plain['query'] == b)].sort_values(key).reset_index(drop=True)
+    pd.testing.assert_frame_equal(reverse, expected, check_dtype=False)
+    derived = results[(results['query'] == c)]
+    forward = results[(results['query'] == a)]
+    np.testing.assert_allclose(derived['rmsd_contribution'], forward['rmsd_contribution'])
+
+
+def test_dedup_reports_reverse_row_when_structure_is_missing(structures):
+    pdb_dir, found = structures
+    a = list(found)[0]
+    df = _alignment_rows(found, [(a, a)] * 2)
+    df['query'] = [a, 'missing_pdb']
+    df['target'] = ['missing_pdb', a]
+    df = _with_roles(df)
+    RMSD_1_batch.configure(pdb_dir, None)
+    outputs = _run([df.iloc[:1], df.iloc[1:]])
+
+    errors = pd.concat([out[3] for out in outputs])
+    assert list(errors['row']) == [0, 1]
+    assert list(errors['chunk']) == [0, 1]
+    assert all(out[1].empty for out in outputs)
+
+
+@pytest.mark.parametrize('extra_args', [[], ['--dedup-pairs'], ['--aggregate-only', '--sample-fraction', '0.5']])
+def test_resume_after_crash_matches_uninterrupted_run(tmp_path, monkeypatch, extra_args):
+    pdb_dir = str(tmp_path / 'pdbs')
+    found = synthetic_data.write_structures(pdb_dir, 12, seed=3, family_size=6, length=(40, 60))
+    alignments = str(tmp_path / 'aln.tsv')
+    synthetic_data.write_alignments(alignments, found, 60, seed=3)
+    # 让部分比对因长度不一致被跳过（去重模式下包括主行，续跑后仍须补算其反方向行）
+    frame = pd.read_csv(alignments, sep='\t', header=None)
+    frame.loc[::9, 2] = frame.loc[::9, 2].str[:-1]
+    frame.to_csv(alignments, sep='\t', header=False, index=False)
+
+    def run(output_dir, *more):
+        RMSD_1_batch.main(['--pdb-dir', pdb_dir, '--alignments', alignments, '--output-dir', str(output_dir),
+                           '--chunksize', '7', '--no-disk-cache', '--metrics-interval', '0'] + extra_args + list(more))
+
+    run(tmp_path / 'full')
+
+    iter_processed_chunks = RMSD_1_batch.iter_processed_chunks
+
+    def crash_after_three_chunks(*args, **kwargs):
+        for i, result in enumerate(iter_processed_chunks(*args, **kwargs)):
+            if i == 3:
+                # 模拟崩溃前写了一半的输出
+                for path in (tmp_path / 'resumed').glob('residue_rmsd_*.csv'):
+                    with open(path, 'a') as f:
+                        f.write('partial,row')
+                raise RuntimeError("simulated crash")
+            yield result
+
+    monkeypatch.setattr(RMSD_1_batch, 'iter_processed_chunks', crash_after_three_chunks)
+    run(tmp_path / 'resumed')
+    monkeypatch.setattr(RMSD_1_batch, 'iter_processed_chunks', iter_processed_chunks)
+    run(tmp_path / 'resumed', '--resume')
+
+    names = [path.name for path in (tmp_path / 'full').glob('residue_rmsd_*.csv')]
+    assert 'residue_rmsd_errors.csv' in names
+    for name in names:
+        full = pd.read_csv(tmp_path / 'full' / name)
+        resumed = pd.read_csv(tmp_path / 'resumed' / name)
+        pd.testing.assert_frame_equal(resumed, full, check_exact=False)
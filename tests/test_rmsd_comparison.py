@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from fig1 import RMSD_comparison, synthetic_data
+from fig1.query_layer import build_query_store
+
+
+@pytest.fixture
+def alignments(tmp_path):
+    found = synthetic_data.write_structures(str(tmp_path / 'pdbs'), 12, seed=5, family_size=6, length=(30, 40))
+    tsv = str(tmp_path / 'aln.tsv')
+    synthetic_data.write_alignments(tsv, found, 200, seed=5)
+    db = str(tmp_path / 'query.db')
+    build_query_store(db, alignments=tsv)
+    return tsv, db
+
+
+def _run(path, output_dir):
+    RMSD_comparison.main(['--alignments', path, '--output-dir', str(output_dir), '--chunksize', '17'])
+    return (output_dir / 'GII_vs_GIX_standard_rmsd_stats.txt').read_text(encoding='utf-8')
+
+
+def test_query_store_uses_group_query_and_matches_scan(alignments, tmp_path, monkeypatch):
+    tsv, db = alignments
+    expected = _run(tsv, tmp_path / 'tsv')
+
+    def full_scan(*args, **kwargs):
+        raise AssertionError("query store input must not be scanned row by row")
+
+    monkeypatch.setattr(RMSD_comparison, 'iter_pair_codes', full_scan)
+    assert _run(db, tmp_path / 'store') == expected
+    assert 'Number of alignments: 0' not in expected
+    assert ((tmp_path / 'store' / 'coverage_analysis.txt').read_text(encoding='utf-8')
+            == (tmp_path / 'tsv' / 'coverage_analysis.txt').read_text(encoding='utf-8'))
+
+
+def test_query_store_without_groups_reports_error(alignments, tmp_path):
+    _, db = alignments
+    pairs_file = str(tmp_path / 'pairs.tmp')
+    with pytest.raises(ValueError, match='--group-prefixes GII GIX'):
+        RMSD_comparison.scan_group_pairs(db, 'GII', 'GIX', pairs_file)
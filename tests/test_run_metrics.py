@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import json
+import pickle
+
+import pandas as pd
+
+from fig1 import RMSD_1_batch, synthetic_data
+from fig1.run_metrics import MetricsLog, RunMetrics
+
+RECORD_FIELDS = {'event', 'time', 'elapsed', 'total_processed', 'rows_per_sec', 'alignments_per_sec',
+                 'structure_cache_hit_rate', 'timers', 'counters', 'skips'}
+
+
+def test_metrics_merge_across_processes():
+    a, b = RunMetrics(), RunMetrics()
+    a.add_time('compute', 1.5)
+    a.count('rows_in', 10)
+    a.skip('missing_pdb', 2)
+    a.skip('length_mismatch', 0)
+    b.add_time('compute', 0.5)
+    b.add_time('write_output', 0.25)
+    b.count('rows_in', 5)
+    b.skip('missing_pdb')
+    # 工作进程的指标经 pickle 传回主进程后合并
+    merged = a.merge(pickle.loads(pickle.dumps(b)))
+    assert merged.to_dict() == {'timers': {'compute': 2.0, 'write_output': 0.25},
+                                'counters': {'rows_in': 15}, 'skips': {'missing_pdb': 3}}
+
+
+def test_timed_iter_yields_all_items():
+    metrics = RunMetrics()
+    assert list(metrics.timed_iter(iter(range(3)), 'read_input')) == [0, 1, 2]
+    assert metrics.timers['read_input'] >= 0
+
+
+def test_metrics_log_records_are_json_lines(tmp_path):
+    path = str(tmp_path / 'metrics.jsonl')
+    metrics = RunMetrics()
+    metrics.count('rows_in', 3)
+    log = MetricsLog(path, interval=0)
+    assert not log.due()
+    log.emit('final', metrics, total_processed=3)
+    log.close()
+    log = MetricsLog(path, interval=0, append=True)
+    log.emit('final', metrics, total_processed=6)
+    log.close()
+    records = [json.loads(line) for line in open(path, encoding='utf-8')]
+    assert [r['total_processed'] for r in records] == [3, 6]
+    assert set(records[0]) == {'event', 'time', 'elapsed', 'total_processed', 'timers', 'counters', 'skips'}
+
+
+def test_rmsd_1_batch_metrics_schema(tmp_path):
+    pdb_dir = str(tmp_path / 'pdbs')
+    found = synthetic_data.write_structures(pdb_dir, 10, seed=3, family_size=5, length=(40, 60))
+    alignments = str(tmp_path / 'aln.tsv')
+    synthetic_data.write_alignments(alignments, found, 50, seed=3)
+    frame = pd.read_csv(alignments, sep='\t', header=None)
+    frame.loc[::9, 2] = frame.loc[::9, 2].str[:-1]
+    frame.loc[5, 0] = 'missing_pdb'
+    frame.to_csv(alignments, sep='\t', header=False, index=False)
+    metrics_path = tmp_path / 'metrics.jsonl'
+    RMSD_1_batch.main(['--pdb-dir', pdb_dir, '--alignments', alignments, '--output-dir', str(tmp_path / 'out'),
+                       '--chunksize', '7', '--no-disk-cache', '--metrics', str(metrics_path),
+                       '--metrics-interval', '1e-9'])
+
+    records = [json.loads(line) for line in metrics_path.read_text(encoding='utf-8').splitlines()]
+    progress, final = records[:-1], records[-1]
+    assert [r['event'] for r in progress] == ['progress'] * 8 and final['event'] == 'final'
+    assert [r['chunk'] for r in progress] == list(range(8))
+    for record in records:
+        assert RECORD_FIELDS <= set(record)
+        assert all(isinstance(v, float) and v >= 0 for v in record['timers'].values())
+        assert all(isinstance(v, int) for v in list(record['counters'].values()) + list(record['skips'].values()))
+    assert [r['total_processed'] for r in progress] == sorted(r['total_processed'] for r in progress)
+
+    # 每个输入行要么写出结果，要么按原因计入跳过
+    counters, skips = final['counters'], final['skips']
+    assert counters['rows_in'] == 50 and counters['chunks'] == 8
+    assert skips == {'length_mismatch': 6, 'missing_pdb': 1}
+    assert counters['alignments_out'] + sum(skips.values()) == counters['rows_in']
+    assert final['total_processed'] == counters['alignments_out'] and final['total_errors'] == 1
+    assert {'read_input', 'load_structures', 'superpose', 'write_output'} <= set(final['timers'])
+    assert 0 < final['structure_cache_hit_rate'] <= 1
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+import pytest
+
+from fig1 import synthetic_data
+from fig1.structure_store import StructureStore
+
+
+@pytest.fixture
+def pdb_dir(tmp_path):
+    pdb_dir = tmp_path / 'pdbs'
+    found = synthetic_data.write_structures(str(pdb_dir), 3, seed=2, family_size=3, length=(20, 30))
+    return str(pdb_dir), list(found)
+
+
+def test_lru_evicts_least_recently_used(pdb_dir):
+    pdb_dir, (a, b, c) = pdb_dir
+    store = StructureStore(pdb_dir, max_items=2)
+    store.get(a)
+    store.get(b)
+    store.get(a)  # a 变为最近使用，c 进入时淘汰 b
+    store.get(c)
+    assert list(store._lru) == [a, c]
+    assert store.stats == {'memory_hits': 1, 'disk_hits': 0, 'parsed': 3}
+    store.get(b)
+    assert store.stats['parsed'] == 4
+
+
+def test_disk_cache_hit_after_eviction(pdb_dir, tmp_path):
+    pdb_dir, (a, b, _) = pdb_dir
+    cache_dir = str(tmp_path / 'cache')
+    store = StructureStore(pdb_dir, cache_dir=cache_dir, max_items=1)
+    coords, res_nums = store.get(a)
+    store.get(b)
+    again = store.get(a)
+    assert store.stats == {'memory_hits': 0, 'disk_hits': 1, 'parsed': 2}
+    np.testing.assert_array_equal(again[0], coords)
+    np.testing.assert_array_equal(again[1], res_nums)
+    assert coords.dtype == np.float32 and coords.shape == (len(res_nums), 3)
+
+    # 新的进程（新的 store）直接读磁盘缓存，不再解析
+    fresh = StructureStore(pdb_dir, cache_dir=cache_dir)
+    fresh.get(b)
+    assert fresh.stats == {'memory_hits': 0, 'disk_hits': 1, 'parsed': 0}
+
+    # 文件改动后缓存键失效，重新解析
+    path = fresh.resolve(a)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    fresh.get(a)
+    assert fresh.stats['parsed'] == 1
+
+
+def test_resolve_tries_lower_and_upper_case(pdb_dir):
+    pdb_dir, (a, _, _) = pdb_dir
+    os.rename(os.path.join(pdb_dir, f"{a}.pdb"), os.path.join(pdb_dir, f"{a.lower()}.pdb"))
+    store = StructureStore(pdb_dir)
+    assert store.resolve(a) == os.path.join(pdb_dir, f"{a.lower()}.pdb")
+    with pytest.raises(FileNotFoundError):
+        store.resolve('missing_pdb')